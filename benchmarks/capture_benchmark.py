@@ -0,0 +1,165 @@
+'''
+Created on 17.10.2026
+
+End-to-end capture benchmark. Drives XevaCam.start_recording/stop_recording
+against SyntheticBackend with different frame sizes, handler counts and
+handler types, and reports sustained frame rate, dropped frames,
+frame-to-handler latency and CPU time per frame.
+
+Usage:
+    python benchmarks/capture_benchmark.py --quick
+    python benchmarks/capture_benchmark.py --output results.jsonl
+'''
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xevacam.acquisition as acquisition  # noqa: E402
+import xevacam.streams as streams  # noqa: E402
+from xevacam.backends import SyntheticBackend  # noqa: E402
+from xevacam.camera import XevaCam  # noqa: E402
+
+FRAME_SIZES = ((196, 256), (512, 640), (1024, 1280))
+HANDLER_COUNTS = (1, 4)
+HANDLER_TYPES = ('file', 'bytesio', 'xevastream', 'preview')
+ACQUISITIONS = {'spin': acquisition.SpinAcquisition,
+                'blocking': acquisition.BlockingAcquisition,
+                'adaptive': acquisition.AdaptiveAcquisition}
+
+
+class LatencyProbe(object):
+    '''
+    Handler proxy which records the delay from frame capture to the handler
+    write.
+    '''
+
+    def __init__(self, handler, camera):
+        self.handler = handler
+        self.camera = camera
+        self.latencies = []
+        self._write_slot = getattr(handler, 'write_slot', None)
+
+    def write(self, b):
+        return self.handler.write(b)
+
+    def write_slot(self, slot):
+        origin = self.camera.timestamps.origin
+        self.latencies.append(time.perf_counter_ns() - origin - slot.timestamp)
+        if self._write_slot is not None:
+            return self._write_slot(slot)
+        return self.handler.write(slot.view)
+
+
+def make_handler(kind, tmpdir, index):
+    if kind == 'file':
+        return open(os.path.join(tmpdir, 'bench%d.bin' % index), 'wb')
+    elif kind == 'bytesio':
+        return io.BytesIO()
+    elif kind == 'xevastream':
+        return streams.XevaStream()
+    elif kind == 'preview':
+        return streams.PreviewStream()
+    raise Exception('Unknown handler type %s' % kind)
+
+
+def run_case(dims, handler_count, kind, ctrl_frames, fps, duration,
+             strategy, tmpdir):
+    backend = SyntheticBackend(width=dims[1], height=dims[0], fps=fps,
+                               jitter=0.05, buffer_frames=4, seed=0)
+    cam = XevaCam(backend=backend, acquisition=ACQUISITIONS[strategy]())
+    handlers = [make_handler(kind, tmpdir, i) for i in range(handler_count)]
+    probes = [LatencyProbe(h, cam) for h in handlers]
+    for p in probes:
+        cam.set_handler(p, incl_ctrl_frames=ctrl_frames)
+    with contextlib.redirect_stdout(io.StringIO()):
+        with cam.opened() as c:
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            c.start_recording()
+            c.wait_recording(duration)
+            c.stop_recording()
+            cpu = time.process_time() - cpu
+            wall = time.perf_counter() - wall
+    for h in handlers:
+        h.close()
+    frames = cam.frames_count
+    # Frames the camera buffer lost because capture didn't keep up and
+    # frames handlers discarded from their queues
+    camera_dropped = backend.lost
+    handler_dropped = sum(getattr(h, 'dropped', 0) for h in handlers)
+    latencies = np.array([v for p in probes for v in p.latencies],
+                         dtype=np.float64) / 1e6
+    return {'height': dims[0],
+            'width': dims[1],
+            'handlers': handler_count,
+            'handler_type': kind,
+            'ctrl_frames': ctrl_frames,
+            'acquisition': strategy,
+            'target_fps': fps,
+            'duration': wall,
+            'frames': frames,
+            'fps': frames / wall if wall else 0.0,
+            'dropped': camera_dropped + handler_dropped,
+            'camera_dropped': camera_dropped,
+            'handler_dropped': handler_dropped,
+            'ring_overruns': cam.ring.overruns,
+            'latency_p50_ms': float(np.percentile(latencies, 50))
+            if len(latencies) else None,
+            'latency_p99_ms': float(np.percentile(latencies, 99))
+            if len(latencies) else None,
+            'cpu_per_frame_ms': cpu / frames * 1e3 if frames else None,
+            'polls_per_frame': cam.acquisition.polls_per_frame}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[1])
+    parser.add_argument('--duration', type=float,
+                        help='Seconds per case, default 2 or 0.5 with '
+                        '--quick')
+    parser.add_argument('--fps', type=float, default=400.0,
+                        help='Synthetic camera frame rate')
+    parser.add_argument('--acquisition', choices=sorted(ACQUISITIONS),
+                        default='spin')
+    parser.add_argument('--quick', action='store_true',
+                        help='Smallest frame size and a short duration')
+    parser.add_argument('--output', help='Append JSON lines to this file')
+    args = parser.parse_args(argv)
+
+    sizes = FRAME_SIZES[:1] if args.quick else FRAME_SIZES
+    duration = args.duration
+    if duration is None:
+        duration = 0.5 if args.quick else 2.0
+    info = {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    out = open(args.output, 'a') if args.output else None
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for dims, count, kind, ctrl in itertools.product(
+                    sizes, HANDLER_COUNTS, HANDLER_TYPES, (False, True)):
+                result = run_case(dims, count, kind, ctrl, args.fps,
+                                  duration, args.acquisition, tmpdir)
+                result.update(info)
+                line = json.dumps(result, sort_keys=True)
+                print(line)
+                if out is not None:
+                    out.write(line + '\n')
+    finally:
+        if out is not None:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -44,7 +44,7 @@ if __name__ == '__main__':
         c.wait_recording(5)
         meta = c.stop_recording()
 
-        utils.create_envi_hdr(meta, 'myfile.hdr')
+        utils.create_envi_hdr(meta, 'myfile.hdr', timestamps=c.timestamps)
     # window.close()
     # from xevacam.envi import ENVIImage
     # with ENVIImage('myfile.bin').open() as img:
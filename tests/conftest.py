@@ -0,0 +1,42 @@
+'''
+Shared fixtures. Tests run on SyntheticBackend, no camera needed.
+'''
+
+import numpy as np
+import pytest
+
+
+def _record(cam, frames):
+    '''
+    Opens the camera, records frames and returns the metadata as a dict.
+    '''
+    with cam.opened() as c:
+        c.start_recording()
+        c.wait_recording(frames=frames)
+        return dict(c.stop_recording())
+
+
+class FrameCollector(object):
+    '''
+    Handler which keeps a copy of every frame it gets.
+    '''
+
+    def __init__(self):
+        self.frames = []
+
+    def write_slot(self, slot):
+        self.frames.append(np.array(slot.frame))
+        return len(slot)
+
+    def write(self, b):
+        raise Exception('Control frames are not expected')
+
+
+@pytest.fixture
+def record():
+    return _record
+
+
+@pytest.fixture
+def collector():
+    return FrameCollector()
@@ -0,0 +1,77 @@
+'''
+Tests for frame acquisition strategies.
+'''
+
+import time
+import pytest
+from xevacam.acquisition import AdaptiveAcquisition, BlockingAcquisition, \
+    SpinAcquisition
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+
+
+class NullHandler(object):
+
+    def write(self, b):
+        return len(b)
+
+
+def record_with(acquisition, frames=50, fps=200.0):
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=fps),
+                  acquisition=acquisition)
+    cam.set_handler(NullHandler())
+    with cam.opened() as c:
+        c.start_recording()
+        c.wait_recording(frames=frames)
+        c.stop_recording()
+    return cam
+
+
+def test_spin_polls_many_times_per_frame():
+    cam = record_with(SpinAcquisition())
+    assert cam.acquisition.frames == cam.frames_count >= 50
+    assert cam.acquisition.polls_per_frame > 2
+
+
+def test_blocking_polls_once_per_frame():
+    cam = record_with(BlockingAcquisition())
+    assert cam.acquisition.frames == cam.frames_count >= 50
+    assert cam.acquisition.polls_per_frame < 1.1
+
+
+def test_adaptive_learns_the_period():
+    spin = record_with(SpinAcquisition())
+    cam = record_with(AdaptiveAcquisition())
+    acquisition = cam.acquisition
+    assert acquisition.frames == cam.frames_count >= 50
+    assert 1.0 <= acquisition.polls_per_frame < \
+        spin.acquisition.polls_per_frame
+    assert acquisition.period == pytest.approx(1 / 200.0, rel=0.3)
+
+
+def test_stop_ends_blocking_wait():
+    # The next frame is due in 2 seconds, stopping must not wait for it
+    backend = SyntheticBackend(width=16, height=8, fps=0.5,
+                               block_timeout=10.0)
+    cam = XevaCam(backend=backend, acquisition=BlockingAcquisition())
+    cam.set_handler(NullHandler())
+    with cam.opened() as c:
+        c.start_recording()
+        time.sleep(0.1)
+        start = time.perf_counter()
+        c.stop_recording()  # Raises if the capture thread failed
+        assert time.perf_counter() - start < 1.0
+        assert not c.is_alive()
+    assert cam.frames_count == 0
+
+
+def test_blocking_timeout_raises():
+    backend = SyntheticBackend(width=16, height=8, fps=0.5,
+                               block_timeout=0.05)
+    cam = XevaCam(backend=backend, acquisition=BlockingAcquisition(0.2))
+    cam.set_handler(NullHandler())
+    with cam.opened() as c:
+        c.start_recording()
+        time.sleep(0.5)
+        with pytest.raises(Exception, match='No frame from camera'):
+            c.stop_recording()
@@ -0,0 +1,71 @@
+'''
+Tests for async frame iteration.
+'''
+
+import asyncio
+import pytest
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+
+
+class FailingBackend(SyntheticBackend):
+    '''
+    Fails get_frame after a number of frames.
+    '''
+
+    def __init__(self, frames, **kwargs):
+        super().__init__(**kwargs)
+        self.frames = frames
+
+    def get_frame(self, handle, frame_t, flag, buffer, size):
+        if self.delivered >= self.frames:
+            return self.E_BUSY
+        return super().get_frame(handle, frame_t, flag, buffer, size)
+
+
+def run(coroutine):
+    return asyncio.run(asyncio.wait_for(coroutine, 5))
+
+
+def test_aframes_records_while_iterated():
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=200.0))
+
+    async def consume():
+        frames = 0
+        async for frame in cam.aframes():
+            assert frame.shape == (8, 16)
+            frames += 1
+            if frames == 10:
+                break
+        return frames
+
+    with cam.opened():
+        assert run(consume()) == 10
+        assert not cam.is_alive()
+
+
+def test_capture_error_reaches_aframes():
+    cam = XevaCam(backend=FailingBackend(5, width=16, height=8, fps=200.0))
+    frames = []
+
+    async def consume():
+        async for frame in cam.aframes():
+            frames.append(frame.copy())
+
+    with cam.opened():
+        with pytest.raises(Exception, match='E_BUSY'):
+            run(consume())
+    assert len(frames) <= 5
+
+
+def test_capture_error_reaches_recording():
+    cam = XevaCam(backend=FailingBackend(5, width=16, height=8, fps=200.0))
+
+    async def consume():
+        async with cam.recording():
+            await asyncio.sleep(0.5)  # Capture fails meanwhile
+
+    with cam.opened():
+        with pytest.raises(Exception, match='E_BUSY'):
+            run(consume())
+        assert not cam.is_alive()
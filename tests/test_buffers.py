@@ -0,0 +1,55 @@
+'''
+Tests for the preallocated frame ring.
+'''
+
+import numpy as np
+import pytest
+from xevacam.buffers import FrameRing
+
+
+def test_slots_are_reused_only_after_release():
+    ring = FrameRing(100, slots=3)
+    first = ring.acquire()
+    first.retain()  # A handler keeps the frame
+    first.release()  # Capture thread is done with it
+    others = [ring.acquire(timeout=0), ring.acquire(timeout=0)]
+    assert first not in others
+    assert ring.free_slots() == 0
+    assert ring.acquire(timeout=0) is None
+    assert ring.overruns == 1
+    first.release()  # Handler is done
+    assert ring.acquire(timeout=0) is first
+
+
+def test_release_too_many_times():
+    ring = FrameRing(100, slots=2)
+    slot = ring.acquire()
+    slot.release()
+    with pytest.raises(Exception):
+        slot.release()
+    with pytest.raises(Exception):
+        slot.retain()
+
+
+def test_typed_views_share_the_slot():
+    ring = FrameRing(8 * 16 * 2, slots=2, dims=(8, 16), dtype=np.uint16)
+    slot = ring.acquire()
+    slot.pixels[2, 3] = 1234
+    assert slot.frame[2, 3] == 1234
+    assert not slot.frame.flags.writeable
+    assert slot.view.readonly
+    assert len(slot) == 8 * 16 * 2
+    assert slot.address % 64 == 0
+    assert ring.slots[1].address % 64 == 0
+
+
+def test_smaller_output_frames():
+    ring = FrameRing(8 * 16 * 2, slots=2, dims=(8, 16), dtype=np.uint16,
+                     out_dims=(4, 4), out_dtype=np.uint32)
+    slot = ring.acquire()
+    assert slot.frame.shape == (4, 4)
+    assert slot.frame.dtype == np.uint32
+    assert len(slot) == 4 * 4 * 4
+    with pytest.raises(Exception):
+        FrameRing(16, slots=2, dims=(2, 4), dtype=np.uint16,
+                  out_dims=(4, 4), out_dtype=np.uint32)
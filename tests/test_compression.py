@@ -0,0 +1,104 @@
+'''
+Tests for compressed recordings.
+'''
+
+import concurrent.futures
+import threading
+import time
+import numpy as np
+import pytest
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+from xevacam.compression import CompressedReader, CompressedWriter
+
+
+@pytest.mark.parametrize('codec', ['zlib', 'lzma', 'bz2', 'none'])
+@pytest.mark.parametrize('delta', [False, True])
+def test_round_trip(tmp_path, record, collector, codec, delta):
+    path = str(tmp_path / 'frames.xcmp')
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        cam.set_handler(CompressedWriter(path, codec=codec, delta=delta,
+                                         chunk_frames=4, executor=executor))
+        cam.set_handler(collector)
+        meta = record(cam, 10)
+    frames = np.stack(collector.frames)
+    with CompressedReader(path) as reader:
+        assert len(reader) == 10
+        assert reader.dims == (8, 16)
+        np.testing.assert_array_equal(reader.read_frames(), frames)
+        np.testing.assert_array_equal(reader.read_frames(3, 9), frames[3:9])
+        np.testing.assert_array_equal(reader[-1], frames[-1])
+        np.testing.assert_array_equal(reader[5], frames[5])
+        assert dict(reader.meta)['dropped frames'] == str(
+            meta['dropped frames'])
+
+
+def test_process_pool(tmp_path, record, collector):
+    path = str(tmp_path / 'frames.xcmp')
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    cam.set_handler(CompressedWriter(path, chunk_frames=8, workers=2))
+    cam.set_handler(collector)
+    writer = cam.handlers[0][0]
+    assert len(writer._executor._processes) == 2  # Started up front
+    record(cam, 20)
+    with CompressedReader(path) as reader:
+        np.testing.assert_array_equal(reader.read_frames(),
+                                      np.stack(collector.frames))
+
+
+class GatedExecutor(concurrent.futures.ThreadPoolExecutor):
+    '''
+    Compresses only when the gate is open, or fails if fail is set.
+    '''
+
+    def __init__(self):
+        super().__init__(2)
+        self.gate = threading.Event()
+        self.fail = False
+
+    def _gated(self, fn, *args):
+        self.gate.wait(5)
+        if self.fail:
+            raise Exception('Codec failed')
+        return fn(*args)
+
+    def submit(self, fn, *args):
+        return super().submit(self._gated, fn, *args)
+
+
+def test_capture_doesnt_wait_for_compression(tmp_path):
+    path = str(tmp_path / 'frames.xcmp')
+    frames = np.arange(8 * 16, dtype=np.uint8).reshape(8, 16)
+    with GatedExecutor() as executor:
+        writer = CompressedWriter(path, chunk_frames=1, max_pending=1,
+                                  executor=executor)
+        start = time.perf_counter()
+        for frame in frames[:3]:
+            writer.write(frame.tobytes())
+        assert time.perf_counter() - start < 0.05
+        executor.gate.set()
+        for frame in frames[3:]:
+            writer.write(frame.tobytes())
+        writer.close()
+    assert writer.stats()['chunks'] == 8
+    with CompressedReader(path) as reader:
+        np.testing.assert_array_equal(reader.read_frames().reshape(8, 16),
+                                      frames)
+
+
+def test_compression_error_is_raised(tmp_path):
+    path = str(tmp_path / 'frames.xcmp')
+    with GatedExecutor() as executor:
+        executor.fail = True
+        executor.gate.set()
+        writer = CompressedWriter(path, chunk_frames=1, max_pending=1,
+                                  executor=executor)
+        writer.write(bytes(16))
+        writer.write(bytes(16))  # Writer thread waits for the first chunk
+        writer._thread.join(5)
+        with pytest.raises(Exception, match='Codec failed'):
+            writer.write(bytes(16))
+        with pytest.raises(Exception, match='Codec failed'):
+            writer.close()
+    assert writer._file is None
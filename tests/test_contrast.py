@@ -0,0 +1,34 @@
+'''
+Tests for preview display limits.
+'''
+
+import numpy as np
+import pytest
+from xevacam.contrast import AutoContrast
+
+
+@pytest.mark.parametrize('dtype', [np.uint8, np.uint16, np.uint32,
+                                   np.uint64])
+def test_limits_follow_the_data(dtype):
+    rng = np.random.default_rng(0)
+    top = 250 if dtype == np.uint8 else 60000
+    frame = rng.integers(top // 60, top, (196, 256)).astype(dtype)
+    vmin, vmax = AutoContrast(step=1)(frame)
+    lo, hi = np.percentile(frame, [1, 99])
+    tolerance = max(top / 1000, 2)
+    assert abs(vmin - lo) <= tolerance
+    assert abs(vmax - hi) <= tolerance
+
+
+def test_larger_values_widen_bins():
+    contrast = AutoContrast(bins=1024, step=1, decay=1.0)
+    contrast(np.full((4, 4), 100, dtype=np.uint32))
+    vmin, vmax = contrast(np.full((4, 4), 3 * 10 ** 9, dtype=np.uint32))
+    assert vmin <= 100
+    assert 3 * 10 ** 9 <= vmax <= 3.01 * 10 ** 9
+    assert contrast.histogram.sum() == 32
+
+
+def test_signed_pixels_are_refused():
+    with pytest.raises(Exception):
+        AutoContrast()(np.zeros((4, 4), dtype=np.int16))
@@ -0,0 +1,32 @@
+'''
+Tests for assembling a cube in memory.
+'''
+
+import numpy as np
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+from xevacam.cube import CubeAssembler
+
+
+def test_read_lines_while_capturing(collector):
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    cube = cam.set_handler(CubeAssembler(chunk_lines=8))
+    cam.set_handler(collector)
+    reads = []
+    with cam.opened() as c:
+        c.start_recording(frames=100)
+        while c.frames_count < 100:
+            view = cube.lines()
+            if view is not None:
+                reads.append(np.array(view))  # Cube grows meanwhile
+        c.wait_recording(frames=100)
+        c.stop_recording()
+    assert len(reads) > 1
+    lengths = [len(r) for r in reads]
+    assert lengths == sorted(lengths) and lengths[-1] <= 100
+    frames = np.stack(collector.frames)
+    for r in reads:
+        np.testing.assert_array_equal(r, frames[:len(r)])
+    assert len(cube) == dict(cube.meta)['lines'] == 100
+    np.testing.assert_array_equal(cube.cube('bsq'),
+                                  frames.transpose(1, 0, 2))
@@ -0,0 +1,58 @@
+'''
+Tests for writing and reading ENVI cubes.
+'''
+
+import numpy as np
+import pytest
+import xevacam.utils as utils
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+from xevacam.envi import ENVIImage, ENVIWriter
+
+
+def test_round_trip(tmp_path, record, collector):
+    path = str(tmp_path / 'cube.bin')
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    cam.set_handler(ENVIWriter(path, chunk_frames=4))
+    cam.set_handler(collector)
+    record(cam, 10)
+    frames = collector.frames
+    img = ENVIImage(path)
+    assert img.lines == cam.frames_count == len(frames) == 10
+    assert (img.samples, img.bands) == (16, 8)
+    with img.open():
+        np.testing.assert_array_equal(img.data, np.stack(frames))
+        np.testing.assert_array_equal(img.read_band(3),
+                                      np.stack(frames)[:, 3, :])
+        bsq = img.read_numpy_array('bsq')
+        np.testing.assert_array_equal(bsq, np.stack(frames).transpose(1, 0, 2))
+    assert len(img.timestamps) == 10
+
+
+def test_reuse_doesnt_overwrite(tmp_path, record):
+    path = str(tmp_path / 'cube.bin')
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    writer = ENVIWriter(path)
+    cam.set_handler(writer)
+    record(cam, 20)
+    assert writer.lines == 20
+    first = np.array(ENVIImage(path).data)
+    with pytest.raises(Exception, match='already holds a recorded cube'):
+        record(cam, 20)
+    img = ENVIImage(path)
+    assert img.lines == 20
+    np.testing.assert_array_equal(img.data, first)
+    assert first.any()
+
+
+def test_metadata_describes_raw_recording(tmp_path, record, collector):
+    path = str(tmp_path / 'raw.bin')
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    with open(path, 'wb') as f:
+        cam.set_handler(f)
+        cam.set_handler(collector)
+        meta = record(cam, 12)
+    assert (meta['samples'], meta['bands'], meta['lines']) == (16, 8, 12)
+    utils.create_envi_hdr(tuple(meta.items()), str(tmp_path / 'raw.hdr'))
+    with ENVIImage(path).open() as img:
+        np.testing.assert_array_equal(img.data, np.stack(collector.frames))
@@ -0,0 +1,65 @@
+'''
+Tests for the cached camera frame format.
+'''
+
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+
+
+class CountingBackend(SyntheticBackend):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.width_calls = 0
+
+    def get_frame_width(self, handle):
+        self.width_calls += 1
+        return super().get_frame_width(handle)
+
+
+def test_format_is_cached():
+    backend = CountingBackend(width=16, height=8)
+    cam = XevaCam(backend=backend)
+    with cam.opened() as c:
+        for _ in range(5):
+            assert c.frame_format.dims == (8, 16)
+            c.get_frame_size()
+    assert backend.width_calls == 1
+
+
+def test_geometry_change_updates_format_and_ring(collector):
+    backend = CountingBackend(width=16, height=8, fps=500.0)
+    cam = XevaCam(backend=backend)
+    cam.set_handler(collector)
+    with cam.opened() as c:
+        c.start_recording()
+        c.wait_recording(frames=3)
+        c.stop_recording()
+        assert c.ring.slots[0].frame.shape == (8, 16)
+        c.set_property_value('Width', 32)
+        c.set_property_value('Height', 4)
+        fmt = c.frame_format
+        assert (fmt.height, fmt.width, fmt.size) == (4, 32, 4 * 32 * 2)
+        c.start_recording()
+        c.wait_recording(frames=3)
+        c.stop_recording()
+        assert c.ring.frame_size == 4 * 32 * 2
+        assert c.ring.slots[0].frame.shape == (4, 32)
+    assert collector.frames[-1].shape == (4, 32)
+
+
+def test_load_settings_and_reopen_invalidate():
+    backend = CountingBackend(width=16, height=8)
+    cam = XevaCam(backend=backend)
+    with cam.opened() as c:
+        c.frame_format
+        backend.width = 24  # Changed by the settings file
+        c.load_settings('settings.xcf')
+        assert c.frame_format.width == 24
+        backend.width = 40  # Changed behind the camera's back
+        assert c.frame_format.width == 24
+        c.invalidate_format()
+        assert c.frame_format.width == 40
+    backend.width = 48
+    with cam.opened() as c:
+        assert c.frame_format.width == 48
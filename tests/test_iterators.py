@@ -0,0 +1,45 @@
+'''
+Tests for iterating frames while recording.
+'''
+
+import time
+import numpy as np
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+
+
+def test_count_stops_at_exactly_count():
+    backend = SyntheticBackend(width=16, height=8, fps=1000.0)
+    cam = XevaCam(backend=backend)
+    with cam.opened() as c:
+        frames = [np.array(f) for f in c.iter_frames(count=25)]
+        assert not c.is_alive()
+    assert len(frames) == 25
+    assert cam.frames_count == 25  # Capture didn't run past the target
+    assert frames[0].shape == (8, 16)
+    assert not cam.handlers
+
+
+def test_break_stops_recording():
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    with cam.opened() as c:
+        for i, frame in enumerate(c.iter_frames()):
+            if i == 4:
+                break
+        assert not c.is_alive()
+        assert not c.handlers
+        assert c.ring.free_slots() == len(c.ring)
+
+
+def test_slow_consumer_makes_camera_drop_frames():
+    backend = SyntheticBackend(width=16, height=8, fps=500.0,
+                               buffer_frames=2)
+    cam = XevaCam(backend=backend)
+    received = 0
+    with cam.opened() as c:
+        for frame in c.iter_frames(count=10, queue_size=2):
+            time.sleep(0.02)  # Ten frame periods
+            received += 1
+    assert received == 10
+    assert backend.lost > 0  # Capture waited for the consumer
+    assert cam.frames_count == 10
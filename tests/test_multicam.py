@@ -0,0 +1,98 @@
+'''
+Tests for multi-camera capture through shared memory rings.
+'''
+
+import functools
+import multiprocessing
+import time
+import numpy as np
+from xevacam.backends import SyntheticBackend
+from xevacam.buffers import FrameRing
+from xevacam.multicam import MultiCamera, SharedFrameRing
+
+
+class Timestamps(object):
+    origin = 1000
+
+
+def shared_ring(slots):
+    ctx = multiprocessing.get_context()
+    free, filled = ctx.Semaphore(slots), ctx.Semaphore(0)
+    reader = SharedFrameRing.create(slots, (2, 3), np.uint16, free, filled)
+    writer = SharedFrameRing.attach(reader.name, slots, (2, 3), np.uint16,
+                                    free, filled)
+    writer.timestamps = Timestamps()
+    return reader, writer
+
+
+def test_shared_ring_drops_when_reader_holds_every_slot():
+    reader, writer = shared_ring(2)
+    ring = FrameRing(12, slots=2, dims=(2, 3), dtype=np.uint16)
+    try:
+        for seq in range(3):
+            slot = ring.acquire()
+            slot.pixels[:] = seq
+            slot.seq = seq
+            slot.timestamp = seq * 10
+            writer.write_slot(slot)
+            slot.release()
+        assert (writer.written, writer.dropped) == (2, 1)
+        first = reader.read('cam', timeout=0)
+        second = reader.read('cam', timeout=0)
+        assert reader.read('cam', timeout=0) is None
+        assert [f.seq for f in (first, second)] == [0, 1]
+        assert second.timestamp == 1010
+        assert (second.frame == 1).all()
+        assert not first.frame.flags.writeable
+        first.release()
+        slot = ring.acquire()
+        slot.seq = 3
+        slot.timestamp = 30
+        writer.write_slot(slot)  # Released slot takes a frame again
+        slot.release()
+        assert writer.dropped == 1
+        writer.close_writer()
+        assert reader.read('cam').seq == 3
+        assert reader.read('cam') is None
+        assert reader.closed
+    finally:
+        writer.close()
+        reader.close()
+
+
+def record(cameras, seconds, timeout=1.0):
+    multi = MultiCamera(slots=16)
+    for name, fps in cameras:
+        multi.add_camera(name, functools.partial(
+            SyntheticBackend, width=16, height=8, fps=fps))
+    frames = []
+    start = None
+    with multi.running():
+        start = time.perf_counter()
+        for frame in multi.frames(timeout):
+            frames.append((frame.camera, frame.seq, frame.timestamp,
+                           frame.frame.copy()))
+            if time.perf_counter() - start > seconds:
+                break
+    return multi, frames
+
+
+def test_frames_are_merged_in_time_order():
+    multi, frames = record([('a', 100.0), ('b', 150.0)], 0.5)
+    assert {'a', 'b'} == {camera for camera, _, _, _ in frames}
+    timestamps = [t for _, _, t, _ in frames]
+    assert timestamps == sorted(timestamps)
+    for name in 'ab':
+        seqs = [seq for camera, seq, _, _ in frames if camera == name]
+        assert seqs == sorted(seqs)
+    assert set(multi.results) == {'a', 'b'}
+    assert frames[0][3].shape == (8, 16)
+
+
+def test_waits_for_all_cameras_at_once():
+    # Two cameras never give a frame, each fast frame waits one timeout
+    # for them, not one per camera
+    _, frames = record([('slow1', 0.01), ('slow2', 0.01), ('fast', 100.0)],
+                       1.0, timeout=0.1)
+    assert len(frames) >= 8  # 5 if waited for one camera at a time
+    assert {camera for camera, _, _, _ in frames} == {'fast'}
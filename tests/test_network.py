@@ -0,0 +1,36 @@
+'''
+Tests for publishing frames over sockets.
+'''
+
+import threading
+import time
+import numpy as np
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+from xevacam.network import FramePublisher, FrameSubscriber
+
+
+def test_subscriber_gets_every_frame(record, collector):
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=200.0))
+    publisher = cam.set_handler(FramePublisher(('127.0.0.1', 0),
+                                               maxsize=64))
+    cam.set_handler(collector)
+    received = []
+
+    def subscribe():
+        with FrameSubscriber(publisher.address, timeout=5,
+                             copy=True) as subscriber:
+            received.extend(subscriber)
+
+    client = threading.Thread(target=subscribe)
+    client.start()
+    deadline = time.time() + 5
+    while publisher.subscribers == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    record(cam, 20)
+    publisher.close()
+    client.join(5)
+    assert [f.seq for f in received] == list(range(20))
+    np.testing.assert_array_equal(np.stack([f.frame for f in received]),
+                                  np.stack(collector.frames))
+    assert cam.ring.free_slots() == len(cam.ring)
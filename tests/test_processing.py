@@ -0,0 +1,85 @@
+'''
+Tests for processing stages.
+'''
+
+import numpy as np
+import pytest
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+from xevacam.processing import Reduction, SoftwareCorrection, bad_pixel_map
+
+
+def test_software_correction():
+    dark = np.full((4, 4), 100.0)
+    flat = np.full((4, 4), 300.0)
+    flat[0, 0] = 500.0  # Twice as sensitive pixel
+    mask = np.zeros((4, 4), dtype=bool)
+    mask[2, 1] = True
+    correction = SoftwareCorrection(dark=dark, flat=flat, bad_pixels=mask)
+    correction.prepare((4, 4), np.uint16)
+    frame = np.full((4, 4), 1100, dtype=np.uint16)
+    frame[0, 0] = 2100
+    frame[2, 1] = 65535
+    frame[2, 0] = 600
+    correction.apply(frame)
+    gain = (flat - dark).mean() / (flat - dark)
+    assert frame[1, 1] == round(1000 * gain[1, 1])
+    assert frame[0, 0] == frame[1, 1]
+    assert frame[2, 1] == frame[2, 0]  # Nearest good pixel on the row
+
+
+def test_bad_pixel_map_uses_column_for_bad_row():
+    mask = np.zeros((3, 2), dtype=bool)
+    mask[1, :] = True
+    bad, source = bad_pixel_map(mask)
+    assert list(bad) == [2, 3]
+    assert list(source) == [0, 1]
+
+
+def reference_reduction(frame, bands, columns, binning, mean):
+    selected = frame[bands][:, columns[0]:columns[1]].astype(np.uint64)
+    nb, nc = binning
+    rows = selected.shape[0] // nb * nb
+    cols = selected.shape[1] // nc * nc
+    sums = selected[:rows, :cols].reshape(rows // nb, nb, cols // nc,
+                                          nc).sum(axis=(1, 3))
+    if mean:
+        return sums // (nb * nc)
+    return sums
+
+
+@pytest.mark.parametrize('bands, columns, binning, mean', [
+    (range(2, 30), (3, 60), (1, 1), False),
+    ([1, 5, 6, 7, 20, 21, 40], (0, 64), (2, 3), False),
+    (range(0, 48), (5, 64), (4, 2), True),
+])
+def test_reduction_matches_numpy(bands, columns, binning, mean):
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 65536, (48, 64), dtype=np.uint16)
+    reduction = Reduction(bands=bands, columns=columns, binning=binning,
+                          mean=mean)
+    dims, dtype = reduction.output(frame.shape, frame.dtype)
+    reduction.prepare(frame.shape, frame.dtype)
+    out = np.empty(dims, dtype=dtype)
+    reduction.reduce(frame, out)
+    expected = reference_reduction(frame, list(bands), columns, binning,
+                                   mean)
+    assert out.shape == expected.shape
+    np.testing.assert_array_equal(out, expected)
+    if mean:
+        assert out.dtype == frame.dtype
+
+
+def test_reduction_while_recording(record, collector):
+    backend = SyntheticBackend(width=32, height=16, fps=500.0)
+    cam = XevaCam(backend=backend)
+    cam.add_processor(Reduction(bands=range(4, 12), binning=(2, 2)))
+    cam.set_handler(collector)
+    meta = record(cam, 10)
+    assert collector.frames[0].shape == (4, 16)
+    assert cam.frames_count == 10
+    assert meta['band binning'] == 2
+    pattern = backend._patterns[0]  # First frame the camera sends
+    expected = reference_reduction(pattern, list(range(4, 12)), (0, 32),
+                                   (2, 2), False)
+    np.testing.assert_array_equal(collector.frames[0], expected)
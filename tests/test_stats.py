@@ -0,0 +1,134 @@
+'''
+Tests for missed frame detection.
+'''
+
+import io
+import time
+from xevacam.backends import SyntheticBackend
+import xevacam.camera as camera
+from xevacam.camera import XevaCam
+from xevacam.stats import CaptureStats, GapDetector, PERIOD_BINS_MS
+
+PERIOD_NS = 10000000  # 100 fps
+
+
+def check_all(detector, timestamps):
+    return [detector.check(t) for t in timestamps]
+
+
+def test_steady_frames_have_no_gaps():
+    gaps = GapDetector(frame_period=0.01)
+    check_all(gaps, [i * PERIOD_NS for i in range(100)])
+    assert gaps.missing == 0
+
+
+def test_lost_frames_are_counted():
+    gaps = GapDetector(frame_period=0.01)
+    # Frames 4 and 5 never arrive
+    numbers = [0, 1, 2, 3, 6, 7, 8, 9]
+    check_all(gaps, [n * PERIOD_NS for n in numbers])
+    assert gaps.missing == 2
+    assert len(gaps.indices) == 2
+
+
+def test_buffered_burst_is_not_a_gap():
+    gaps = GapDetector(frame_period=0.01)
+    # Host stalls for 25 ms after frame 3, the camera buffers frames 4 and
+    # 5 and they arrive in a burst right after frame 4 would have
+    timestamps = [0, 1, 2, 3]
+    timestamps = [n * PERIOD_NS for n in timestamps]
+    timestamps += [55000000, 55010000, 60000000, 70000000, 80000000]
+    check_all(gaps, timestamps)
+    assert gaps.missing == 0
+
+
+def test_estimated_period():
+    gaps = GapDetector()
+    numbers = list(range(20)) + list(range(23, 40))
+    check_all(gaps, [n * PERIOD_NS for n in numbers])
+    assert gaps.missing == 3
+    assert len(gaps.indices) == 3
+
+
+class NoCounterBackend(SyntheticBackend):
+
+    def get_frame_counter(self, handle):
+        return None
+
+
+class StallingHandler(object):
+    '''
+    Sleeps every n:th frame like a handler waiting for a slow disk.
+    '''
+
+    def __init__(self, every=50, seconds=0.025):
+        self.every = every
+        self.seconds = seconds
+        self.frames = 0
+
+    def write(self, b):
+        self.frames += 1
+        if self.frames % self.every == 0:
+            time.sleep(self.seconds)
+        return len(b)
+
+
+def test_stalls_with_camera_buffering_keep_cube_geometry(record):
+    backend = NoCounterBackend(width=16, height=8, fps=100.0,
+                               buffer_frames=4)
+    cam = XevaCam(backend=backend, frame_period=0.01, fill_gaps=True)
+    cam.set_handler(StallingHandler())
+    meta = record(cam, 100)
+    assert backend.lost == 0
+    assert meta['dropped frames'] == 0
+    assert cam.frames_count == backend.delivered == 100
+
+
+def test_dropped_frame_indices_are_capped(record, monkeypatch):
+    monkeypatch.setattr(camera, 'MAX_DROPPED_INDICES', 5)
+    backend = SyntheticBackend(width=16, height=8, fps=500.0,
+                               gap_probability=0.3, seed=2)
+    cam = XevaCam(backend=backend)
+    cam.set_handler(StallingHandler(every=10 ** 9))
+    meta = record(cam, 100)
+    assert meta['dropped frames'] == len(cam.gaps.indices) > 5
+    listed = meta['dropped frame indices'].strip('{}').split(', ')
+    assert [int(i) for i in listed] == cam.gaps.indices[:5]
+
+
+def test_period_histogram():
+    stats = CaptureStats()
+    for ms in (0, 10, 20, 30, 130):
+        stats.frame(ms * 1000000)
+    s = stats.snapshot()
+    assert s['frames'] == 5
+    histogram = dict(zip(PERIOD_BINS_MS + (None,), s['period_histogram']))
+    assert histogram[10] == 3  # 10 ms periods
+    assert histogram[100] == 1  # 100 ms period
+    assert sum(s['period_histogram']) == 4
+
+
+def test_snapshot_during_capture(record):
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=200.0))
+    cam.set_handler(StallingHandler(every=10 ** 9))
+    cam.set_handler(io.BytesIO(), threaded=True)
+    snapshots = []
+    with cam.opened() as c:
+        reporter = c.report_stats(interval=0.05, callback=snapshots.append)
+        c.start_recording()
+        c.wait_recording(frames=40)
+        c.stop_recording()
+        reporter.stop()
+    assert snapshots
+    s = cam.stats.snapshot()
+    assert s['frames'] == cam.frames_count == 40
+    assert s['errors'] == 0
+    assert s['get_frame_calls'] >= 40
+    assert s['polls_per_frame'] >= 1.0
+    assert s['ring_free_slots'] == cam.ring_slots
+    assert sum(s['period_histogram']) == 39
+    direct, threaded = s['handlers']
+    assert (direct['handler'], direct['writes']) == ('StallingHandler', 40)
+    assert threaded['handler'] == 'BytesIO'
+    assert threaded['written'] == threaded['published'] == 40
+    assert threaded['lag'] == 0
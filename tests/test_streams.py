@@ -0,0 +1,130 @@
+'''
+Tests for the frame queue streams.
+'''
+
+import threading
+import numpy as np
+from xevacam.backends import SyntheticBackend
+from xevacam.buffers import FrameRing
+from xevacam.camera import XevaCam
+from xevacam.streams import LineStream, PreviewStream, XevaStream
+import xevacam.writers as writers
+
+
+def test_read_spans_frames():
+    stream = XevaStream()
+    stream.write(b'abcd')
+    stream.write(b'efgh')
+    assert stream.read(3) == b'abc'
+    assert stream.read(3) == b'def'
+    assert stream.read() == b'gh'  # Rest of the partly read frame
+    assert stream.read() == b''
+
+
+def test_readinto():
+    stream = XevaStream()
+    stream.write(b'abcd')
+    stream.write(b'efgh')
+    out = bytearray(6)
+    assert stream.readinto(out) == 6
+    assert out == b'abcdef'
+    assert stream.readinto(out) == 2
+    assert out[:2] == b'gh'
+
+
+def test_slots_are_released_after_reading():
+    ring = FrameRing(4, slots=4)
+    stream = XevaStream()
+    for value in (1, 2):
+        slot = ring.acquire()
+        slot.raw[:] = value
+        stream.write_slot(slot)
+        slot.release()
+    assert ring.free_slots() == 2  # Held by the stream
+    assert stream.read(6) == b'\x01\x01\x01\x01\x02\x02'
+    assert ring.free_slots() == 3
+    out = bytearray(2)
+    stream.readinto(out)
+    assert out == b'\x02\x02'
+    assert ring.free_slots() == 4
+
+
+def test_unbounded_by_default():
+    stream = XevaStream()
+    for i in range(1000):
+        stream.write(bytes([i % 256]))
+    assert stream.depth == 1000
+    assert stream.dropped == 0
+
+
+def test_bounded_drops_oldest():
+    stream = XevaStream(maxsize=2, overflow=writers.DROP_OLDEST)
+    for b in (b'a', b'b', b'c'):
+        stream.write(b)
+    assert stream.dropped == 1
+    assert stream.read(2) == b'bc'
+
+
+def test_blocked_reader_wakes_up():
+    stream = XevaStream()
+    result = []
+    reader = threading.Thread(target=lambda: result.append(
+        stream.read(4, timeout=5)))
+    reader.start()
+    stream.write(b'ab')
+    stream.write(b'cd')
+    reader.join(5)
+    assert result == [b'abcd']
+
+
+def test_recording_to_stream(record):
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    stream = XevaStream()
+    cam.set_handler(stream)
+    record(cam, 30)
+    frames = []
+    while not stream.is_queue_empty():
+        frames.append(np.frombuffer(stream.read(), dtype=np.uint16))
+    assert len(frames) == 30
+    assert all(len(f) == 16 * 8 for f in frames)
+
+
+def test_preview_keeps_latest_frame():
+    preview = PreviewStream()
+    assert preview.read_frame() == (0, b'')
+    preview.write(b'old')
+    preview.write(b'new')
+    assert preview.read_frame() == (2, b'new')
+    assert preview.wait_newer(2, timeout=0.01) == 2
+    preview.write(b'newer')
+    assert preview.wait_newer(2, timeout=0.01) == 3
+
+
+def test_write_after_close_releases_slot():
+    ring = FrameRing(4, slots=2)
+    stream = XevaStream()
+    stream.close()
+    slot = ring.acquire()
+    stream.write_slot(slot)
+    slot.release()
+    assert ring.free_slots() == 2
+
+
+def test_line_stream_wraps_around():
+    lines = LineStream(band=1, lines=5, dims=(3, 4), dtype=np.uint16,
+                       margin=2)
+    out = np.ones((5, 4), dtype=np.uint16)
+    count = -1
+    for i in range(20):
+        frame = np.full((3, 4), 1000, dtype=np.uint16)
+        frame[1] = i
+        lines.write(frame.tobytes())
+        count = lines.read_lines(out, since=count)
+        assert count == i + 1
+        expected = [max(n, 0) for n in range(i - 4, i + 1)]
+        # Rows without a line yet are zeros
+        assert list(out[:, 0]) == expected
+        assert (out == out[:, :1]).all()
+    out[:] = 7
+    assert lines.read_lines(out, since=count) == count
+    assert (out == 7).all()  # Nothing new, nothing copied
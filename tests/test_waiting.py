@@ -0,0 +1,67 @@
+'''
+Tests for waiting on a recording.
+'''
+
+import time
+import pytest
+from xevacam.backends import SyntheticBackend
+from xevacam.camera import XevaCam
+
+
+class FailingBackend(SyntheticBackend):
+    '''
+    Fails get_frame after a number of frames.
+    '''
+
+    def __init__(self, frames, **kwargs):
+        super().__init__(**kwargs)
+        self.frames = frames
+
+    def get_frame(self, handle, frame_t, flag, buffer, size):
+        if self.delivered >= self.frames:
+            return self.E_BUSY
+        return super().get_frame(handle, frame_t, flag, buffer, size)
+
+
+class NullHandler(object):
+
+    def write(self, b):
+        return len(b)
+
+
+def test_frame_target_ends_wait_promptly():
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=100.0))
+    cam.set_handler(NullHandler())
+    with cam.opened() as c:
+        c.start_recording()
+        start = time.perf_counter()
+        c.wait_recording(seconds=10, frames=20)
+        elapsed = time.perf_counter() - start
+        assert not c.enabled
+        c.stop_recording()
+    assert cam.frames_count == 20
+    assert elapsed < 1.0  # 0.2 s of frames, far below the time limit
+
+
+def test_seconds_limit_ends_wait():
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=100.0))
+    cam.set_handler(NullHandler())
+    with cam.opened() as c:
+        c.start_recording()
+        start = time.perf_counter()
+        c.wait_recording(seconds=0.2)
+        assert 0.2 <= time.perf_counter() - start < 0.5
+        assert c.is_alive()
+        c.stop_recording()
+
+
+def test_capture_error_ends_wait_promptly():
+    cam = XevaCam(backend=FailingBackend(5, width=16, height=8, fps=100.0))
+    cam.set_handler(NullHandler())
+    with cam.opened() as c:
+        c.start_recording()
+        start = time.perf_counter()
+        with pytest.raises(Exception):
+            c.wait_recording(seconds=10)
+        assert time.perf_counter() - start < 1.0
+        assert not c.is_alive()
@@ -0,0 +1,133 @@
+'''
+Tests for handler wrappers.
+'''
+
+import io
+import threading
+import time
+import pytest
+from xevacam.backends import SyntheticBackend
+from xevacam.buffers import FrameRing
+from xevacam.camera import XevaCam
+from xevacam.envi import ENVIWriter
+from xevacam.streams import XevaStream
+from xevacam.writers import BatchingHandler, ThreadedHandler, BLOCK, \
+    DROP_NEWEST, DROP_OLDEST
+
+
+@pytest.mark.parametrize('threaded', [False, True])
+@pytest.mark.parametrize('ctrl', [False, True])
+def test_batched_writes_are_byte_identical(tmp_path, record, threaded,
+                                           ctrl):
+    cam = XevaCam(backend=SyntheticBackend(width=16, height=8, fps=500.0))
+    plain = io.BytesIO()
+    batched_io = io.BytesIO()
+    path = str(tmp_path / 'batched.bin')
+    with open(path, 'wb') as batched_file:
+        cam.set_handler(plain, incl_ctrl_frames=ctrl)
+        cam.set_handler(batched_io, incl_ctrl_frames=ctrl, threaded=threaded,
+                        batch_frames=4)
+        cam.set_handler(batched_file, incl_ctrl_frames=ctrl,
+                        threaded=threaded, batch_frames=3)
+        record(cam, 25)
+    frame = 16 * 8 * 2 + (4 if ctrl else 0)
+    assert len(plain.getvalue()) == 25 * frame
+    assert batched_io.getvalue() == plain.getvalue()
+    with open(path, 'rb') as f:
+        assert f.read() == plain.getvalue()
+
+
+def test_frame_handlers_are_refused(tmp_path):
+    cam = XevaCam(backend=SyntheticBackend())
+    for handler in (ENVIWriter(str(tmp_path / 'cube.bin')), XevaStream(),
+                    object()):
+        with pytest.raises(Exception, match='can\'t be batched'):
+            cam.set_handler(handler, batch_frames=4)
+    assert not cam.handlers
+
+
+def test_write_keeps_batch_bounds():
+    out = io.BytesIO()
+    batching = BatchingHandler(out, batch_frames=3, max_latency=10.0)
+    batching.write(b'a')
+    batching.write(b'b')
+    assert out.getvalue() == b''
+    batching.write(b'c')
+    assert out.getvalue() == b'abc'
+    assert batching.stats()['frames'] == 3
+    batching.max_latency = 0.0
+    batching.write(b'd')
+    assert out.getvalue() == b'abcd'
+
+
+class GatedHandler(object):
+    '''
+    Keeps the numbers of the frames it gets. Writes wait until opened.
+    '''
+
+    def __init__(self):
+        self.seqs = []
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def write_slot(self, slot):
+        self.started.set()
+        self.gate.wait(5)
+        self.seqs.append(slot.seq)
+        return len(slot)
+
+
+def publish(ring, threaded, seqs):
+    '''
+    Gives frames to the handler like the capture thread does.
+    '''
+    for seq in seqs:
+        slot = ring.acquire(timeout=0)
+        slot.seq = seq
+        threaded.write_slot(slot)
+        slot.release()
+
+
+def fill_queue(policy):
+    ring = FrameRing(64, slots=8)
+    handler = GatedHandler()
+    threaded = ThreadedHandler(handler, maxsize=2, overflow=policy)
+    publish(ring, threaded, [0])
+    assert handler.started.wait(5)  # Worker holds frame 0
+    publish(ring, threaded, [1, 2, 3])
+    return ring, handler, threaded
+
+
+@pytest.mark.parametrize('policy, written', [(DROP_OLDEST, [0, 2, 3]),
+                                             (DROP_NEWEST, [0, 1, 2])])
+def test_full_queue_drops_and_releases(policy, written):
+    ring, handler, threaded = fill_queue(policy)
+    assert threaded.dropped == 1
+    assert threaded.depth == threaded.high_water == 2
+    assert ring.free_slots() == 5  # Dropped frame's slot is free again
+    handler.gate.set()
+    threaded.close()
+    assert handler.seqs == written
+    assert threaded.written == 3
+    assert threaded.lag == 0
+    assert ring.free_slots() == 8
+
+
+def test_full_queue_blocks():
+    ring = FrameRing(64, slots=8)
+    handler = GatedHandler()
+    threaded = ThreadedHandler(handler, maxsize=2, overflow=BLOCK)
+    publish(ring, threaded, [0])
+    assert handler.started.wait(5)
+    publish(ring, threaded, [1, 2])
+    capture = threading.Thread(target=publish, args=(ring, threaded, [3]))
+    capture.start()
+    time.sleep(0.1)
+    assert capture.is_alive()  # Waits for room in the queue
+    handler.gate.set()
+    capture.join(5)
+    threaded.close()
+    assert handler.seqs == [0, 1, 2, 3]
+    assert threaded.dropped == 0
+    assert threaded.blocked_time > 0
+    assert ring.free_slots() == 8
@@ -0,0 +1,180 @@
+'''
+Created on 17.10.2026
+'''
+
+import time
+from xevacam.constants import XConstants
+
+
+class Acquisition(object):
+    '''
+    Base class for frame acquisition strategies.
+
+    The capture thread calls acquire() until it returns True or capturing is
+    disabled. Each strategy counts the get_frame calls (polls) it makes and
+    the frames it delivers.
+    '''
+
+    # True if acquire() waits in the DLL. stop_recording then stops capturing
+    # before joining the capture thread to end the wait.
+    blocks = False
+
+    def __init__(self):
+        self.polls = 0
+        self.frames = 0
+
+    def reset(self):
+        '''
+        Clears counters and state. Called when capturing starts.
+        '''
+        self.polls = 0
+        self.frames = 0
+
+    @property
+    def polls_per_frame(self):
+        '''
+        Average number of get_frame calls per delivered frame.
+        @return: float, 0.0 if no frames have been delivered
+        '''
+        if self.frames == 0:
+            return 0.0
+        return self.polls / self.frames
+
+    def stats(self):
+        return {'strategy': type(self).__name__,
+                'polls': self.polls,
+                'frames': self.frames,
+                'polls_per_frame': self.polls_per_frame}
+
+    def acquire(self, camera, buffer, frame_t, size):
+        '''
+        Tries to read one frame to buffer.
+
+        @param camera: XevaCam
+        @param buffer: Output buffer or its memory address
+        @param frame_t: Frame type enumeration
+        @param size: Frame size in bytes
+        @return: True if got frame, False if the caller should retry
+        '''
+        raise NotImplementedError()
+
+
+class SpinAcquisition(Acquisition):
+    '''
+    Polls non-blocking get_frame without pausing. Lowest latency, but keeps
+    one core busy while waiting for a frame.
+    '''
+
+    def acquire(self, camera, buffer, frame_t, size):
+        self.polls += 1
+        ok = camera.get_frame(buffer, frame_t=frame_t, size=size, flag=0)
+        if ok:
+            self.frames += 1
+        return ok
+
+
+class BlockingAcquisition(Acquisition):
+    '''
+    Lets the DLL wait for the next frame (XGF_Blocking).
+    '''
+
+    blocks = True
+
+    def __init__(self, timeout=5.0):
+        '''
+        @param timeout: Seconds without any frame after which acquire() raises
+                        an exception. None waits forever.
+        '''
+        super().__init__()
+        self.timeout = timeout
+        self._last = None
+
+    def reset(self):
+        super().reset()
+        self._last = None
+
+    def acquire(self, camera, buffer, frame_t, size):
+        if self._last is None:
+            self._last = time.perf_counter()
+        self.polls += 1
+        try:
+            ok = camera.get_frame(buffer, frame_t=frame_t, size=size,
+                                  flag=XConstants.XGF_Blocking)
+        except Exception:
+            if camera.enabled:
+                raise
+            return False  # stop_recording stopped capturing during the wait
+        now = time.perf_counter()
+        if ok:
+            self.frames += 1
+            self._last = now
+        elif self.timeout is not None and now - self._last > self.timeout:
+            raise Exception(
+                'No frame from camera in %.1f seconds' % (now - self._last))
+        return ok
+
+
+class AdaptiveAcquisition(Acquisition):
+    '''
+    Polls non-blocking get_frame, but sleeps through most of the measured
+    frame period before the first poll and backs off exponentially when the
+    frame is late.
+    '''
+
+    def __init__(self, lead=0.8, min_sleep=0.0002, max_sleep=0.005,
+                 smoothing=0.1):
+        '''
+        @param lead: Fraction of the frame period to sleep before polling
+        @param min_sleep: First back off sleep in seconds
+        @param max_sleep: Longest back off sleep in seconds
+        @param smoothing: Weight of the newest interval in the period estimate
+        '''
+        super().__init__()
+        self.lead = lead
+        self.min_sleep = min_sleep
+        self.max_sleep = max_sleep
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        super().reset()
+        self.period = None  # Estimated frame period in seconds
+        self._last = None
+        self._backoff = 0.0
+
+    def stats(self):
+        s = super().stats()
+        s['period'] = self.period
+        return s
+
+    def acquire(self, camera, buffer, frame_t, size):
+        if self._backoff == 0.0:
+            # First poll for this frame
+            if self._last is not None and self.period is not None:
+                delay = self._last + self.lead * self.period - \
+                    time.perf_counter()
+            else:
+                delay = 0.0
+            self._backoff = self.min_sleep
+        else:
+            delay = self._backoff
+            longest = self.max_sleep
+            if self.period is not None:
+                longest = min(longest, max(self.period / 4, self.min_sleep))
+            self._backoff = min(self._backoff * 2, longest)
+        if delay > 0:
+            time.sleep(delay)
+        self.polls += 1
+        ok = camera.get_frame(buffer, frame_t=frame_t, size=size, flag=0)
+        if ok:
+            now = time.perf_counter()
+            if self._last is not None:
+                delta = now - self._last
+                if self.period is None:
+                    self.period = delta
+                else:
+                    self.period += self.smoothing * (delta - self.period)
+            self._last = now
+            self._backoff = 0.0
+            self.frames += 1
+        return ok
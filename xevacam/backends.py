@@ -0,0 +1,304 @@
+'''
+Created on 17.10.2026
+'''
+
+import collections
+import ctypes
+import random
+import threading
+import time
+import numpy as np
+from xevacam.constants import XConstants
+
+
+class Backend(XConstants):
+    '''
+    Camera interface XevaCam talks to. Methods follow the Xeneth C API
+    (XC_* functions) and return its error codes.
+    '''
+
+    # Functions of the Xeneth C API a backend provides
+    functions = ('open_camera', 'close_camera', 'is_initialised',
+                 'load_calibration', 'start_capture', 'stop_capture',
+                 'is_capturing', 'get_frame_size', 'get_frame_width',
+                 'get_frame_height', 'get_frame_type', 'get_frame',
+                 'set_property_value', 'load_settings')
+
+    def open_camera(self, camera_path, callback=0, user=0):
+        '''
+        @param camera_path: Bytes string camera path, e.g. b'cam://0'
+        @return: Camera handle, 0 on failure
+        '''
+        raise NotImplementedError()
+
+    def close_camera(self, handle):
+        raise NotImplementedError()
+
+    def is_initialised(self, handle):
+        raise NotImplementedError()
+
+    def load_calibration(self, handle, filepath, flag):
+        raise NotImplementedError()
+
+    def start_capture(self, handle):
+        raise NotImplementedError()
+
+    def stop_capture(self, handle):
+        raise NotImplementedError()
+
+    def is_capturing(self, handle):
+        raise NotImplementedError()
+
+    def get_frame_size(self, handle):
+        raise NotImplementedError()
+
+    def get_frame_width(self, handle):
+        raise NotImplementedError()
+
+    def get_frame_height(self, handle):
+        raise NotImplementedError()
+
+    def get_frame_type(self, handle):
+        raise NotImplementedError()
+
+    def get_frame(self, handle, frame_t, flag, buffer, size):
+        '''
+        Reads a frame to buffer.
+
+        @param flag: 0 is non-blocking, XGF_Blocking waits for the frame
+        @param buffer: Memory address or writable buffer
+        @return: I_OK, E_NO_FRAME when there is no new frame, E_TIMEOUT when
+                 a blocking call timed out, or another error code
+        '''
+        raise NotImplementedError()
+
+    def set_property_value(self, handle, name, value, unit):
+        '''
+        @param name: Bytes string property name, e.g. b'IntegrationTime'
+        @param value: Bytes string value
+        @param unit: Bytes string unit, may be empty
+        '''
+        raise NotImplementedError()
+
+    def load_settings(self, handle, filepath, flags):
+        '''
+        @param filepath: Bytes string path to a settings file (.xcf)
+        '''
+        raise NotImplementedError()
+
+    def get_frame_counter(self, handle):
+        '''
+        Returns the camera's number of the latest frame, used for detecting
+        missed frames.
+        @return: int or None if the camera doesn't tell
+        '''
+        return None
+
+    def error2str(self, errcode):
+        return 'Error code: %s (%s)' % (str(errcode),
+                                        self.errcodes.get(errcode, '?'))
+
+    def print_error(self, errcode):
+        print(self.error2str(errcode))
+
+
+class XenethBackend(Backend):
+    '''
+    Xenics camera through xeneth64.dll. The DLL is loaded when the backend is
+    created.
+    '''
+
+    def __init__(self):
+        import xevacam.xevadll as xdll
+        self._xdll = xdll
+        for name in self.functions:
+            setattr(self, name, getattr(xdll.XDLL, name))
+
+    def error2str(self, errcode):
+        return self._xdll.error2str(errcode)
+
+
+class SyntheticBackend(Backend):
+    '''
+    Camera simulator for testing and benchmarking without hardware.
+
+    Frames are produced on a clock at the given frame rate with optional
+    jitter. Non-blocking get_frame returns E_NO_FRAME until the next frame is
+    due. Like a real camera it buffers a few frames; frames not fetched in
+    time are lost. With gap_probability frames are skipped by the camera.
+    '''
+
+    def __init__(self, width=256, height=196,
+                 frame_type=XConstants.FT_16_BPP_GRAY, fps=100.0,
+                 jitter=0.0, gap_probability=0.0, buffer_frames=4,
+                 block_timeout=1.0, seed=None):
+        '''
+        @param width: Frame width in pixels
+        @param height: Frame height in pixels
+        @param frame_type: FT_8_BPP_GRAY, FT_16_BPP_GRAY or FT_32_BPP_GRAY
+        @param fps: Frame rate
+        @param jitter: Standard deviation of frame times as fraction of the
+                       frame period
+        @param gap_probability: Probability that the camera skips a frame
+        @param buffer_frames: Frames the camera keeps before losing them
+        @param block_timeout: Seconds a blocking get_frame waits before
+                              E_TIMEOUT
+        @param seed: Random seed
+        '''
+        if self.pixel_sizes.get(frame_type, 0) == 0:
+            raise Exception('Unsupported frame type %s' % str(frame_type))
+        self.width = width
+        self.height = height
+        self.frame_type = frame_type
+        self.fps = fps
+        self.jitter = jitter
+        self.gap_probability = gap_probability
+        self.buffer_frames = buffer_frames
+        self.block_timeout = block_timeout
+        self._rng = random.Random(seed)
+        self._make_patterns()
+        self._handle = 0
+        self._open = False
+        self._capturing = False
+        self._stopped = threading.Event()  # Ends blocking waits
+        self._pending = collections.deque()
+
+    def _make_patterns(self):
+        dtype = {1: np.uint8, 2: np.uint16, 4: np.uint32}[
+            self.pixel_sizes[self.frame_type]]
+        # A few precomputed frames are cycled to keep get_frame cheap
+        ramp = np.add.outer(np.arange(self.height), np.arange(self.width))
+        self._patterns = [np.ascontiguousarray((ramp + 7 * i) % 4096,
+                                               dtype=dtype)
+                          for i in range(8)]
+
+    def open_camera(self, camera_path, callback=0, user=0):
+        self._handle += 1
+        self._open = True
+        return self._handle
+
+    def close_camera(self, handle):
+        self._open = False
+        self._capturing = False
+
+    def is_initialised(self, handle):
+        return int(self._open and handle == self._handle)
+
+    def load_calibration(self, handle, filepath, flag):
+        return self.I_OK
+
+    def start_capture(self, handle):
+        if not self.is_initialised(handle):
+            return self.E_NOINIT
+        self._period = 1.0 / self.fps
+        self._t0 = time.perf_counter()
+        self._index = 0  # Number of the next frame the camera produces
+        self._due = self._t0 + self._period
+        self._pending.clear()
+        self.produced = 0
+        self.skipped = 0  # Frames the camera skipped (gap_probability)
+        self.lost = 0  # Frames not fetched before the buffer overflowed
+        self.delivered = 0
+        self.frame_number = -1  # Number of the latest delivered frame
+        self._stopped.clear()
+        self._capturing = True
+        return self.I_OK
+
+    def stop_capture(self, handle):
+        self._capturing = False
+        self._stopped.set()
+        return self.I_OK
+
+    def is_capturing(self, handle):
+        return self._capturing
+
+    def get_frame_size(self, handle):
+        return self.width * self.height * self.pixel_sizes[self.frame_type]
+
+    def get_frame_width(self, handle):
+        return self.width
+
+    def get_frame_height(self, handle):
+        return self.height
+
+    def get_frame_type(self, handle):
+        return self.frame_type
+
+    def set_property_value(self, handle, name, value, unit):
+        '''
+        Supports b'Width' and b'Height', which change the frame size. Other
+        properties are accepted and ignored.
+        '''
+        if not self.is_initialised(handle):
+            return self.E_NOINIT
+        if self._capturing and name in (b'Width', b'Height'):
+            return self.E_BUSY
+        if name == b'Width':
+            self.width = int(value)
+            self._make_patterns()
+        elif name == b'Height':
+            self.height = int(value)
+            self._make_patterns()
+        return self.I_OK
+
+    def load_settings(self, handle, filepath, flags):
+        if not self.is_initialised(handle):
+            return self.E_NOINIT
+        return self.I_OK
+
+    def get_frame_counter(self, handle):
+        return self.frame_number
+
+    def _produce(self, now):
+        '''
+        Puts frames which have become due by now to the camera buffer.
+        '''
+        while self._due <= now:
+            number = self._index
+            self._index += 1
+            self.produced += 1
+            if self.gap_probability and \
+                    self._rng.random() < self.gap_probability:
+                self.skipped += 1
+            else:
+                if len(self._pending) >= self.buffer_frames:
+                    self._pending.popleft()
+                    self.lost += 1
+                self._pending.append(number)
+            due = self._t0 + (self._index + 1) * self._period
+            if self.jitter:
+                due += self._rng.gauss(0.0, self.jitter * self._period)
+            self._due = max(due, self._due)
+
+    def get_frame(self, handle, frame_t, flag, buffer, size):
+        if not self._capturing:
+            return self.E_NOINIT
+        frame_size = self.get_frame_size(handle)
+        if size < frame_size:
+            return self.E_WRONG_SIZE
+        now = time.perf_counter()
+        self._produce(now)
+        if not self._pending:
+            if not flag & self.XGF_Blocking:
+                return self.E_NO_FRAME
+            wait = self._due - now
+            if wait > self.block_timeout:
+                if self._stopped.wait(self.block_timeout):
+                    return self.E_NOINIT
+                return self.E_TIMEOUT
+            if self._stopped.wait(max(wait, 0.0)):
+                return self.E_NOINIT  # stop_capture ended the wait
+            self._produce(self._due)
+            if not self._pending:
+                return self.E_NO_FRAME  # Skipped frame
+        number = self._pending.popleft()
+        if isinstance(buffer, int):
+            address = buffer
+        else:
+            address = ctypes.addressof(
+                (ctypes.c_char * frame_size).from_buffer(buffer))
+        pattern = self._patterns[number % len(self._patterns)]
+        ctypes.memmove(address, pattern.ctypes.data, frame_size)
+        self.frame_number = number
+        self.delivered += 1
+        return self.I_OK
@@ -0,0 +1,165 @@
+'''
+Created on 17.10.2026
+'''
+
+import threading
+import numpy as np
+
+
+class FrameSlot(object):
+    '''
+    One preallocated frame buffer of a FrameRing.
+
+    The camera writes a frame straight into the slot. Handlers get read-only
+    views of it. A handler which keeps the frame after its write call has
+    returned must retain() the slot and release() it when it is done,
+    otherwise the ring reuses the memory for a later frame.
+    '''
+
+    def __init__(self, ring, index, raw, ctrl, dims=None, dtype=None,
+                 out_dims=None, out_dtype=None):
+        self.ring = ring
+        self.index = index
+        self.raw = raw  # Writable uint8 buffer, target of get_frame
+        self.address = raw.ctypes.data
+        self.ctrl = ctrl  # Writable 4 byte control frame buffer
+        if out_dims is None:
+            out_dims, out_dtype = dims, dtype
+            self.array = raw
+        else:
+            # A processing stage writes a smaller frame to the start
+            size = int(np.prod(out_dims)) * np.dtype(out_dtype).itemsize
+            if size > len(raw):
+                raise Exception('Output frame of %d bytes doesn\'t fit to '
+                                'frame slot of %d bytes' % (size, len(raw)))
+            self.array = raw[:size]
+        # Read-only bytes of the frame handlers get, array is writable
+        self.view = memoryview(self._readonly(self.array))
+        self.ctrl_frame = memoryview(self._readonly(ctrl))
+        if dims is not None and dtype is not None:
+            # Typed (height, width) views of the same memory. Processing
+            # stages modify pixels and write output, handlers read frame.
+            self.pixels = raw.view(dtype).reshape(dims)
+            self.output = self.array.view(out_dtype).reshape(out_dims)
+            self.frame = self._readonly(self.output)
+        else:
+            self.pixels = None
+            self.output = None
+            self.frame = None
+        self.seq = -1  # Sequence number of the frame in the slot
+        self.timestamp = 0  # Nanoseconds from the start of capturing
+        self.placeholder = False  # Zero filled in place of a missed frame
+        self._refs = 0
+
+    @staticmethod
+    def _readonly(array):
+        view = array.view()
+        view.flags.writeable = False
+        return view
+
+    def retain(self):
+        '''
+        Keeps the slot from being reused until release() is called.
+        @return: self
+        '''
+        self.ring._retain(self)
+        return self
+
+    def release(self):
+        '''
+        Gives up one reference to the slot.
+        '''
+        self.ring._release(self)
+
+    def __len__(self):
+        return len(self.view)
+
+
+class FrameRing(object):
+    '''
+    Preallocated ring of frame slots. Nothing is allocated per frame.
+    '''
+
+    def __init__(self, frame_size, slots=16, dims=None, dtype=None,
+                 out_dims=None, out_dtype=None):
+        '''
+        @param frame_size: Frame size in bytes
+        @param slots: Number of frame slots
+        @param dims: Optional frame dimensions tuple(height, width)
+        @param dtype: Optional numpy pixel dtype, needed with dims
+        @param out_dims: Dimensions of the frames handlers get, if a
+                         processing stage changes them
+        @param out_dtype: Pixel dtype of the frames handlers get
+        '''
+        if slots < 2:
+            raise Exception('Frame ring needs at least 2 slots, got %d' % slots)
+        self.frame_size = frame_size
+        # Slots start at 64 byte boundaries so typed views are aligned
+        stride = -(-frame_size // 64) * 64
+        memory = np.zeros(slots * stride + 64, dtype=np.uint8)
+        start = -memory.ctypes.data % 64
+        self._data = memory[start:start + slots * stride].reshape(slots,
+                                                                 stride)
+        self._ctrl = np.zeros((slots, 4), dtype=np.uint8)
+        self._cond = threading.Condition()
+        self.slots = [FrameSlot(self, i, self._data[i, :frame_size],
+                                self._ctrl[i], dims, dtype, out_dims,
+                                out_dtype)
+                      for i in range(slots)]
+        self._next = 0
+        self.overruns = 0  # Times acquire() found no free slot
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _find_free(self):
+        n = len(self.slots)
+        for i in range(n):
+            slot = self.slots[(self._next + i) % n]
+            if slot._refs == 0:
+                return slot
+        return None
+
+    def free_slots(self):
+        '''
+        Returns number of slots nobody is holding at the moment.
+        @return: int
+        '''
+        with self._cond:
+            return sum(1 for s in self.slots if s._refs == 0)
+
+    def acquire(self, timeout=None):
+        '''
+        Claims the next free slot for a new frame. The caller holds the first
+        reference and has to release() it.
+
+        @param timeout: Seconds to wait for a slot when all are held.
+                        None waits forever.
+        @return: FrameSlot or None if no slot got free in time
+        '''
+        with self._cond:
+            slot = self._find_free()
+            if slot is None:
+                self.overruns += 1
+                slot = self._cond.wait_for(self._find_free, timeout)
+                if slot is None:
+                    return None
+            slot._refs = 1
+            self._next = (slot.index + 1) % len(self.slots)
+            return slot
+
+    def _retain(self, slot):
+        with self._cond:
+            if slot._refs <= 0:
+                raise Exception('Retaining a released frame slot %d' %
+                                slot.index)
+            slot._refs += 1
+
+    def _release(self, slot):
+        with self._cond:
+            if slot._refs <= 0:
+                raise Exception('Frame slot %d released too many times' %
+                                slot.index)
+            slot._refs -= 1
+            if slot._refs == 0:
+                self._cond.notify()
@@ -5,15 +5,48 @@ Created on 9.11.2016
 '''
 
 import numpy as np
-import xevacam.xevadll as xdll
-from contextlib import contextmanager
+from contextlib import contextmanager, asynccontextmanager
+import asyncio
+import collections
 import threading
 import queue
 import sys
 import time
 import struct
+import logging
 import xevacam.utils as utils
 from xevacam.utils import kbinterrupt_decorate
+from xevacam.buffers import FrameRing
+from xevacam.acquisition import SpinAcquisition
+from xevacam.writers import ThreadedHandler, BatchingHandler, BLOCK, \
+    DROP_OLDEST
+from xevacam.streams import AsyncFrameQueue, XevaStream
+from xevacam.timestamps import TimestampLog
+from xevacam.backends import XenethBackend
+from xevacam.stats import CaptureStats, StatsReporter, GapDetector
+
+logger = logging.getLogger(__name__)
+
+# Numpy dtypes of pixel sizes in bytes
+PIXEL_DTYPES = {1: np.uint8, 2: np.uint16, 4: np.uint32}
+
+# Dropped frame indices listed in the metadata at most. All of them are in
+# XevaCam.gaps.indices, the total count is always in the metadata.
+MAX_DROPPED_INDICES = 1000
+
+
+class FrameFormat(collections.namedtuple('FrameFormat',
+                                         'size height width frame_type '
+                                         'dtype pixel_size')):
+    '''
+    Immutable description of the camera's frames: size in bytes, height,
+    width, frame type enumeration, numpy pixel dtype and pixel size in bytes.
+    '''
+    __slots__ = ()
+
+    @property
+    def dims(self):
+        return self.height, self.width
 
 '''
 class ExceptionThread(threading.Thread):
@@ -26,12 +59,26 @@ class ExceptionThread(threading.Thread):
 
 class XevaCam(object):
 
-    def __init__(self, calibration=''):
+    def __init__(self, calibration='', ring_slots=16, acquisition=None,
+                 backend=None, frame_period=None, fill_gaps=False):
         '''
         Constructor
 
         @param calibration: Bytes string path to the calibration file (.xca)
-        '''
+        @param ring_slots: Number of preallocated frame buffers the camera
+                           writes into
+        @param acquisition: Frame acquisition strategy from
+                            xevacam.acquisition. Default is SpinAcquisition.
+        @param backend: Camera backend from xevacam.backends. Default is
+                        XenethBackend, which loads xeneth64.dll.
+        @param frame_period: Expected frame period in seconds for detecting
+                             missed frames. None estimates it.
+        @param fill_gaps: Write zero filled placeholder frames in place of
+                          missed frames, keeping the cube's line geometry.
+        '''
+        if backend is None:
+            backend = XenethBackend()
+        self.backend = backend
         self.handle = 0
         self.calibration = calibration.encode('utf-8')  # Path to .xca file
 
@@ -39,13 +86,30 @@ class XevaCam(object):
         self._enabled = False
         self.enabled_lock = threading.Lock()
         self.handlers = []  # For streams, objects with write() method
+        self.processors = []  # Stages run on each frame before handlers
         # Exception queue for checking if an exception occurred inside thread
         self.exc_queue = queue.Queue()
         self._capture_thread = threading.Thread(name='capture_thread',
                                                 target=self.capture_frame_stream)
                                         # args=(self.handlers))
         self._record_time = 0  # Used for measuring the overall recording time
-        self._times = []  # Used for saving time stamps for each frame
+        # Frame time stamps in nanoseconds from the start of capturing
+        self.timestamps = TimestampLog()
+        self.frames_count = 0
+        # Set when capture thread fails, finishes or reaches frame target
+        self._capture_done = threading.Event()
+        self._done_callbacks = []  # Called when the capture thread ends
+        self._frame_target = None
+        self._aqueue = None  # AsyncFrameQueue of recording()
+        self.stats = CaptureStats()  # Live capture counters
+        self.gaps = GapDetector(frame_period)  # Missed frame detection
+        self.fill_gaps = fill_gaps
+        self.ring_slots = ring_slots
+        self.ring = None  # FrameRing, created when capturing starts
+        self._format = None  # FrameFormat, cached until settings change
+        if acquisition is None:
+            acquisition = SpinAcquisition()
+        self.acquisition = acquisition
 
     @contextmanager
     def opened(self, camera_path='cam://0', sw_correction=True):
@@ -70,26 +134,28 @@ class XevaCam(object):
         @param sw_correction: Use previously defined calibration file (.xca)
         '''
         self.handle = \
-            xdll.XDLL.open_camera(camera_path.encode('utf-8'), 0, 0)
+            self.backend.open_camera(camera_path.encode('utf-8'), 0, 0)
         print('XCHANDLE:', self.handle)
         if self.handle == 0:
             raise Exception('Handle is NULL')
-        if not xdll.XDLL.is_initialised(self.handle):
+        if not self.backend.is_initialised(self.handle):
             raise Exception('Initialization failed.')
         if self.calibration:
             if sw_correction:
-                flag = xdll.XDLL.XLC_StartSoftwareCorrection
+                flag = self.backend.XLC_StartSoftwareCorrection
             else:
                 flag = 0
-            error = xdll.XDLL.load_calibration(self.handle,
+            error = self.backend.load_calibration(self.handle,
                                                self.calibration,
                                                flag)
-            if error != xdll.XDLL.I_OK:
+            if error != self.backend.I_OK:
                 msg = 'Could\'t load' + \
                     'calibration file ' + \
                     str(self.calibration) + \
-                    xdll.error2str(error)
+                    self.backend.error2str(error)
                 raise Exception(msg)
+        self._format = None
+        self._format = self.frame_format  # Geometry after calibration
         return self
 
     def close(self):
@@ -97,23 +163,24 @@ class XevaCam(object):
         Stops capturing, closes capture thread, closes connection.
         '''
         try:
-            if xdll.XDLL.is_capturing(self.handle):
+            if self.backend.is_capturing(self.handle):
                 print('Stop capturing')
-                error = xdll.XDLL.stop_capture(self.handle)
-                if error != xdll.XDLL.I_OK:
-                    xdll.print_error(error)
+                error = self.backend.stop_capture(self.handle)
+                if error != self.backend.I_OK:
+                    self.backend.print_error(error)
                     raise Exception('Could not stop capturing')
                 self.enabled = False
                 self._capture_thread.join(1)
-                if self._capture_thread.isAlive():
+                if self._capture_thread.is_alive():
                     raise Exception('Thread didn\'t stop.')
         except:
             print('Something went wrong closing the camera.')
             raise
         finally:
-            if xdll.XDLL.is_initialised(self.handle):
+            self._format = None
+            if self.backend.is_initialised(self.handle):
                 print('Closing connection.')
-                xdll.XDLL.close_camera(self.handle)
+                self.backend.close_camera(self.handle)
 
     @property
     def enabled(self):
@@ -135,103 +202,242 @@ class XevaCam(object):
             self._enabled = value
 
     def is_alive(self):
-        return self._capture_thread.isAlive()
+        return self._capture_thread.is_alive()
+
+    @property
+    def frame_format(self):
+        '''
+        Frame format of the camera. Asked from the camera once and cached
+        until set_property_value, load_settings, open or close.
+        @return: FrameFormat
+        '''
+        fmt = self._format
+        if fmt is None:
+            frame_type = self.backend.get_frame_type(self.handle)
+            pixel_size = self.backend.pixel_sizes.get(frame_type, 0)
+            dtype = PIXEL_DTYPES.get(pixel_size)
+            if dtype is None:
+                raise Exception('Unsupported pixel size %s' % str(pixel_size))
+            fmt = FrameFormat(self.backend.get_frame_size(self.handle),
+                              self.backend.get_frame_height(self.handle),
+                              self.backend.get_frame_width(self.handle),
+                              frame_type,
+                              dtype,
+                              pixel_size)
+            self._format = fmt
+        return fmt
+
+    @property
+    def output_format(self):
+        '''
+        Format of the frames handlers get, frame_format changed by
+        processing stages like xevacam.processing.Reduction. frame_type stays
+        the camera's.
+        @return: FrameFormat
+        '''
+        fmt = self.frame_format
+        dims, dtype = fmt.dims, np.dtype(fmt.dtype)
+        last = len(self.processors) - 1
+        for i, p in enumerate(self.processors):
+            out_dims, out_dtype = p.output(dims, dtype)
+            if (tuple(out_dims), out_dtype) != (tuple(dims), dtype) and \
+                    i != last:
+                raise Exception('%s changes the frame format and has to be '
+                                'the last processor' % type(p).__name__)
+            dims, dtype = out_dims, out_dtype
+        if not self.processors:
+            return fmt
+        return FrameFormat(int(np.prod(dims)) * dtype.itemsize,
+                           dims[0], dims[1], fmt.frame_type, dtype.type,
+                           dtype.itemsize)
+
+    def invalidate_format(self):
+        '''
+        Makes frame_format ask the camera again, e.g. after changing
+        geometry with direct DLL calls.
+        '''
+        self._format = None
+
+    def set_property_value(self, name, value, unit=''):
+        '''
+        Sets a camera property. Invalidates the cached frame format, since
+        properties like Width or Height change it.
+
+        @param name: Property name, e.g. 'IntegrationTime'
+        @param value: Property value
+        @param unit: Optional unit
+        '''
+        self._format = None
+        error = self.backend.set_property_value(
+            self.handle, name.encode('utf-8'), str(value).encode('utf-8'),
+            unit.encode('utf-8'))
+        if error != self.backend.I_OK:
+            raise Exception('Could not set property %s to %s. %s' %
+                            (name, str(value), self.backend.error2str(error)))
+
+    def load_settings(self, filepath, flags=0):
+        '''
+        Loads camera settings from a file. Invalidates the cached frame
+        format.
+
+        @param filepath: Path to the settings file (.xcf)
+        @param flags: Xeneth load flags
+        '''
+        self._format = None
+        error = self.backend.load_settings(self.handle,
+                                           filepath.encode('utf-8'), flags)
+        if error != self.backend.I_OK:
+            raise Exception('Could not load settings %s. %s' %
+                            (filepath, self.backend.error2str(error)))
 
     def get_frame_size(self):
         '''
-        Asks the camera what is the frame size in bytes.
-        @return: c_ulong
+        Returns the frame size in bytes.
+        @return: int
         '''
-        frame_size = xdll.XDLL.get_frame_size(self.handle)  # Size in bytes
-        return frame_size
+        return self.frame_format.size
 
     def get_frame_dims(self):
         '''
         Returns frame dimensions in tuple(height, width).
-        @return: tuple (c_ulong, c_ulong)
+        @return: tuple (int, int)
         '''
-        frame_width = xdll.XDLL.get_frame_width(self.handle)
-        frame_height = xdll.XDLL.get_frame_height(self.handle)
-        print('width:', frame_width, 'height:', frame_height)
-        return frame_height, frame_width
+        return self.frame_format.dims
 
     def get_frame_type(self):
         '''
         Returns enumeration of camera's frame type.
-        @return: c_ulong
+        @return: int
         '''
-        return xdll.XDLL.get_frame_type(self.handle)
+        return self.frame_format.frame_type
 
     def get_pixel_dtype(self):
         '''
         Returns numpy dtype of the camera's configured data type for frame
         @return: Numpy dtype (np.uint8, np.uint16 or np.uint32)
         '''
-        bytes_in_pixel = self.get_pixel_size()
-        conversions = (None, np.uint8, np.uint16, None, np.uint32)
-        try:
-            pixel_dtype = conversions[bytes_in_pixel]
-        except:
-            raise Exception('Unsupported pixel size %s' % str(bytes_in_pixel))
-        if conversions is None:
-            raise Exception('Unsupported pixel size %s' % str(bytes_in_pixel))
-        return pixel_dtype
+        return self.frame_format.dtype
 
     def get_pixel_size(self):
         '''
         Returns a frame pixel's size in bytes.
         @return: int
         '''
-        frame_t = xdll.XDLL.get_frame_type(self.handle)
-        return xdll.XDLL.pixel_sizes[frame_t]
+        return self.frame_format.pixel_size
 
     def get_frame(self, buffer, frame_t, size, flag=0):
         '''
         Reads a frame from camera. Raises an exception on errors.
 
-        @param buffer: bytes buffer (output) to which a frame is read from
-                       the camera.
+        @param buffer: bytes buffer or memory address (output) to which a
+                       frame is read from the camera.
         @param frame_t: frame type enumeration. Use get_frame_type() to find
                         the native type.
         @param size: frame size in bytes. Use get_frame_dims()
-        @param flag: Type of execution. 0 is non-blocking, xdll.XGF_Blocking
+        @param flag: Type of execution. 0 is non-blocking, XGF_Blocking
                      is blocking.
-        @return: True if got frame, otherwise False
+        @return: True if got frame, False on E_NO_FRAME or E_TIMEOUT
         '''
         # frame_buffer = \
         #     np.zeros((frame_size / pixel_size,),
         #              dtype=np.int16)
         # frame_buffer = bytes(frame_size)
-        error = xdll.XDLL.get_frame(self.handle,
+        error = self.backend.get_frame(self.handle,
                                     frame_t,
                                     flag,
                                     # frame_buffer.ctypes.data,
                                     buffer,
                                     size)
         # ctypes.cast(buffer, ctypes.POINTER(ctypes.c))
-        if error not in (xdll.XDLL.I_OK, xdll.XDLL.E_NO_FRAME):
+        if error not in (self.backend.I_OK,
+                         self.backend.E_NO_FRAME,
+                         self.backend.E_TIMEOUT):
             raise Exception(
-                'Error while getting frame: %s' % xdll.error2str(error))
+                'Error while getting frame: %s' % self.backend.error2str(error))
         # frame_buffer = np.reshape(frame_buffer, frame_dims)
-        return error == xdll.XDLL.I_OK  # , frame_buffer
+        return error == self.backend.I_OK  # , frame_buffer
 
-    def set_handler(self, handler, incl_ctrl_frames=False):
+    def set_handler(self, handler, incl_ctrl_frames=False, threaded=False,
+                    queue_size=8, overflow=BLOCK, batch_frames=0,
+                    batch_latency=0.05):
         '''
         Adds a new output to which frames are written.
 
+        Frames are given to write() as read-only memoryviews of a ring slot,
+        which is reused for later frames after write() returns. A handler
+        which needs to keep frames can define write_slot(slot) instead; it
+        gets the FrameSlot itself and has to retain() and release() it.
+
         @param handler: a file-like object, a stream or object with write()
                         and read() methods.
-        '''
+        @param incl_ctrl_frames: Write a 4 byte control frame (time stamp)
+                                 before each frame.
+        @param threaded: Write to the handler in its own thread so that a
+                         slow handler doesn't delay capturing.
+        @param queue_size: Maximum number of frames queued for a threaded
+                           handler.
+        @param overflow: What a threaded handler does when its queue is full,
+                         xevacam.writers.BLOCK, DROP_OLDEST or DROP_NEWEST.
+        @param batch_frames: Write this many frames at a time with one
+                             (vectored) write. 0 writes every frame. Only
+                             for byte streams like files, not for handlers
+                             with write_slot().
+        @param batch_latency: Seconds a frame may wait for its batch
+        @return: The handler, or its ThreadedHandler/BatchingHandler wrapper
+                 with counters.
+        '''
+        if batch_frames:
+            handler = BatchingHandler(handler,
+                                      incl_ctrl_frames=incl_ctrl_frames,
+                                      batch_frames=batch_frames,
+                                      max_latency=batch_latency)
+            incl_ctrl_frames = False  # Written by the wrapper
+        if threaded:
+            handler = ThreadedHandler(handler,
+                                      incl_ctrl_frames=incl_ctrl_frames,
+                                      maxsize=queue_size,
+                                      overflow=overflow,
+                                      exc_queue=self.exc_queue)
+            incl_ctrl_frames = False  # Written by the wrapper
         self.handlers.append((handler, incl_ctrl_frames))
+        return handler
+
+    def add_processor(self, processor):
+        '''
+        Adds a processing stage, e.g. xevacam.processing.SoftwareCorrection.
+        Stages modify each frame in place in the capture thread, in the order
+        they were added, before the frame is given to handlers.
+
+        @param processor: xevacam.processing.Processor
+        @return: The processor
+        '''
+        if self.is_alive():
+            raise Exception('Can\'t add processors when thread is alive')
+        self.processors.append(processor)
+        return processor
 
     def clear_handlers(self):
         name = 'clear_handlers'
         if not self.is_alive():
+            for h, _ in self.handlers:
+                if isinstance(h, ThreadedHandler):
+                    h.close()
             self.handlers.clear()
             print(name, 'Cleared handlers')
         else:
             raise Exception('Can\'t clear handlers when thread is alive')
 
+    def report_stats(self, interval=1.0, callback=None):
+        '''
+        Starts reporting capture statistics on a fixed interval.
+
+        @param interval: Seconds between reports
+        @param callback: Function called with each stats snapshot dict.
+                         Default logs a summary on INFO level.
+        @return: StatsReporter, call its stop() to stop reporting
+        '''
+        return StatsReporter(self.stats, interval, callback).start()
+
     def check_thread_exceptions(self):
         name = 'check_thread_exceptions'
         try:
@@ -241,34 +447,54 @@ class XevaCam(object):
         else:
             exc_type, exc_obj, exc_trace = exc
             print(name, '%s: %s' % (str(exc_type), str(exc_trace)))
-            raise exc
+            raise exc_obj.with_traceback(exc_trace)
 
     @kbinterrupt_decorate
-    def start_recording(self):
+    def start_recording(self, frames=None):
         '''
         Starts recording frames to handlers.
+
+        @param frames: Stop capturing when this many frames are recorded.
+                       None records until stop_recording.
         '''
         self.enabled = True
+        self.frames_count = 0
+        self._frame_target = frames  # Set before the thread can see frames
+        self._capture_done.clear()
         self._capture_thread = threading.Thread(name='capture_thread',
                                                 target=self.capture_frame_stream)
         self._capture_thread.start()
 
     @kbinterrupt_decorate
-    def wait_recording(self, seconds):
+    def wait_recording(self, seconds=None, frames=None):
         '''
-        Blocks execution and checks there are no exceptions.
+        Blocks execution until the time is up, the frame target is reached or
+        the capture thread stops. Raises the capture thread's exception.
+
         @param seconds: Time how long the function blocks the execution.
+                        None waits without a time limit.
+        @param frames: Stop capturing when this many frames are recorded.
         '''
-        # self.record_time
+        if seconds is None and frames is None:
+            raise Exception('Give seconds, frames or both to wait for.')
         start = time.time()
+        if frames is not None:
+            self._frame_target = frames
+            if self.frames_count >= frames:
+                self.enabled = False
+                self._capture_done.set()
         while True:
-            self.check_thread_exceptions()  # Raises exception
-            end = time.time()
-            t = end-start
-            if end-start >= seconds:
+            if seconds is None:
+                timeout = 0.5
+            else:
+                timeout = min(seconds - (time.time() - start), 0.5)
+                if timeout <= 0:
+                    break
+            # Short timeouts only keep KeyboardInterrupt responsive
+            if self._capture_done.wait(timeout):
                 break
-        self._record_time += t
-        # time.sleep(seconds)
+        self._record_time += time.time() - start
+        self.check_thread_exceptions()  # Raises exception
 
     @kbinterrupt_decorate
     def stop_recording(self):
@@ -278,32 +504,200 @@ class XevaCam(object):
         '''
         start = time.time()
         self.enabled = False
+        blocks = self.acquisition.blocks
+        if blocks:
+            # The capture thread may be waiting for a frame in the DLL
+            self._stop_capture()
         self._capture_thread.join(5)
-        if self._capture_thread.isAlive():
+        if self._capture_thread.is_alive():
             raise Exception('Thread didn\'t stop.')
         end = time.time()
         self._record_time += end-start
-        error = xdll.XDLL.stop_capture(self.handle)
-        if error != xdll.XDLL.I_OK:
-            xdll.print_error(error)
-            raise Exception(
-                'Could not stop capturing. %s' % xdll.error2str(error))
+        if not blocks:
+            self._stop_capture()
+        for h, _ in self.handlers:
+            if isinstance(h, (ThreadedHandler, BatchingHandler)):
+                h.flush()  # Write out queued frames
         self.check_thread_exceptions()  # Raises exception
 
         # Return ENVI metadata about the recording
-        frame_dims = self.get_frame_dims()
-        frame_type = self.get_frame_type()
-        meta = (('samples', frame_dims[1]),
-                ('bands', self.frames_count),
-                ('lines', frame_dims[0]),
+        fmt = self.output_format
+        # A frame is one line of the cube, frame rows are its bands
+        meta = (('samples', fmt.width),
+                ('bands', fmt.height),
+                ('lines', self.frames_count),
                 ('data type',
-                 utils.datatype2envitype(
-                     'u' + str(xdll.XDLL.pixel_sizes[frame_type]))),
+                 utils.datatype2envitype('u' + str(fmt.pixel_size))),
                 ('interleave', 'bil'),
-                ('byte order', 1),
-                ('description', 'Capture time = %d\nFrame time stamps = %s' % (self._record_time, str(self._times))))
+                ('byte order', 0 if sys.byteorder == 'little' else 1),
+                ('description', self._describe_recording()),
+                ('dropped frames', self.gaps.missing),
+                ('dropped frame indices', '{%s}' % ', '.join(
+                    str(i) for i in self.gaps.indices[:MAX_DROPPED_INDICES])))
+        for p in self.processors:
+            meta += tuple(p.metadata())  # E.g. band rows of a Reduction
+        for h, _ in self.handlers:
+            finalize = getattr(h, 'finalize', None)
+            if finalize is not None:
+                # E.g. ENVIWriter writes its header and time stamps
+                finalize(meta, self.timestamps)
         return meta
 
+    def _stop_capture(self):
+        error = self.backend.stop_capture(self.handle)
+        if error != self.backend.I_OK:
+            self.backend.print_error(error)
+            raise Exception(
+                'Could not stop capturing. %s' % self.backend.error2str(error))
+
+    def iter_frames(self, count=None, timeout=5.0, queue_size=4):
+        '''
+        Records and yields frames as typed (height, width) arrays. A frame is
+        valid until the next one is asked for. Recording stops after count
+        frames or when the loop is left.
+
+        Frames go through a bounded queue. When the consumer is slower than
+        the camera, the capture thread waits for room in the queue and the
+        camera drops frames, which are counted in gaps.
+
+        @param count: Number of frames, None records until the loop is left
+        @param timeout: Seconds to wait for a frame before raising an
+                        exception. None waits forever.
+        @param queue_size: Frames queued for the consumer
+        '''
+        fmt = self.output_format
+        dims = fmt.dims
+        dtype = fmt.dtype
+        stream = XevaStream(maxsize=queue_size, overflow=BLOCK)
+        self.handlers.append((stream, False))
+        item = None
+        started = False
+        try:
+            self.start_recording(frames=count)
+            started = True
+            received = 0
+            while count is None or received < count:
+                deadline = None if timeout is None else \
+                    time.perf_counter() + timeout
+                while True:
+                    item = stream.read_slot(0.1)
+                    if item is not None:
+                        break
+                    if self._capture_done.is_set() and \
+                            stream.is_queue_empty():
+                        self.check_thread_exceptions()  # Raises exception
+                        return
+                    if deadline is not None and \
+                            time.perf_counter() > deadline:
+                        raise Exception(
+                            'No frame from camera in %.1f seconds' % timeout)
+                if isinstance(item, bytes):
+                    # Copied because the frame ring was running out of slots
+                    yield np.frombuffer(item, dtype=dtype).reshape(dims)
+                else:
+                    yield item.frame
+                    item.release()
+                item = None
+                received += 1
+        finally:
+            if item is not None and not isinstance(item, bytes):
+                item.release()
+            stream.close()  # Wakes up the capture thread if it waits
+            try:
+                if started:
+                    self.stop_recording()
+            finally:
+                self.handlers.remove((stream, False))
+
+    @asynccontextmanager
+    async def recording(self, maxsize=8, overflow=DROP_OLDEST):
+        '''
+        Async context manager which records while in the context, e.g.
+
+            async with cam.recording():
+                async for frame in cam.aframes():
+                    ...
+
+        Stopping runs in an executor thread, so the event loop isn't blocked.
+        Exceptions of the capture thread are raised here and from aframes().
+
+        @param maxsize: Frames buffered for aframes() before dropping
+        @param overflow: xevacam.writers.DROP_OLDEST or DROP_NEWEST
+        '''
+        loop = asyncio.get_running_loop()
+        if self._aqueue is not None:
+            raise Exception('Already recording')
+        q = AsyncFrameQueue(loop, maxsize, overflow)
+        self.handlers.append((q, False))
+        self._done_callbacks.append(q.finish)
+        self._aqueue = q
+        try:
+            self.start_recording()
+            yield self
+        finally:
+            self._aqueue = None
+            try:
+                await loop.run_in_executor(None, self.stop_recording)
+            finally:
+                self._done_callbacks.remove(q.finish)
+                self.handlers.remove((q, False))
+                q.close()
+
+    async def aframes(self, maxsize=8, overflow=DROP_OLDEST):
+        '''
+        Async generator of frames as typed (height, width) arrays. A frame is
+        valid until the next one is asked for. Inside recording() yields its
+        frames, otherwise records while iterated. Then breaking out of the
+        loop stops recording only when the generator is closed, use
+        contextlib.aclosing() to close it right away.
+
+        @param maxsize: Frames buffered before dropping, if not recording
+        @param overflow: Overflow policy, if not recording
+        '''
+        if self._aqueue is None:
+            async with self.recording(maxsize, overflow):
+                async for frame in self.aframes():
+                    yield frame
+            return
+        async for frame in self._aqueue:
+            yield frame
+        self.check_thread_exceptions()  # Raises exception
+
+    def _describe_recording(self):
+        '''
+        Returns ENVI description of the recording with time stamp summary.
+        Time stamps themselves go to a sidecar file, see create_envi_hdr.
+        '''
+        s = self.timestamps.summary()
+        return '{Capture time = %d s, ' \
+            'First frame = %d ns, ' \
+            'Last frame = %d ns, ' \
+            'Mean frame period = %.3f ms, ' \
+            'Frame period jitter = %.3f ms}' % (self._record_time,
+                                                s['first'],
+                                                s['last'],
+                                                s['mean period'] / 1e6,
+                                                s['jitter'] / 1e6)
+
+    def _fill_gap(self, ring, publish, missing, last_time, curr_time):
+        '''
+        Publishes zero filled placeholder frames for missed frames, so that
+        each cube line stays in its place. Placeholders have interpolated
+        time stamps and placeholder attribute set.
+        '''
+        step = (curr_time - last_time) // (missing + 1)
+        for k in range(missing):
+            slot = ring.acquire(timeout=0.1)
+            if slot is None:
+                logger.warning('No free frame slot for placeholder frame')
+                return
+            try:
+                slot.array[:] = 0
+                slot.placeholder = True
+                publish(slot, last_time + (k + 1) * step)
+            finally:
+                slot.release()
+
     def capture_frame_stream(self):
         '''
         Thread function for continuous camera capturing.
@@ -311,65 +705,121 @@ class XevaCam(object):
         '''
         name = 'capture_frame_stream'
         try:
-            error = xdll.XDLL.start_capture(self.handle)
-            if error != xdll.XDLL.I_OK:
-                xdll.print_error(error)
+            error = self.backend.start_capture(self.handle)
+            if error != self.backend.I_OK:
                 raise Exception(
-                    '%s Starting capture failed! %s' % (name, xdll.error2str(error)))
-            if xdll.XDLL.is_capturing(self.handle) == 0:
+                    '%s Starting capture failed! %s' % (name, self.backend.error2str(error)))
+            if self.backend.is_capturing(self.handle) == 0:
                 for i in range(5):
-                    if xdll.XDLL.is_capturing(self.handle) == 0:
-                        print(name, 'Camera is not capturing. Retry number %d' % i)
+                    if self.backend.is_capturing(self.handle) == 0:
+                        logger.warning('%s Camera is not capturing. Retry number %d', name, i)
                         time.sleep(0.1)
                     else:
                         break
-            if xdll.XDLL.is_capturing(self.handle) == 0:
+            if self.backend.is_capturing(self.handle) == 0:
                 raise Exception('Camera is not capturing.')
-            elif xdll.XDLL.is_capturing(self.handle):
+            elif self.backend.is_capturing(self.handle):
                 self.frames_count = 0
-                size = self.get_frame_size()
-                dims = self.get_frame_dims()
-                frame_t = self.get_frame_type()
-                # pixel_size = self.get_pixel_size()
-                print(name, 'Size:', size, 'Dims:', dims, 'Frame type:', frame_t)
-                frame_buffer = bytes(size)
-                # ctrl_frame_buffer = bytearray(4)  # 32 bits
-                start_time = utils.get_time()
-                while self._enabled:
-                    # frame_buffer = \
-                    #     np.zeros((size / pixel_size,),
-                    #              dtype=np.int16)
-                    # buffer = memoryview(frame_buffer)
-                    while True:
-                        ok = self.get_frame(frame_buffer,
-                                            frame_t=frame_t,
-                                            size=size,
-                                            flag=0)  # Non-blocking
-                        # xdll.XGF_Blocking
-                        if ok:
-                            curr_time = utils.get_time() - start_time
-                            self._times.append(curr_time)
-                            ctrl_frame_buffer = struct.pack('I', curr_time)  # 4 bytes
-                            for h, incl_ctrl_frame in self.handlers:
-                                # print(name,
-                                #       'Writing to %s' % str(h.__class__.__name__))
-                                if incl_ctrl_frame:
-                                    h.write(ctrl_frame_buffer)
-                                wrote_bytes = h.write(frame_buffer)
-                                # print(name,
-                                #       'Wrote to %s:' % str(h.__class__.__name__),
-                                #       wrote_bytes,
-                                #       'bytes')
-                            break
-                        # else:
-                        #     print(name, 'Missed frame', i)
+                fmt = self.frame_format
+                size = fmt.size
+                dims = fmt.dims
+                frame_t = fmt.frame_type
+                out = self.output_format
+                logger.debug('%s Format: %s Output: %s', name, str(fmt),
+                             str(out))
+                dtype = fmt.dtype
+                self.ring = ring = FrameRing(size, self.ring_slots, dims, dtype,
+                                             out.dims, out.dtype)
+                # Handlers can't change while capturing
+                handlers = [(h, incl_ctrl_frame, getattr(h, 'write_slot', None))
+                            for h, incl_ctrl_frame in self.handlers]
+                processors = list(self.processors)
+                for p in processors:
+                    p.reset()
+                    p.prepare(dims, dtype)
+                acquisition = self.acquisition
+                acquisition.reset()
+                stats = self.stats
+                stats.reset([h for h, _, _ in handlers], acquisition, ring,
+                            processors)
+                handler_ns = stats.handler_ns
+                handler_writes = stats.handler_writes
+                gaps = self.gaps
+                gaps.reset()
+                get_frame_counter = self.backend.get_frame_counter
+                timestamps = self.timestamps
+                start_time = time.perf_counter_ns()
+                timestamps.clear(origin=start_time)
+
+                def publish(slot, curr_time):
+                    ''' Gives a frame to every handler. '''
+                    timestamps.append(curr_time)
+                    slot.seq = self.frames_count
+                    slot.timestamp = curr_time
+                    # Control frame is milliseconds, wraps around
+                    struct.pack_into('I', slot.ctrl, 0,
+                                     (curr_time // 1000000) & 0xFFFFFFFF)
+                    stats.frame(curr_time)
+                    i = 0
+                    for h, incl_ctrl_frame, write_slot in handlers:
+                        t = time.perf_counter_ns()
+                        if incl_ctrl_frame:
+                            h.write(slot.ctrl_frame)
+                        if write_slot is not None:
+                            write_slot(slot)
+                        else:
+                            h.write(slot.view)
+                        handler_ns[i] += time.perf_counter_ns() - t
+                        handler_writes[i] += 1
+                        i += 1
                     self.frames_count += 1
+
+                last_time = 0
+                while self._enabled:
+                    slot = ring.acquire(timeout=0.1)
+                    if slot is None:
+                        continue  # Handlers hold every slot
+                    try:
+                        while self._enabled:
+                            ok = acquisition.acquire(self,
+                                                     slot.address,
+                                                     frame_t=frame_t,
+                                                     size=size)
+                            if ok:
+                                curr_time = time.perf_counter_ns() - start_time
+                                missing = gaps.check(
+                                    curr_time, get_frame_counter(self.handle))
+                                if missing:
+                                    stats.dropped_frames += missing
+                                    logger.debug('%s %d frames missing before '
+                                                 'frame %d', name, missing,
+                                                 self.frames_count)
+                                    if self.fill_gaps:
+                                        self._fill_gap(ring, publish, missing,
+                                                       last_time, curr_time)
+                                for p in processors:
+                                    p.process(slot)
+                                slot.placeholder = False
+                                publish(slot, curr_time)
+                                last_time = curr_time
+                                target = self._frame_target
+                                if target is not None and \
+                                        self.frames_count >= target:
+                                    self._enabled = False
+                                break
+                    finally:
+                        slot.release()
             else:
                 raise Exception('Camera is not capturing.')
         except Exception as e:
+            self.stats.errors += 1
             self.exc_queue.put(sys.exc_info())
-            print(name, '%s(%s): %s' % (type(e).__name__, str(e.errno), e.strerror))
-        print(name, 'Thread closed')
+            logger.error('%s %s: %s', name, type(e).__name__, str(e))
+        finally:
+            self._capture_done.set()  # Wakes up wait_recording
+            for callback in self._done_callbacks:
+                callback()
+        logger.debug('%s Thread closed', name)
 
     def capture_single_frame(self):
         '''
@@ -377,21 +827,21 @@ class XevaCam(object):
         '''
         name = 'capture_single_frame'
         frame = None
-        error = xdll.XDLL.start_capture(self.handle)
-        if error != xdll.XDLL.I_OK:
-            xdll.print_error(error)
+        error = self.backend.start_capture(self.handle)
+        if error != self.backend.I_OK:
+            self.backend.print_error(error)
             raise Exception(
-                '%s Starting capture failed! %s' % (name, xdll.error2str(error)))
-        if xdll.XDLL.is_capturing(self.handle) == 0:
+                '%s Starting capture failed! %s' % (name, self.backend.error2str(error)))
+        if self.backend.is_capturing(self.handle) == 0:
             for i in range(5):
-                if xdll.XDLL.is_capturing(self.handle) == 0:
+                if self.backend.is_capturing(self.handle) == 0:
                     print(name, 'Camera is not capturing. Retry number %d' % i)
                     time.sleep(0.1)
                 else:
                     break
-        if xdll.XDLL.is_capturing(self.handle) == 0:
+        if self.backend.is_capturing(self.handle) == 0:
             raise Exception('Camera is not capturing.')
-        elif xdll.XDLL.is_capturing(self.handle):
+        elif self.backend.is_capturing(self.handle):
             size = self.get_frame_size()
             dims = self.get_frame_dims()
             frame_t = self.get_frame_type()
@@ -415,30 +865,3 @@ class XevaCam(object):
         print(name, 'Finished')
         return frame, size, dims, frame_t
 
-
-"""
-class XevaImage(object):
-
-    def __init__(self, byte_stream, dims, dtype):
-        import io
-        if not isinstance(byte_stream, io.BytesIO):
-            raise Exception('')
-        self.stream = byte_stream
-
-    @contextmanager
-    def open(self, mode='r'):
-        try:
-            yield self
-        finally:
-            pass
-
-    def read_numpy_array(self, target_order=None):
-        ''' Reads BytesIO stream Numpy 3D ndarray '''
-        self.stream.read()
-        # TODO:
-        # map(lambda x: x, self.lines)
-        # trans = self._get_permutation_tuple(interleave_order, target_order)
-        # data = np.transpose(data, trans)
-        # return data
-        return 0
-"""
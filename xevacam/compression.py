@@ -0,0 +1,427 @@
+'''
+Created on 17.10.2026
+
+Compressed recordings. Frames are compressed in chunks on a process pool
+and written one after another to a single file, followed by an index of
+the chunks so that a reader can decompress only the frames it needs:
+
+    magic b'XEVACMP1'
+    compressed chunks
+    index, one INDEX_RECORD per chunk
+    JSON trailer: codec, frame geometry and recording metadata
+    footer FOOTER: index offset, chunk count, trailer length, magic
+'''
+
+import bz2
+import collections
+import concurrent.futures
+import json
+import lzma
+import multiprocessing
+import os
+import queue
+import struct
+import threading
+import time
+import zlib
+import numpy as np
+from xevacam.timestamps import sidecar_path
+
+MAGIC = b'XEVACMP1'
+FOOTER = struct.Struct('<QQQ8s')
+# Byte offset and length of a chunk, its first frame and number of frames
+INDEX_RECORD = np.dtype([('offset', '<u8'), ('length', '<u8'),
+                         ('first', '<u8'), ('frames', '<u4')])
+
+CODECS = {'zlib': (zlib.compress, zlib.decompress),
+          'lzma': (lambda data, level: lzma.compress(data, preset=level),
+                   lzma.decompress),
+          'bz2': (bz2.compress, bz2.decompress),
+          'none': (lambda data, level: data, bytes)}
+DEFAULT_LEVELS = {'zlib': 1, 'lzma': 0, 'bz2': 9, 'none': 0}
+
+
+def _delta(chunk):
+    '''
+    Replaces each frame (cube line) but the first with its difference to the
+    previous one. Differences wrap around in the unsigned pixel type.
+    '''
+    chunk[1:] -= chunk[:-1].copy()
+    return chunk
+
+
+def _compress_chunk(data, codec, level, delta, dtype, frames):
+    '''
+    Compresses a chunk of frames. Runs in a pool worker.
+
+    @return: tuple(compressed bytes, seconds spent)
+    '''
+    t = time.perf_counter()
+    if delta:
+        chunk = np.frombuffer(data, dtype=dtype).reshape(frames, -1).copy()
+        data = _delta(chunk).tobytes()
+    compressed = CODECS[codec][0](data, level)
+    return compressed, time.perf_counter() - t
+
+
+def _start_pool(workers):
+    '''
+    Starts a process pool and waits until every worker is running.
+    '''
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        'forkserver' if 'forkserver' in methods else 'spawn')
+    executor = concurrent.futures.ProcessPoolExecutor(workers,
+                                                      mp_context=context)
+    # Workers start on demand, one task per worker starts them all
+    futures = [executor.submit(os.getpid) for _ in range(workers)]
+    concurrent.futures.wait(futures)
+    return executor
+
+
+class CompressedWriter(object):
+    '''
+    Recording handler which writes frames losslessly compressed.
+
+    The capture thread only copies frames to a preallocated chunk buffer and
+    hands full chunks over to a writer thread. The writer thread submits
+    them to a process pool for compression and writes the compressed chunks
+    and the index in order as they finish. Chunks are double buffered: the
+    capture thread fills one while the writer thread submits the other. If
+    more than max_pending chunks are being compressed, the writer thread
+    waits for the oldest one, and write_slot waits when both buffers are
+    still in use.
+
+    Pool processes are started in the constructor, before recording, with
+    the forkserver method (spawn where it isn't available), so the process
+    running the capture thread is never forked. The main module has to be
+    guarded with if __name__ == '__main__'. zlib, lzma and bz2 release the
+    GIL, so a ThreadPoolExecutor given as executor works too.
+    '''
+
+    def __init__(self, filepath, codec='zlib', level=None, chunk_frames=64,
+                 delta=False, workers=None, max_pending=None, executor=None):
+        '''
+        @param filepath: Path of the compressed file
+        @param codec: 'zlib', 'lzma', 'bz2' or 'none'
+        @param level: Compression level, default depends on codec
+        @param chunk_frames: Frames per compressed chunk. Reading a frame
+                             decompresses its whole chunk.
+        @param delta: Compress differences between consecutive frames,
+                      which helps with smooth scenes
+        @param workers: Number of pool processes, default is CPU count
+        @param max_pending: Chunks in compression before the writer thread
+                            waits. Default is twice the number of workers.
+        @param executor: concurrent.futures executor to use instead of an
+                         own process pool
+        '''
+        if codec not in CODECS:
+            raise Exception('Unknown codec %s' % codec)
+        if chunk_frames < 1:
+            raise Exception('chunk_frames must be at least 1')
+        self.filepath = filepath
+        self.codec = codec
+        self.level = DEFAULT_LEVELS[codec] if level is None else level
+        self.chunk_frames = chunk_frames
+        self.delta = delta
+        workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or 2 * workers
+        self._own_executor = executor is None
+        if executor is None:
+            executor = _start_pool(workers)
+        self._executor = executor
+        self._file = open(filepath, 'wb')
+        self._file.write(MAGIC)
+        self._pending = collections.deque()  # (future, first, frames, size)
+        self._index = []
+        self._free = queue.Queue()  # Chunk buffers the capture thread fills
+        self._chunks = queue.Queue()  # Chunks, flush events, None to stop
+        self._chunk = None  # Preallocated (chunk_frames, frame_size) buffer
+        self._filled = 0
+        self._error = None  # Exception of the writer thread
+        self.dims = None
+        self.dtype = None
+        self.frame_size = None
+        self.frames = 0  # Frames given to the writer
+        self.meta = None
+        self.raw_bytes = 0  # Bytes compressed so far
+        self.compressed_bytes = 0
+        self.codec_time = 0.0  # Seconds spent in compression by workers
+        self.waits = 0  # Times write_slot had to wait for a chunk buffer
+        self.pool_waits = 0  # Times the writer thread waited for the pool
+        self._thread = threading.Thread(name='compressed writer thread',
+                                        target=self._run,
+                                        daemon=True)
+        self._thread.start()
+
+    def writable(self):
+        return True
+
+    def stats(self):
+        '''
+        @return: dict with compression ratio and codec throughput
+        '''
+        return {'chunks': len(self._index),
+                'pending': len(self._pending),
+                'raw_bytes': self.raw_bytes,
+                'compressed_bytes': self.compressed_bytes,
+                'ratio': self.raw_bytes / self.compressed_bytes
+                if self.compressed_bytes else 0.0,
+                'codec_time': self.codec_time,
+                'codec_mb_per_s': self.raw_bytes / self.codec_time / 1e6
+                if self.codec_time else 0.0,
+                'waits': self.waits,
+                'pool_waits': self.pool_waits}
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def _next_chunk(self):
+        while True:
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                self.waits += 1
+                self._check()
+
+    def _store(self, array):
+        self._check()
+        if self.frame_size is None:
+            self.frame_size = len(array)
+            for _ in range(2):
+                self._free.put(np.empty((self.chunk_frames, self.frame_size),
+                                        dtype=np.uint8))
+        elif len(array) != self.frame_size:
+            raise Exception(
+                '%s got %d bytes, frame size is %d. Control frames are not '
+                'supported.' % (type(self).__name__, len(array),
+                                self.frame_size))
+        if self._chunk is None:
+            self._chunk = self._next_chunk()
+        self._chunk[self._filled] = array
+        self._filled += 1
+        self.frames += 1
+        if self._filled == self.chunk_frames:
+            self._hand_over()
+
+    def write_slot(self, slot):
+        if self.dims is None and slot.frame is not None:
+            self.dims = slot.frame.shape
+            self.dtype = slot.frame.dtype
+        self._store(slot.array)
+        return len(slot)
+
+    def write(self, b):
+        self._store(np.frombuffer(b, dtype=np.uint8))
+        return len(b)
+
+    def _hand_over(self):
+        '''
+        Gives the filled part of the chunk buffer to the writer thread.
+        '''
+        n = self._filled
+        if n == 0:
+            return
+        self._chunks.put((self._chunk, self.frames - n, n))
+        self._chunk = None
+        self._filled = 0
+
+    def _run(self):
+        '''
+        Writer thread. Submits chunks and writes the compressed ones.
+        '''
+        try:
+            while True:
+                item = self._chunks.get()
+                if item is None:
+                    return
+                if isinstance(item, threading.Event):
+                    while self._pending:
+                        self._write_oldest()
+                    self._file.flush()
+                    item.set()
+                    continue
+                self._submit(*item)
+        except Exception as e:
+            self._error = e
+        finally:
+            for future, _, _, _ in self._pending:
+                future.cancel()
+
+    def _submit(self, chunk, first, n):
+        data = chunk[:n].tobytes()
+        self._free.put(chunk)
+        self._write_done()
+        if len(self._pending) >= self.max_pending:
+            self.pool_waits += 1
+            self._write_oldest()
+        dtype = self.dtype if self.delta and self.dtype is not None \
+            else np.uint8
+        future = self._executor.submit(_compress_chunk, data,
+                                       self.codec, self.level,
+                                       self.delta, np.dtype(dtype).str, n)
+        self._pending.append((future, first, n, n * self.frame_size))
+
+    def _write_oldest(self):
+        future, first, frames, size = self._pending.popleft()
+        data, seconds = future.result()
+        record = (self._file.tell(), len(data), first, frames)
+        self._file.write(data)
+        self._index.append(record)
+        self.raw_bytes += size
+        self.compressed_bytes += len(data)
+        self.codec_time += seconds
+
+    def _write_done(self):
+        # Chunks are written in order, stops at the first unfinished one
+        while self._pending and self._pending[0][0].done():
+            self._write_oldest()
+
+    def flush(self):
+        '''
+        Hands over the partial chunk and waits until the writer thread has
+        written every chunk.
+        '''
+        self._check()
+        self._hand_over()
+        done = threading.Event()
+        self._chunks.put(done)
+        while not done.wait(0.1):
+            if not self._thread.is_alive():
+                break
+        self._check()
+
+    def finalize(self, meta=(), timestamps=None):
+        '''
+        Called by XevaCam.stop_recording. Writes pending chunks, the index
+        and the time stamp sidecar and closes the file.
+        '''
+        self.meta = meta
+        self.close()
+        if timestamps is not None:
+            timestamps.save(sidecar_path(self.filepath))
+
+    def close(self):
+        if self._file is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._chunks.put(None)
+            self._thread.join()
+            if self._own_executor:
+                self._executor.shutdown()
+            if self._error is not None:
+                self._file.close()
+                self._file = None
+        index_offset = self._file.tell()
+        self._file.write(np.array(self._index, dtype=INDEX_RECORD).tobytes())
+        trailer = json.dumps({
+            'codec': self.codec,
+            'level': self.level,
+            'delta': self.delta,
+            'frames': self.frames,
+            'frame size': self.frame_size,
+            'dims': None if self.dims is None else list(self.dims),
+            'dtype': None if self.dtype is None else np.dtype(self.dtype).str,
+            'chunk frames': self.chunk_frames,
+            'meta': [[str(k), str(v)] for k, v in (self.meta or ())]
+        }).encode('utf-8')
+        self._file.write(trailer)
+        self._file.write(FOOTER.pack(index_offset, len(self._index),
+                                     len(trailer), MAGIC))
+        self._file.close()
+        self._file = None
+
+
+class CompressedReader(object):
+    '''
+    Random access reader for CompressedWriter files. Only the chunks of the
+    requested frames are read and decompressed. The latest chunk is cached.
+    '''
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._file = open(filepath, 'rb')
+        if self._file.read(len(MAGIC)) != MAGIC:
+            raise Exception('%s is not a compressed recording' % filepath)
+        self._file.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, chunks, trailer_size, magic = FOOTER.unpack(
+            self._file.read(FOOTER.size))
+        if magic != MAGIC:
+            raise Exception('%s is incomplete, no index found' % filepath)
+        self._file.seek(index_offset)
+        self.index = np.frombuffer(
+            self._file.read(chunks * INDEX_RECORD.itemsize), dtype=INDEX_RECORD)
+        info = json.loads(self._file.read(trailer_size).decode('utf-8'))
+        self.codec = info['codec']
+        self.delta = info['delta']
+        self.frames = info['frames']
+        self.frame_size = info['frame size']
+        self.dims = None if info['dims'] is None else tuple(info['dims'])
+        self.dtype = np.dtype(info['dtype'] or np.uint8)
+        self.meta = tuple(tuple(m) for m in info['meta'])
+        self._firsts = self.index['first'].astype(np.int64)
+        self._cached = (None, None)  # Chunk number, frames array
+
+    def __len__(self):
+        return self.frames
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _read_chunk(self, c):
+        if self._cached[0] == c:
+            return self._cached[1]
+        offset, length, first, frames = self.index[c]
+        self._file.seek(int(offset))
+        data = CODECS[self.codec][1](self._file.read(int(length)))
+        dtype = self.dtype if self.delta else np.uint8
+        chunk = np.frombuffer(data, dtype=dtype).reshape(int(frames), -1)
+        if self.delta:
+            chunk = np.cumsum(chunk, axis=0, dtype=dtype)
+        chunk = chunk.view(self.dtype)
+        if self.dims is not None:
+            chunk = chunk.reshape((int(frames),) + self.dims)
+        self._cached = (c, chunk)
+        return chunk
+
+    def frame(self, i):
+        '''
+        Returns frame i as a (bands, samples) array, or flat if the frame
+        dimensions are unknown.
+        '''
+        if i < 0:
+            i += self.frames
+        if not 0 <= i < self.frames:
+            raise IndexError('Frame %d out of range' % i)
+        c = int(np.searchsorted(self._firsts, i, side='right')) - 1
+        return self._read_chunk(c)[i - self._firsts[c]]
+
+    def __getitem__(self, i):
+        return self.frame(i)
+
+    def read_frames(self, start=0, stop=None):
+        '''
+        Returns frames start...stop-1 as a (lines, bands, samples) array.
+        '''
+        stop = self.frames if stop is None else min(stop, self.frames)
+        shape = self.dims if self.dims is not None else \
+            (self.frame_size // self.dtype.itemsize,)
+        out = np.empty((max(stop - start, 0),) + shape, dtype=self.dtype)
+        i = start
+        while i < stop:
+            c = int(np.searchsorted(self._firsts, i, side='right')) - 1
+            chunk = self._read_chunk(c)
+            offset = i - int(self._firsts[c])
+            n = min(len(chunk) - offset, stop - i)
+            out[i - start:i - start + n] = chunk[offset:offset + n]
+            i += n
+        return out
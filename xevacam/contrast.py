@@ -0,0 +1,105 @@
+'''
+Created on 17.10.2026
+'''
+
+import numpy as np
+
+
+class AutoContrast(object):
+    '''
+    Display limits for previews from a running histogram.
+
+    Each update counts a strided subsample of the frame into a histogram of
+    power of two wide bins, after multiplying the old counts by decay. Bins
+    are as narrow as the largest pixel value seen allows; when a larger value
+    comes, neighbouring bins are merged. Limits are the low and high
+    percentiles of the histogram, so contrast follows the scene with a small
+    fixed cost per frame.
+    '''
+
+    def __init__(self, low=1.0, high=99.0, bins=4096, step=4, decay=0.9):
+        '''
+        @param low: Lower clip percentile
+        @param high: Upper clip percentile
+        @param bins: Histogram bins, rounded down to a power of two
+        @param step: Use every step'th row and column of a frame
+        @param decay: Weight of the old histogram per update, 0 uses only
+                      the latest frame
+        '''
+        if not 0 <= low < high <= 100:
+            raise Exception('Percentiles must be 0 <= low < high <= 100')
+        self.low = low
+        self.high = high
+        self.bins = 1 << (int(bins).bit_length() - 1)
+        self.step = step
+        self.decay = decay
+        self.reset()
+
+    def reset(self):
+        self.histogram = None
+        self._shift = 0  # log2 of bin width
+
+    def _allocate(self, dtype):
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'u':
+            raise Exception('%s supports unsigned integer pixels, got %s' %
+                            (type(self).__name__, dtype))
+        self._shift = 0
+        self.histogram = np.zeros(self.bins, dtype=np.float64)
+
+    def _fit(self, maximum):
+        '''
+        Widens the bins until maximum fits to the histogram.
+        '''
+        shift = max(maximum.bit_length() - self.bins.bit_length() + 1, 0)
+        if shift <= self._shift:
+            return
+        merge = 1 << min(shift - self._shift, self.bins.bit_length() - 1)
+        merged = self.histogram.reshape(-1, merge).sum(axis=1)
+        self.histogram[:] = 0
+        self.histogram[:len(merged)] = merged
+        self._shift = shift
+
+    def update(self, frame, step=None):
+        '''
+        Adds a frame to the histogram.
+
+        @param frame: Frame array, e.g. (height, width) or new lines of a
+                      line scan
+        @param step: Subsampling step, default is self.step. Applies to every
+                     axis.
+        '''
+        if self.histogram is None:
+            self._allocate(frame.dtype)
+        step = self.step if step is None else step
+        sample = frame[(slice(None, None, step),) * frame.ndim]
+        if sample.size == 0:
+            return
+        self._fit(int(sample.max()))
+        indices = np.right_shift(sample, self._shift).astype(np.intp)
+        counts = np.bincount(indices.ravel(), minlength=len(self.histogram))
+        self.histogram *= self.decay
+        self.histogram += counts
+
+    def limits(self):
+        '''
+        @return: tuple(vmin, vmax) for set_clim, None if no frames yet
+        '''
+        if self.histogram is None:
+            return None
+        cdf = np.cumsum(self.histogram)
+        total = cdf[-1]
+        if total <= 0:
+            return None
+        lo = int(np.searchsorted(cdf, self.low / 100 * total))
+        hi = int(np.searchsorted(cdf, self.high / 100 * total))
+        vmin = lo << self._shift
+        vmax = (hi + 1) << self._shift  # Upper edge of the bin
+        return vmin, max(vmax, vmin + 1)
+
+    def __call__(self, frame):
+        '''
+        Updates with frame and returns the limits.
+        '''
+        self.update(frame)
+        return self.limits()
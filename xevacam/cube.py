@@ -0,0 +1,135 @@
+'''
+Created on 17.10.2026
+'''
+
+import threading
+import numpy as np
+from xevacam.envi import INTERLEAVES
+
+
+class CubeAssembler(object):
+    '''
+    Recording handler which assembles frames into an in-memory data cube.
+
+    Frames are copied straight to their lines of a preallocated
+    (lines, bands, samples) array, which grows chunk_lines lines at a time,
+    or by half of its size when that is more. While recording, lines() gives
+    a view of the lines captured so far. Lines in it don't change anymore,
+    so the view stays consistent while capturing goes on.
+    '''
+
+    def __init__(self, chunk_lines=1024, dims=None, dtype=None):
+        '''
+        @param chunk_lines: Number of lines the cube grows at least at a time
+        @param dims: Frame dimensions tuple(height, width). Only needed if
+                     frames come through write() instead of write_slot().
+        @param dtype: Numpy pixel dtype, needed with dims.
+        '''
+        if chunk_lines < 1:
+            raise Exception('chunk_lines must be at least 1')
+        self.chunk_lines = chunk_lines
+        self.dims = None if dims is None else tuple(dims)
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.meta = None  # ENVI metadata, set when recording stops
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        '''
+        Drops the assembled cube.
+        '''
+        with self._lock:
+            self._cube = None
+            self._lines = 0
+
+    def writable(self):
+        return True
+
+    @property
+    def capacity(self):
+        return 0 if self._cube is None else len(self._cube)
+
+    def _grow(self):
+        capacity = self.capacity + max(self.chunk_lines, self.capacity // 2)
+        cube = np.empty((capacity,) + self.dims, dtype=self.dtype)
+        if self._cube is not None:
+            cube[:self._lines] = self._cube[:self._lines]
+        # Readers keep using the old array until they ask for lines() again
+        self._cube = cube
+
+    def _store(self, frame):
+        if self._lines == self.capacity:
+            with self._lock:
+                self._grow()
+        self._cube[self._lines] = frame
+        with self._lock:
+            self._lines += 1
+
+    def write_slot(self, slot):
+        if slot.frame is None:
+            return self.write(slot.view)
+        if self.dims is None:
+            self.dims = slot.frame.shape
+            self.dtype = slot.frame.dtype
+        self._store(slot.frame)
+        return len(slot)
+
+    def write(self, b):
+        if self.dims is None:
+            raise Exception('%s needs dims and dtype for write()' %
+                            type(self).__name__)
+        frame = np.frombuffer(b, dtype=self.dtype)
+        if frame.size != self.dims[0] * self.dims[1]:
+            raise Exception(
+                '%s got %d bytes, frame size is %d. Control frames are not '
+                'supported.' % (type(self).__name__, len(b),
+                                self.dims[0] * self.dims[1] *
+                                self.dtype.itemsize))
+        self._store(frame.reshape(self.dims))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def finalize(self, meta, timestamps=None):
+        self.meta = meta
+
+    def lines(self, interleave='bil'):
+        '''
+        Returns the lines captured so far as a view. Safe to call while
+        capturing.
+
+        @param interleave: 'bil' (lines, bands, samples), 'bsq' (bands,
+                           lines, samples) or 'bip' (lines, samples, bands)
+        @return: ndarray view, None if nothing has been captured
+        '''
+        interleave = interleave.lower()
+        if interleave not in INTERLEAVES:
+            raise Exception('Unknown interleave %s' % interleave)
+        with self._lock:
+            cube, lines = self._cube, self._lines
+        if cube is None:
+            return None
+        return cube[:lines].transpose(INTERLEAVES[interleave])
+
+    def cube(self, interleave='bil', out=None):
+        '''
+        Returns a contiguous copy of the lines captured so far.
+
+        @param interleave: 'bil', 'bsq' or 'bip'
+        @param out: Optional array of the right shape and dtype to copy to
+        @return: ndarray, None if nothing has been captured
+        '''
+        view = self.lines(interleave)
+        if view is None:
+            return None
+        if out is None:
+            out = np.empty(view.shape, dtype=view.dtype)
+        elif out.shape != view.shape:
+            raise Exception('Output shape %s doesn\'t match cube %s' %
+                            (str(out.shape), str(view.shape)))
+        np.copyto(out, view)
+        return out
+
+    def __len__(self):
+        return self._lines
@@ -0,0 +1,328 @@
+'''
+Created on 17.10.2026
+'''
+
+import os
+from contextlib import contextmanager
+import numpy as np
+import xevacam.utils as utils
+from xevacam.timestamps import TimestampLog
+
+# Axis order of each interleave in (lines, bands, samples) terms
+INTERLEAVES = {'bil': (0, 1, 2),
+               'bsq': (1, 0, 2),
+               'bip': (0, 2, 1)}
+
+
+def hdr_path(filepath):
+    '''
+    Returns ENVI header path for a data file, 'myfile.bin' -> 'myfile.hdr'.
+    '''
+    return os.path.splitext(filepath)[0] + '.hdr'
+
+
+def read_envi_hdr(filepath):
+    '''
+    Parses an ENVI header file.
+
+    @param filepath: Header file path
+    @return: dict of lower case field names to string values. Braces of
+             multi-line values are removed.
+    '''
+    with open(filepath, 'r') as f:
+        lines = f.read().splitlines()
+    if not lines or lines[0].strip() != 'ENVI':
+        raise Exception('\'%s\' is not an ENVI header.' % filepath)
+    header = {}
+    name = None
+    for line in lines[1:]:
+        if name is not None:
+            # Continuation of a {...} value
+            header[name] += '\n' + line
+            if '}' in line:
+                header[name] = header[name].strip().strip('{}').strip()
+                name = None
+            continue
+        if '=' not in line:
+            continue
+        key, value = line.split('=', 1)
+        key = key.strip().lower()
+        value = value.strip()
+        if value.startswith('{') and '}' not in value:
+            header[key] = value
+            name = key
+        else:
+            header[key] = value.strip('{}').strip()
+    return header
+
+
+class ENVIImage(object):
+    '''
+    Lazy reader for a recorded .bin + .hdr pair.
+
+    The data file is opened as np.memmap. Slices and interleave changes are
+    strided views, so nothing is read from disk until the values are used.
+    Files recorded with incl_ctrl_frames=True, which have a 4 byte control
+    frame before each frame, are supported.
+    '''
+
+    def __init__(self, filepath, hdr=None, ctrl_frames=None):
+        '''
+        @param filepath: Data file path, e.g. 'myfile.bin'
+        @param hdr: Header file path. Default is filepath with .hdr ending.
+        @param ctrl_frames: Are there control frames before frames. None
+                            deduces it from the file size.
+        '''
+        self.filepath = filepath
+        self.hdr = hdr_path(filepath) if hdr is None else hdr
+        self.header = read_envi_hdr(self.hdr)
+        self.samples = int(self.header['samples'])
+        self.bands = int(self.header['bands'])
+        self.lines = int(self.header['lines'])
+        self.interleave = self.header.get('interleave', 'bil').lower()
+        if self.interleave not in INTERLEAVES:
+            raise Exception('Unknown interleave %s' % self.interleave)
+        byte_order = '>' if self.header.get('byte order', '0') == '1' \
+            else '<'
+        self.dtype = np.dtype(
+            byte_order + utils.envitype2datatype(self.header['data type']))
+        self.offset = int(self.header.get('header offset', 0))
+        frame_bytes = self.bands * self.samples * self.dtype.itemsize
+        data_bytes = os.path.getsize(filepath) - self.offset
+        if ctrl_frames is None:
+            ctrl_frames = data_bytes == self.lines * (frame_bytes + 4) and \
+                data_bytes != self.lines * frame_bytes
+        if ctrl_frames and self.interleave != 'bil':
+            raise Exception('Control frames need bil interleave, file is %s'
+                            % self.interleave)
+        self.ctrl_frames = ctrl_frames
+        self._mm = None
+
+    @contextmanager
+    def open(self, mode='r'):
+        '''
+        Context manager which maps the file and unmaps it on exit.
+
+        @param mode: np.memmap mode, 'r' or 'r+'
+        '''
+        try:
+            self._map(mode)
+            yield self
+        finally:
+            self.close()
+
+    def _map(self, mode='r'):
+        shape = tuple((self.lines, self.bands, self.samples)[i]
+                      for i in INTERLEAVES[self.interleave])
+        if self.ctrl_frames:
+            record = np.dtype([('ctrl', '<u4'),
+                               ('frame', self.dtype, shape[1:])])
+            self._mm = np.memmap(self.filepath, dtype=record, mode=mode,
+                                 offset=self.offset, shape=(self.lines,))
+        else:
+            self._mm = np.memmap(self.filepath, dtype=self.dtype, mode=mode,
+                                 offset=self.offset, shape=shape)
+
+    def close(self):
+        self._mm = None
+
+    def _native(self):
+        if self._mm is None:
+            self._map()
+        if self.ctrl_frames:
+            return self._mm['frame']
+        return self._mm
+
+    @property
+    def data(self):
+        '''
+        Cube as a (lines, bands, samples) view.
+        '''
+        native = INTERLEAVES[self.interleave]
+        # Inverse permutation from file axis order to bil
+        return self._native().transpose(np.argsort(native))
+
+    def view(self, interleave='bil'):
+        '''
+        Returns the cube as a strided view in the given interleave.
+
+        @param interleave: 'bil' (lines, bands, samples), 'bsq' (bands,
+                           lines, samples) or 'bip' (lines, samples, bands)
+        @return: ndarray view
+        '''
+        interleave = interleave.lower()
+        if interleave not in INTERLEAVES:
+            raise Exception('Unknown interleave %s' % interleave)
+        return self.data.transpose(INTERLEAVES[interleave])
+
+    def __getitem__(self, key):
+        '''
+        Slices the cube in (lines, bands, samples) order.
+        '''
+        return self.data[key]
+
+    def read_band(self, band):
+        '''
+        Returns one band as a (lines, samples) view.
+        '''
+        return self.data[:, band, :]
+
+    def read_numpy_array(self, target_order=None):
+        '''
+        Reads the whole cube to memory.
+
+        @param target_order: Interleave of the result. Default is the file's.
+        @return: ndarray
+        '''
+        if target_order is None:
+            target_order = self.interleave
+        return np.ascontiguousarray(self.view(target_order))
+
+    @property
+    def control_frames(self):
+        '''
+        Control frames (milliseconds from start of capture) as uint32 view,
+        None if the file has none.
+        '''
+        if not self.ctrl_frames:
+            return None
+        if self._mm is None:
+            self._map()
+        return self._mm['ctrl']
+
+    @property
+    def timestamps(self):
+        '''
+        Frame time stamps in nanoseconds from the sidecar file the header
+        refers to, None if there is none.
+        '''
+        name = self.header.get('timestamps file')
+        if name is None:
+            return None
+        path = os.path.join(os.path.dirname(self.hdr), name)
+        return TimestampLog.load(path)
+
+
+class ENVIWriter(object):
+    '''
+    Recording handler which writes frames to a memory-mapped BIL file.
+
+    The file is preallocated and grown chunk_frames frames at a time. Each
+    frame is copied once, from its ring slot to its line in the mapping,
+    with no write() call or intermediate buffer. The camera doesn't get the
+    mapped line as its target, because the ring slot is also given to other
+    handlers and processing stages. On stop_recording the file is truncated
+    to the recorded lines and the ENVI header is written next to it. A
+    writer records one cube; writing to it after that raises an exception
+    instead of overwriting the cube.
+    '''
+
+    def __init__(self, filepath, chunk_frames=1024, dims=None, dtype=None):
+        '''
+        @param filepath: Path of the data file, e.g. 'myfile.bin'
+        @param chunk_frames: Number of frames the file grows at a time
+        @param dims: Frame dimensions tuple(height, width). Only needed if
+                     frames come through write() instead of write_slot().
+        @param dtype: Numpy pixel dtype, needed with dims.
+        '''
+        if chunk_frames < 1:
+            raise Exception('chunk_frames must be at least 1')
+        self.filepath = filepath
+        self.chunk_frames = chunk_frames
+        self.dims = dims
+        self.dtype = dtype
+        self.frame_size = None
+        self.capacity = 0  # Frames the file has room for
+        self.lines = 0  # Frames written
+        self.closed = False  # File holds a finished cube
+        self._mm = None
+
+    def writable(self):
+        return True
+
+    def _grow(self):
+        capacity = self.capacity + self.chunk_frames
+        mode = 'w+' if self.capacity == 0 else 'r+'
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm = None  # Unmaps before remapping
+        self._mm = np.memmap(self.filepath, dtype=np.uint8, mode=mode,
+                             shape=(capacity, self.frame_size))
+        self.capacity = capacity
+
+    def _store(self, array):
+        if self.closed:
+            raise Exception(
+                '%s \'%s\' already holds a recorded cube, use a new writer '
+                'for another recording.' % (type(self).__name__,
+                                            self.filepath))
+        if self.frame_size is None:
+            self.frame_size = len(array)
+        elif len(array) != self.frame_size:
+            raise Exception(
+                '%s got %d bytes, frame size is %d. Control frames are not '
+                'supported.' % (type(self).__name__, len(array),
+                                self.frame_size))
+        if self.lines == self.capacity:
+            self._grow()
+        self._mm[self.lines] = array
+        self.lines += 1
+
+    def write_slot(self, slot):
+        if self.dims is None and slot.frame is not None:
+            self.dims = slot.frame.shape
+            self.dtype = slot.frame.dtype
+        self._store(slot.array)
+        return len(slot)
+
+    def write(self, b):
+        self._store(np.frombuffer(b, dtype=np.uint8))
+        return len(b)
+
+    def flush(self):
+        if self._mm is not None:
+            self._mm.flush()
+
+    def close(self):
+        '''
+        Unmaps the file and cuts it to the written frames. The writer
+        doesn't take frames after this.
+        '''
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm = None
+        if self.frame_size is not None and os.path.exists(self.filepath):
+            os.truncate(self.filepath, self.lines * self.frame_size)
+        self.capacity = self.lines
+        self.closed = self.lines > 0
+
+    def metadata(self, meta=()):
+        '''
+        Returns ENVI metadata for the written cube.
+
+        @param meta: Metadata tuple from XevaCam.stop_recording. Its geometry
+                     fields are replaced with the written ones.
+        @return: Metadata tuple array
+        '''
+        if self.dims is None:
+            raise Exception('Frame dimensions unknown, give dims to %s' %
+                            type(self).__name__)
+        geometry = (('samples', self.dims[1]),
+                    ('bands', self.dims[0]),
+                    ('lines', self.lines),
+                    ('data type', utils.datatype2envitype(
+                        np.dtype(self.dtype).str[1:])),
+                    ('interleave', 'bil'),
+                    ('byte order', 0 if np.little_endian else 1))
+        names = [name for name, _ in geometry]
+        return geometry + tuple((name, value) for name, value in meta
+                                if name not in names)
+
+    def finalize(self, meta=(), timestamps=None):
+        '''
+        Called by XevaCam.stop_recording. Truncates the file and writes the
+        ENVI header and the time stamp sidecar.
+        '''
+        self.close()
+        utils.create_envi_hdr(self.metadata(meta), hdr_path(self.filepath),
+                              timestamps=timestamps)
@@ -0,0 +1,449 @@
+'''
+Created on 17.10.2026
+
+Capturing from several cameras, each in its own process. The camera process
+copies each frame once, from its frame ring into a shared memory ring, and
+the consumer process reads it there without pickling or further copies.
+Frames are time stamped with time.perf_counter_ns(), which is a system wide
+monotonic clock, so that frames of different cameras can be merged.
+'''
+
+import multiprocessing
+import os
+import queue
+import time
+import traceback
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+import numpy as np
+
+# Fields of the ring header
+_WRITTEN = 0  # Frames written to the ring
+_DROPPED = 1  # Frames dropped because the consumer had every slot
+_CLOSED = 2  # Writer has stopped
+_ORIGIN = 3  # perf_counter_ns() origin of the camera's time stamps
+_HEADER_FIELDS = 4
+
+_RECORD = np.dtype([('seq', '<i8'), ('timestamp', '<i8'),
+                    ('placeholder', '<i8')])
+
+
+class SharedFrame(object):
+    '''
+    A frame in a SharedFrameRing. The pixels stay valid until release().
+    '''
+
+    __slots__ = ('ring', 'camera', 'frame', 'seq', 'timestamp',
+                 'placeholder')
+
+    def __init__(self, ring, camera, frame, seq, timestamp, placeholder):
+        self.ring = ring
+        self.camera = camera  # Camera name
+        self.frame = frame  # Read-only (height, width) view
+        self.seq = seq
+        self.timestamp = timestamp  # perf_counter_ns() of capture
+        self.placeholder = placeholder
+
+    def release(self):
+        '''
+        Gives the slot back to the camera process.
+        '''
+        self.ring._free.release()
+
+
+class SharedFrameRing(object):
+    '''
+    Single producer, single consumer frame ring in shared memory.
+
+    The camera process writes frames with write_slot() like any handler,
+    which copies the frame into shared memory. When the consumer holds every
+    slot, frames are dropped instead of stalling capture. Two semaphores
+    count free and filled slots. An optional signal semaphore, which can be
+    shared by several rings, is released with every frame so that one
+    consumer can wait for any of them.
+    '''
+
+    def __init__(self, shm, slots, dims, dtype, free, filled, owner=False,
+                 signal=None):
+        self.shm = shm
+        self.name = shm.name
+        self.slots = slots
+        self.dims = tuple(dims)
+        self.dtype = np.dtype(dtype)
+        self.frame_size = int(np.prod(self.dims)) * self.dtype.itemsize
+        self._free = free
+        self._filled = filled
+        self._signal = signal
+        self._owner = owner
+        buf = shm.buf
+        offset = 0
+        self._header = np.ndarray((_HEADER_FIELDS,), dtype='<i8',
+                                  buffer=buf, offset=offset)
+        offset += self._header.nbytes
+        self._records = np.ndarray((slots,), dtype=_RECORD, buffer=buf,
+                                   offset=offset)
+        offset += self._records.nbytes
+        self._data = np.ndarray((slots, self.frame_size), dtype=np.uint8,
+                                buffer=buf, offset=offset)
+        frames = self._data.view(self.dtype).reshape((slots,) + self.dims)
+        self._frames = frames.view()
+        self._frames.flags.writeable = False
+        self._head = 0  # Writer's next frame
+        self._tail = 0  # Reader's next frame
+        self.timestamps = None  # Writer's XevaCam.timestamps
+
+    @staticmethod
+    def nbytes(slots, dims, dtype):
+        frame_size = int(np.prod(dims)) * np.dtype(dtype).itemsize
+        return (_HEADER_FIELDS * 8 + slots * _RECORD.itemsize +
+                slots * frame_size)
+
+    @classmethod
+    def create(cls, slots, dims, dtype, free, filled, signal=None):
+        '''
+        Creates a ring in new shared memory. Consumer side, which owns the
+        memory and unlinks it when camera processes have stopped.
+        '''
+        shm = shared_memory.SharedMemory(
+            create=True, size=cls.nbytes(slots, dims, dtype))
+        ring = cls(shm, slots, dims, dtype, free, filled, owner=True,
+                   signal=signal)
+        ring._header[:] = 0
+        return ring
+
+    @classmethod
+    def attach(cls, name, slots, dims, dtype, free, filled, signal=None):
+        '''
+        Attaches to a ring created by another process. Camera process side.
+        '''
+        return cls(shared_memory.SharedMemory(name=name), slots, dims, dtype,
+                   free, filled, signal=signal)
+
+    @property
+    def dropped(self):
+        return int(self._header[_DROPPED])
+
+    @property
+    def written(self):
+        return int(self._header[_WRITTEN])
+
+    @property
+    def origin(self):
+        return int(self._header[_ORIGIN])
+
+    @property
+    def closed(self):
+        return bool(self._header[_CLOSED]) and self._tail >= self.written
+
+    # Writer side
+
+    def writable(self):
+        return True
+
+    def write_slot(self, slot):
+        if self._head == 0:
+            self._header[_ORIGIN] = self.timestamps.origin
+        if not self._free.acquire(block=False):
+            self._header[_DROPPED] += 1
+            return len(slot)
+        i = self._head % self.slots
+        self._data[i] = slot.array
+        record = self._records[i]
+        record['seq'] = slot.seq
+        record['timestamp'] = self.timestamps.origin + slot.timestamp
+        record['placeholder'] = slot.placeholder
+        self._head += 1
+        self._header[_WRITTEN] = self._head
+        self._filled.release()
+        if self._signal is not None:
+            self._signal.release()
+        return len(slot)
+
+    def write(self, b):
+        raise Exception('%s needs frame slots, control frames are not '
+                        'supported' % type(self).__name__)
+
+    def close_writer(self):
+        '''
+        Marks the ring closed and wakes up the reader.
+        '''
+        self._header[_CLOSED] = 1
+        self._filled.release()
+        if self._signal is not None:
+            self._signal.release()
+
+    # Reader side
+
+    def read(self, camera=None, timeout=None):
+        '''
+        Returns the next frame. Its slot has to be given back with
+        release().
+
+        @param camera: Camera name stored to the frame
+        @param timeout: Seconds to wait, None waits until a frame comes, 0
+                        doesn't wait
+        @return: SharedFrame or None on timeout or when the ring is closed
+        '''
+        if self.closed:
+            return None
+        if not self._filled.acquire(timeout=timeout):
+            return None
+        if self._tail >= self.written:
+            return None  # Woken up by close_writer
+        i = self._tail % self.slots
+        self._tail += 1
+        record = self._records[i]
+        return SharedFrame(self, camera, self._frames[i], int(record['seq']),
+                           int(record['timestamp']),
+                           bool(record['placeholder']))
+
+    def close(self):
+        self._header = self._records = self._data = self._frames = None
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def _camera_main(name, backend, camera_path, cam_kwargs, slots, free,
+                 filled, signal, messages, ring_names, barrier, stop,
+                 timeout):
+    '''
+    Camera process. Opens the camera, tells the frame geometry to the
+    consumer, attaches to the ring the consumer created for it, waits for
+    the other cameras at the barrier and records until stop is set.
+    '''
+    from xevacam.camera import XevaCam
+    ring = None
+    cam = None
+    try:
+        cam = XevaCam(backend=backend() if backend is not None else None,
+                      **cam_kwargs)
+        cam.open(camera_path)
+        try:
+            fmt = cam.output_format
+            dims = fmt.dims
+            dtype = np.dtype(fmt.dtype)
+            messages.put(('geometry', name, (dims, dtype.str)))
+            ring = SharedFrameRing.attach(ring_names.get(timeout=timeout),
+                                          slots, dims, dtype, free, filled,
+                                          signal)
+            ring.timestamps = cam.timestamps
+            cam.set_handler(ring)
+            messages.put(('ready', name, None))
+            barrier.wait()
+            cam.start_recording()
+            while not stop.is_set():
+                cam.wait_recording(0.1)
+            meta = cam.stop_recording()
+            messages.put(('done', name, (meta, ring.dropped,
+                                         cam.gaps.missing)))
+        finally:
+            if ring is not None:
+                ring.close_writer()
+            cam.close()
+    except Exception:
+        barrier.abort()
+        messages.put(('error', name, traceback.format_exc()))
+    finally:
+        if ring is not None:
+            ring.close()
+
+
+class MultiCamera(object):
+    '''
+    Records several cameras in parallel, one process per camera.
+
+    Cameras are opened in their processes and released together from a
+    barrier, so that capturing starts at the same time. Frames come to the
+    consumer through SharedFrameRings. Time stamps of all cameras are on the
+    common perf_counter_ns() clock, frames() merges them in time order.
+    '''
+
+    def __init__(self, slots=64, start_timeout=30.0):
+        '''
+        @param slots: Frames in each camera's shared memory ring
+        @param start_timeout: Seconds to wait for cameras to open
+        '''
+        self.slots = slots
+        self.start_timeout = start_timeout
+        self.cameras = []  # (name, backend, camera_path, cam_kwargs)
+        self.rings = {}
+        self.origin = None  # perf_counter_ns() when cameras were released
+        self.results = {}  # Camera name to (meta, ring drops, missed frames)
+        self._processes = []
+        self._ctx = multiprocessing.get_context()
+
+    def add_camera(self, name, backend=None, camera_path='cam://0',
+                   **cam_kwargs):
+        '''
+        @param name: Name of the camera
+        @param backend: Callable which creates the camera backend in the
+                        camera process, e.g. functools.partial(
+                        SyntheticBackend, fps=100). Default XenethBackend.
+        @param camera_path: String path to the camera
+        @param cam_kwargs: Other XevaCam arguments, e.g. calibration
+        '''
+        if self._processes:
+            raise Exception('Can\'t add cameras while recording')
+        self.cameras.append((name, backend, camera_path, cam_kwargs))
+
+    def start(self):
+        '''
+        Starts camera processes and releases them to capture together.
+        '''
+        if not self.cameras:
+            raise Exception('No cameras')
+        ctx = self._ctx
+        if os.name == 'posix':
+            # Camera processes have to share the resource tracker of this
+            # process. Otherwise their own tracker unlinks the rings they
+            # attached to when they exit.
+            from multiprocessing import resource_tracker
+            resource_tracker.ensure_running()
+        self._messages = ctx.Queue()
+        self._barrier = ctx.Barrier(len(self.cameras) + 1)
+        self._stop = ctx.Event()
+        self._signal = ctx.Semaphore(0)  # Released by every camera's frames
+        self.results = {}
+        channels = {}
+        for name, backend, camera_path, cam_kwargs in self.cameras:
+            free = ctx.Semaphore(self.slots)
+            filled = ctx.Semaphore(0)
+            ring_names = ctx.Queue()
+            channels[name] = (free, filled, ring_names)
+            p = ctx.Process(name='camera %s' % name, target=_camera_main,
+                            args=(name, backend, camera_path, cam_kwargs,
+                                  self.slots, free, filled, self._signal,
+                                  self._messages,
+                                  ring_names, self._barrier, self._stop,
+                                  self.start_timeout),
+                            daemon=True)
+            p.start()
+            self._processes.append(p)
+        try:
+            deadline = time.perf_counter() + self.start_timeout
+            ready = 0
+            while ready < len(self.cameras):
+                kind, name, value = self._message(
+                    deadline - time.perf_counter())
+                if kind == 'geometry':
+                    dims, dtype = value
+                    free, filled, ring_names = channels[name]
+                    ring = SharedFrameRing.create(self.slots, dims, dtype,
+                                                  free, filled, self._signal)
+                    self.rings[name] = ring
+                    ring_names.put(ring.name)
+                elif kind == 'ready':
+                    ready += 1
+            self._barrier.wait(max(deadline - time.perf_counter(), 0.0))
+            self.origin = time.perf_counter_ns()
+        except Exception:
+            self._barrier.abort()
+            try:
+                self.stop()
+            except Exception:
+                pass  # The first failure is more telling
+            raise
+
+    def _message(self, timeout):
+        try:
+            kind, name, value = self._messages.get(
+                timeout=max(timeout, 0.0))
+        except queue.Empty:
+            raise Exception('Cameras didn\'t respond in time')
+        if kind == 'error':
+            raise Exception('Camera %s failed:\n%s' % (name, value))
+        if kind == 'done':
+            self.results[name] = value
+        return kind, name, value
+
+    def start_offsets(self):
+        '''
+        Returns how much later than the barrier release each camera's first
+        time stamp origin is.
+        @return: dict of camera name to nanoseconds
+        '''
+        return {name: ring.origin - self.origin
+                for name, ring in self.rings.items() if ring.origin}
+
+    def frames(self, timeout=1.0):
+        '''
+        Yields frames of all cameras merged in time stamp order, until
+        recording stops. Each frame's slot is released when the next frame
+        is asked for, so frames must be copied to be kept.
+
+        Waits for all cameras at once. A camera which gives no frame in
+        timeout seconds is skipped until its next frame comes.
+
+        @param timeout: Seconds to wait for the cameras' next frames
+        @return: Generator of SharedFrame
+        '''
+        heads = {}
+        open_rings = dict(self.rings)
+        deadline = None  # Until when cameras without a frame are waited for
+        while open_rings or heads:
+            for name, ring in list(open_rings.items()):
+                if name not in heads:
+                    frame = ring.read(name, 0)
+                    if frame is not None:
+                        heads[name] = frame
+                    elif ring.closed:
+                        del open_rings[name]
+            if any(name not in heads for name in open_rings):
+                now = time.perf_counter()
+                if not heads:
+                    self._signal.acquire(timeout=timeout)
+                    continue
+                if deadline is None:
+                    deadline = now + timeout
+                if now < deadline:
+                    # Any camera's frame or close wakes this up
+                    self._signal.acquire(timeout=deadline - now)
+                    continue
+            deadline = None
+            name = min(heads, key=lambda n: heads[n].timestamp)
+            frame = heads.pop(name)
+            try:
+                yield frame
+            finally:
+                frame.release()
+
+    def stop(self, timeout=10.0):
+        '''
+        Stops recording, waits for camera processes and closes and frees the
+        rings.
+        @return: dict of camera name to recording metadata
+        '''
+        self._stop.set()
+        deadline = time.perf_counter() + timeout
+        errors = []
+        while len(self.results) < len(self._processes) and \
+                time.perf_counter() < deadline:
+            try:
+                self._message(deadline - time.perf_counter())
+            except Exception as e:
+                errors.append(str(e))
+                if any(not p.is_alive() for p in self._processes):
+                    break
+        for p in self._processes:
+            p.join(max(deadline - time.perf_counter(), 0.1))
+            if p.is_alive():
+                p.terminate()
+        self._processes = []
+        for ring in self.rings.values():
+            ring.close()
+        self.rings = {}
+        if errors:
+            raise Exception('\n'.join(errors))
+        return {name: result[0] for name, result in self.results.items()}
+
+    @contextmanager
+    def running(self):
+        '''
+        Context manager for start() and stop().
+        '''
+        self.start()
+        try:
+            yield self
+        finally:
+            self.stop()
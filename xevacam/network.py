@@ -0,0 +1,336 @@
+'''
+Created on 17.10.2026
+
+Publishing frames to subscribers over TCP or Unix sockets. Each frame is
+sent as a fixed size HEADER followed by the raw frame:
+
+    magic b'XFRM', sequence number, time stamp (ns from capture start),
+    height, width, numpy dtype string, flags, payload length
+'''
+
+import collections
+import logging
+import os
+import socket
+import struct
+import threading
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'XFRM'
+HEADER = struct.Struct('<4sQqII4sII')
+FLAG_PLACEHOLDER = 1  # Zero filled frame in place of a missed one
+
+ReceivedFrame = collections.namedtuple('ReceivedFrame',
+                                       'seq timestamp placeholder frame')
+
+
+def _socket_family(address):
+    if isinstance(address, str):
+        if not hasattr(socket, 'AF_UNIX'):
+            raise Exception('Unix sockets are not supported on this platform')
+        return socket.AF_UNIX
+    return socket.AF_INET
+
+
+class _Subscriber(object):
+    '''
+    Connection to one subscriber with its own bounded queue and sender
+    thread. When the queue is full the oldest frame is dropped.
+    '''
+
+    def __init__(self, publisher, sock, peer, maxsize):
+        self.publisher = publisher
+        self.sock = sock
+        self.peer = peer
+        self.maxsize = maxsize
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self.closed = False
+        self._finishing = False  # Send queued frames, then close
+        self.sent = 0
+        self.dropped = 0
+        self._thread = threading.Thread(name='frame sender %s' % str(peer),
+                                        target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _discard(item):
+        slot = item[2]
+        if slot is not None:
+            slot.release()
+
+    def put(self, header, payload, slot):
+        '''
+        Queues a frame. Capture thread only, never waits.
+
+        @param slot: Retained FrameSlot owning the payload or None
+        '''
+        with self._cond:
+            if self.closed or self._finishing:
+                self._discard((header, payload, slot))
+                return
+            if len(self._queue) >= self.maxsize:
+                self.dropped += 1
+                self._discard(self._queue.popleft())
+            self._queue.append((header, payload, slot))
+            self._cond.notify()
+
+    def _send(self, header, payload):
+        if hasattr(self.sock, 'sendmsg'):
+            buffers = [memoryview(header), memoryview(payload).cast('B')]
+            while buffers:
+                sent = self.sock.sendmsg(buffers)
+                # Drops what was sent, continues with the rest
+                while buffers and sent >= len(buffers[0]):
+                    sent -= len(buffers[0])
+                    buffers.pop(0)
+                if buffers and sent:
+                    buffers[0] = buffers[0][sent:]
+        else:
+            self.sock.sendall(header)
+            self.sock.sendall(payload)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self.closed or
+                                    self._finishing)
+                if self.closed or not self._queue:
+                    break
+                item = self._queue.popleft()
+            try:
+                self._send(item[0], item[1])
+                self.sent += 1
+            except OSError as e:
+                logger.info('Subscriber %s disconnected: %s', self.peer, e)
+                self.close()
+            finally:
+                self._discard(item)
+        self.close()
+        self.publisher._remove(self)
+
+    def finish(self):
+        '''
+        Closes the connection after the queued frames have been sent.
+        '''
+        with self._cond:
+            self._finishing = True
+            self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            items = list(self._queue)
+            self._queue.clear()
+            self._cond.notify()
+        for item in items:
+            self._discard(item)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+
+class FramePublisher(object):
+    '''
+    Recording handler which serves frames to any number of subscribers.
+
+    Register it with XevaCam.set_handler. Each subscriber has a bounded
+    queue and its own sender thread; a slow subscriber loses its oldest
+    frames instead of holding up capturing. Frames are sent with a
+    scatter/gather sendmsg of the header and the frame slot itself, without
+    copying. A frame is copied once for all subscribers only when the frame
+    ring is about to run out of free slots.
+    '''
+
+    def __init__(self, address=('', 5555), maxsize=8, backlog=8):
+        '''
+        @param address: tuple(host, port) for TCP or a path string for a
+                        Unix socket. Port 0 picks a free port.
+        @param maxsize: Frames queued per subscriber
+        @param backlog: Connections waiting to be accepted
+        '''
+        self.maxsize = maxsize
+        self._family = _socket_family(address)
+        self._listener = socket.socket(self._family, socket.SOCK_STREAM)
+        if self._family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)  # Left over from an earlier run
+        else:
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR,
+                                      1)
+        self._listener.bind(address)
+        self._listener.listen(backlog)
+        self._listener.settimeout(0.2)
+        self.address = self._listener.getsockname()
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._closed = False
+        self.frames = 0
+        self._thread = threading.Thread(name='frame publisher',
+                                        target=self._accept, daemon=True)
+        self._thread.start()
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                sock, peer = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # Closed
+            sock.settimeout(None)
+            if self._family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            logger.info('Subscriber %s connected', peer)
+            subscriber = _Subscriber(self, sock, peer, self.maxsize)
+            with self._lock:
+                self._subscribers.append(subscriber)
+
+    def _remove(self, subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def subscribers(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        return {'subscribers': len(subscribers),
+                'published': self.frames,
+                'sent': [s.sent for s in subscribers],
+                'dropped': sum(s.dropped for s in subscribers)}
+
+    def writable(self):
+        return True
+
+    def write_slot(self, slot):
+        self.frames += 1
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return len(slot)
+        if slot.frame is not None:
+            height, width = slot.frame.shape
+            dtype = slot.frame.dtype.str
+        else:
+            height, width, dtype = 1, len(slot), '|u1'
+        header = HEADER.pack(MAGIC, slot.seq, slot.timestamp, height, width,
+                             dtype.encode('ascii'),
+                             FLAG_PLACEHOLDER if slot.placeholder else 0,
+                             len(slot))
+        if slot.ring.free_slots() > len(subscribers):
+            for s in subscribers:
+                s.put(header, slot.view, slot.retain())
+        else:
+            payload = bytes(slot.view)
+            for s in subscribers:
+                s.put(header, payload, None)
+        return len(slot)
+
+    def write(self, b):
+        raise Exception('%s needs frame slots, control frames are not '
+                        'supported' % type(self).__name__)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        '''
+        Stops accepting subscribers and disconnects the current ones after
+        sending the frames queued for them.
+        '''
+        self._closed = True
+        self._thread.join()
+        self._listener.close()
+        if self._family == socket.AF_UNIX and \
+                os.path.exists(self.address):
+            os.unlink(self.address)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for s in subscribers:
+            s.finish()
+        for s in subscribers:
+            s.join(2)
+            s.close()  # Didn't finish in time
+
+
+class FrameSubscriber(object):
+    '''
+    Client for FramePublisher. Iterating yields ReceivedFrame tuples with
+    the frame as a (height, width) array. The array is received into a
+    reused buffer and is valid until the next frame, unless copy is set.
+    '''
+
+    def __init__(self, address=('localhost', 5555), timeout=None,
+                 copy=False):
+        '''
+        @param address: tuple(host, port) or a Unix socket path
+        @param timeout: Socket timeout in seconds, None waits forever
+        @param copy: Yield frames in their own arrays
+        '''
+        self.sock = socket.socket(_socket_family(address), socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        self.copy = copy
+        self._header = bytearray(HEADER.size)
+        self._payload = bytearray()
+
+    def _recv_into(self, view):
+        while len(view):
+            n = self.sock.recv_into(view)
+            if n == 0:
+                raise EOFError('Publisher closed the connection')
+            view = view[n:]
+
+    def receive(self):
+        '''
+        Receives the next frame.
+        @return: ReceivedFrame, None when the publisher has closed
+        '''
+        try:
+            self._recv_into(memoryview(self._header))
+        except EOFError:
+            return None
+        magic, seq, timestamp, height, width, dtype, flags, size = \
+            HEADER.unpack(self._header)
+        if magic != MAGIC:
+            raise Exception('Not a frame header: %s' % bytes(self._header))
+        if len(self._payload) < size:
+            self._payload = bytearray(size)
+        self._recv_into(memoryview(self._payload)[:size])
+        dtype = dtype.rstrip(b'\0').decode('ascii')
+        frame = np.frombuffer(self._payload, dtype=dtype,
+                              count=height * width).reshape(height, width)
+        if self.copy:
+            frame = frame.copy()
+        return ReceivedFrame(seq, timestamp, bool(flags & FLAG_PLACEHOLDER),
+                             frame)
+
+    def __iter__(self):
+        while True:
+            frame = self.receive()
+            if frame is None:
+                return
+            yield frame
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
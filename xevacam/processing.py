@@ -0,0 +1,346 @@
+'''
+Created on 17.10.2026
+'''
+
+import time
+import numpy as np
+
+
+class Processor(object):
+    '''
+    Base class for processing stages run in the capture thread between
+    get_frame and the handlers.
+
+    A stage modifies the frame in place through the slot's writable typed
+    view (slot.pixels). Work buffers are allocated in prepare(), nothing is
+    allocated per frame. Each stage times itself; stats() returns counters.
+    '''
+
+    # Names of the timed steps of the stage
+    steps = ()
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        '''
+        Clears timing counters. Called when capturing starts.
+        '''
+        self.frames = 0
+        self.total_ns = 0
+        self.max_ns = 0
+        self.step_ns = dict.fromkeys(self.steps, 0)
+
+    def prepare(self, dims, dtype):
+        '''
+        Allocates work buffers for the frame format. Called when capturing
+        starts.
+
+        @param dims: Frame dimensions tuple(height, width)
+        @param dtype: Numpy pixel dtype
+        '''
+        pass
+
+    def output(self, dims, dtype):
+        '''
+        Returns the format of frames the stage produces. In place stages
+        keep the format.
+
+        @param dims: Input frame dimensions tuple(height, width)
+        @param dtype: Input numpy pixel dtype
+        @return: tuple(dims, dtype)
+        '''
+        return tuple(dims), np.dtype(dtype)
+
+    def metadata(self):
+        '''
+        Returns ENVI header fields describing the stage, added to the
+        metadata of stop_recording.
+        @return: Metadata tuple array
+        '''
+        return ()
+
+    def process(self, slot):
+        '''
+        Processes the frame in slot. Capture thread only.
+        @param slot: FrameSlot
+        '''
+        t = time.perf_counter_ns()
+        self.apply(slot.pixels)
+        self._count(time.perf_counter_ns() - t)
+
+    def _count(self, t):
+        self.frames += 1
+        self.total_ns += t
+        if t > self.max_ns:
+            self.max_ns = t
+
+    def apply(self, frame):
+        '''
+        Processes a frame array in place.
+        @param frame: Writable numpy array (height, width)
+        '''
+        raise NotImplementedError()
+
+    def stats(self):
+        '''
+        @return: dict of timing counters, times in milliseconds
+        '''
+        n = self.frames
+        s = {'processor': type(self).__name__,
+             'frames': n,
+             'mean_ms': self.total_ns / n / 1e6 if n else 0.0,
+             'max_ms': self.max_ns / 1e6,
+             # Frame rate the stage alone could keep up with
+             'max_fps': n * 1e9 / self.total_ns if self.total_ns else 0.0}
+        for step, ns in self.step_ns.items():
+            s[step + '_ms'] = ns / n / 1e6 if n else 0.0
+        return s
+
+
+def bad_pixel_map(mask):
+    '''
+    Creates bad pixel replacement indices from a mask. Each bad pixel is
+    replaced with the nearest good pixel on the same row, or on the same
+    column if the whole row is bad.
+
+    @param mask: Boolean array (height, width), True for bad pixels
+    @return: tuple(bad, source) of flat pixel indices
+    '''
+    mask = np.asarray(mask, dtype=bool)
+    height, width = mask.shape
+    bad = np.flatnonzero(mask)
+    source = np.empty_like(bad)
+    for i, index in enumerate(bad):
+        row, col = divmod(int(index), width)
+        good = np.flatnonzero(~mask[row])
+        if len(good):
+            source[i] = row * width + good[np.argmin(np.abs(good - col))]
+            continue
+        good = np.flatnonzero(~mask[:, col])
+        if not len(good):
+            raise Exception('No good pixel to replace pixel (%d, %d)' %
+                            (row, col))
+        source[i] = good[np.argmin(np.abs(good - row))] * width + col
+    return bad, source
+
+
+class SoftwareCorrection(Processor):
+    '''
+    Dark frame subtraction, flat field gain and bad pixel replacement:
+
+        frame = clip((raw - dark) * gain)
+        gain = mean(flat - dark) / (flat - dark)
+
+    Computed in a preallocated float32 buffer with out= operations and
+    rounded back to the frame's integer type.
+    '''
+
+    steps = ('dark', 'flat', 'bad_pixels', 'convert')
+
+    def __init__(self, dark=None, flat=None, bad_pixels=None):
+        '''
+        @param dark: Dark frame (height, width), e.g. an average of frames
+                     taken with the shutter closed
+        @param flat: Flat field frame (height, width) of a uniform target.
+                     Dark is subtracted from it.
+        @param bad_pixels: Boolean mask (height, width) of bad pixels or
+                           tuple(bad, source) of flat indices from
+                           bad_pixel_map()
+        '''
+        super().__init__()
+        self.dark = None if dark is None else \
+            np.asarray(dark, dtype=np.float32)
+        self.gain = None
+        if flat is not None:
+            flat = np.array(flat, dtype=np.float32)
+            if self.dark is not None:
+                flat -= self.dark
+            if np.any(flat <= 0):
+                raise Exception('Flat field has pixels not above dark level')
+            self.gain = flat.mean() / flat
+        if bad_pixels is not None and not isinstance(bad_pixels, tuple):
+            bad_pixels = bad_pixel_map(bad_pixels)
+        self.bad_pixels = bad_pixels
+        self._work = None
+
+    def prepare(self, dims, dtype):
+        dims = tuple(dims)
+        for name in ('dark', 'gain'):
+            value = getattr(self, name)
+            if value is not None and value.shape != dims:
+                raise Exception('%s frame shape %s doesn\'t match frame %s' %
+                                (name, str(value.shape), str(dims)))
+        self._work = np.empty(dims, dtype=np.float32)
+        self._max = float(np.iinfo(dtype).max)
+        if self.bad_pixels is not None:
+            self._replacement = np.empty(len(self.bad_pixels[0]),
+                                         dtype=np.float32)
+
+    def apply(self, frame):
+        work = self._work
+        step_ns = self.step_ns
+        t0 = time.perf_counter_ns()
+        np.copyto(work, frame, casting='unsafe')
+        if self.dark is not None:
+            np.subtract(work, self.dark, out=work)
+        t1 = time.perf_counter_ns()
+        if self.gain is not None:
+            np.multiply(work, self.gain, out=work)
+        t2 = time.perf_counter_ns()
+        if self.bad_pixels is not None:
+            bad, source = self.bad_pixels
+            flat = work.reshape(-1)
+            np.take(flat, source, out=self._replacement)
+            flat[bad] = self._replacement
+        t3 = time.perf_counter_ns()
+        np.clip(work, 0.0, self._max, out=work)
+        np.rint(work, out=work)
+        np.copyto(frame, work, casting='unsafe')
+        t4 = time.perf_counter_ns()
+        step_ns['dark'] += t1 - t0
+        step_ns['flat'] += t2 - t1
+        step_ns['bad_pixels'] += t3 - t2
+        step_ns['convert'] += t4 - t3
+
+
+class Reduction(Processor):
+    '''
+    Makes frames smaller before handlers get them: selects band rows, crops
+    columns and bins NxM pixels.
+
+    Selected rows and columns are summed bin by bin to a preallocated
+    accumulator of a wider type with a reshape and sum. The result is
+    written to the slot's output, a smaller frame at the start of the slot,
+    so handlers write less. A format changing stage has to be the last
+    processor.
+    '''
+
+    steps = ('select', 'bin', 'output')
+
+    def __init__(self, bands=None, columns=None, binning=(1, 1), mean=False):
+        '''
+        @param bands: Frame rows to keep, e.g. range(20, 120). None keeps all.
+        @param columns: tuple(start, stop) of columns to keep. None keeps
+                        all.
+        @param binning: tuple(bands, columns) of pixels summed to one. Rows
+                        and columns which don't fill a bin are dropped.
+        @param mean: Average bins in the camera's pixel type instead of
+                     giving sums in a wider type
+        '''
+        super().__init__()
+        self.bands = None if bands is None else [int(b) for b in bands]
+        self.columns = columns
+        self.binning = tuple(binning)
+        if len(self.binning) != 2 or min(self.binning) < 1:
+            raise Exception('Binning must be two positive integers')
+        self.mean = mean
+
+    def _geometry(self, dims):
+        height, width = dims
+        bands = list(range(height)) if self.bands is None else self.bands
+        if not bands or min(bands) < 0 or max(bands) >= height:
+            raise Exception('Bands %s out of frame height %d' %
+                            (str(self.bands), height))
+        start, stop = (0, width) if self.columns is None else self.columns
+        if not 0 <= start < stop <= width:
+            raise Exception('Columns %s out of frame width %d' %
+                            (str(self.columns), width))
+        nb, nc = self.binning
+        bands = bands[:len(bands) // nb * nb]
+        stop = start + (stop - start) // nc * nc
+        if not bands or stop == start:
+            raise Exception('Binning %s is larger than the selection' %
+                            str(self.binning))
+        return bands, start, stop
+
+    def _accumulator_dtype(self, dtype):
+        dtype = np.dtype(dtype)
+        if self.binning == (1, 1):
+            return dtype
+        # Room for the sum of a whole bin
+        return np.dtype(np.uint64 if dtype.itemsize >= 4 else np.uint32)
+
+    def output(self, dims, dtype):
+        bands, start, stop = self._geometry(dims)
+        nb, nc = self.binning
+        out_dims = (len(bands) // nb, (stop - start) // nc)
+        if self.mean:
+            return out_dims, np.dtype(dtype)
+        return out_dims, self._accumulator_dtype(dtype)
+
+    def prepare(self, dims, dtype):
+        bands, start, stop = self._geometry(dims)
+        self._bands = bands
+        self._start = start
+        self._stop = stop
+        nb, nc = self.binning
+        width = stop - start
+        # A contiguous band range is a view, others are gathered with take
+        contiguous = bands == list(range(bands[0], bands[0] + len(bands)))
+        self._rows = slice(bands[0], bands[0] + len(bands)) if contiguous \
+            else np.array(bands, dtype=np.intp)
+        # Selection is copied away from the input, since output overwrites
+        # the start of the same slot
+        self._selected = np.empty((len(bands), width), dtype=dtype)
+        self._acc = np.empty((len(bands) // nb, width // nc),
+                             dtype=self._accumulator_dtype(dtype))
+        self._bins = self._selected.reshape(len(bands) // nb, nb,
+                                            width // nc, nc)
+
+    def metadata(self):
+        bands = self.bands
+        if bands is None and self.columns is None and \
+                self.binning == (1, 1):
+            return ()
+        m = []
+        if bands is not None:
+            m.append(('band rows', '{%s}' % ', '.join(str(b) for b in
+                                                      self._bands)))
+        if self.columns is not None:
+            m.append(('x start', self._start))
+        if self.binning != (1, 1):
+            m.append(('band binning', self.binning[0]))
+            m.append(('sample binning', self.binning[1]))
+            m.append(('binning', 'mean' if self.mean else 'sum'))
+        return tuple(m)
+
+    def process(self, slot):
+        t = time.perf_counter_ns()
+        self.reduce(slot.pixels, slot.output)
+        self._count(time.perf_counter_ns() - t)
+
+    def apply(self, frame):
+        raise Exception('%s changes the frame format, use reduce()' %
+                        type(self).__name__)
+
+    def reduce(self, frame, out):
+        '''
+        Reduces frame to out.
+
+        @param frame: Input frame (height, width)
+        @param out: Output array in the format of output()
+        '''
+        step_ns = self.step_ns
+        t0 = time.perf_counter_ns()
+        cropped = frame[:, self._start:self._stop]
+        if isinstance(self._rows, slice):
+            np.copyto(self._selected, cropped[self._rows])
+        else:
+            np.take(cropped, self._rows, axis=0, out=self._selected)
+        t1 = time.perf_counter_ns()
+        if self.binning == (1, 1):
+            t2 = t1
+            np.copyto(out, self._selected)
+        else:
+            np.sum(self._bins, axis=(1, 3), dtype=self._acc.dtype,
+                   out=self._acc)
+            t2 = time.perf_counter_ns()
+            if self.mean:
+                np.floor_divide(self._acc, self.binning[0] * self.binning[1],
+                                out=self._acc)
+            np.copyto(out, self._acc, casting='unsafe')
+        t3 = time.perf_counter_ns()
+        step_ns['select'] += t1 - t0
+        step_ns['bin'] += t2 - t1
+        step_ns['output'] += t3 - t2
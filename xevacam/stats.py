@@ -0,0 +1,219 @@
+'''
+Created on 17.10.2026
+'''
+
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Upper edges of the inter-frame period histogram bins in milliseconds.
+# The last bin counts everything longer.
+PERIOD_BINS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class CaptureStats(object):
+    '''
+    Live counters of the capture thread.
+
+    Only the capture thread writes them, without locking. Other threads read
+    a consistent enough copy with snapshot().
+    '''
+
+    def __init__(self):
+        self._bin_edges = [int(ms * 1e6) for ms in PERIOD_BINS_MS]
+        self.reset()
+
+    def reset(self, handlers=(), acquisition=None, ring=None, processors=()):
+        '''
+        Clears counters. Called when capturing starts.
+
+        @param handlers: Handlers in the order the capture thread calls them
+        @param acquisition: Acquisition strategy, source of poll counts
+        @param ring: FrameRing
+        @param processors: Processing stages, sources of timing counters
+        '''
+        self.started = time.perf_counter()
+        self.frames = 0
+        self.errors = 0
+        self.dropped_frames = 0
+        self.period_histogram = [0] * (len(self._bin_edges) + 1)
+        self._last_timestamp = None
+        self.handlers = list(handlers)
+        self.handler_writes = [0] * len(self.handlers)
+        self.handler_ns = [0] * len(self.handlers)  # Time spent in writes
+        self.acquisition = acquisition
+        self.ring = ring
+        self.processors = list(processors)
+
+    def frame(self, timestamp):
+        '''
+        Counts a delivered frame. Capture thread only.
+
+        @param timestamp: Frame time stamp in nanoseconds
+        '''
+        if self._last_timestamp is not None:
+            period = timestamp - self._last_timestamp
+            self.period_histogram[
+                bisect.bisect_left(self._bin_edges, period)] += 1
+        self._last_timestamp = timestamp
+        self.frames += 1
+
+    def snapshot(self):
+        '''
+        Returns a copy of the counters. Safe to call from any thread.
+        @return: dict
+        '''
+        elapsed = time.perf_counter() - self.started
+        s = {'elapsed': elapsed,
+             'frames': self.frames,
+             'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+             'errors': self.errors,
+             'dropped_frames': self.dropped_frames,
+             'period_bins_ms': PERIOD_BINS_MS,
+             'period_histogram': list(self.period_histogram)}
+        acquisition = self.acquisition
+        if acquisition is not None:
+            s['get_frame_calls'] = acquisition.polls
+            s['no_frame_polls'] = acquisition.polls - acquisition.frames
+            s['polls_per_frame'] = acquisition.polls_per_frame
+        if self.ring is not None:
+            s['ring_free_slots'] = self.ring.free_slots()
+            s['ring_overruns'] = self.ring.overruns
+        handlers = []
+        for i, h in enumerate(self.handlers):
+            writes = self.handler_writes[i]
+            hs = {'handler': type(h).__name__,
+                  'writes': writes,
+                  'write_time': self.handler_ns[i] / 1e9,
+                  'mean_write_ms': self.handler_ns[i] / writes / 1e6
+                  if writes else 0.0}
+            stats = getattr(h, 'stats', None)
+            if stats is not None:
+                hs.update(stats())  # Queue depths, drops, lag
+                s['errors'] += hs.get('errors', 0)
+            handlers.append(hs)
+        s['handlers'] = handlers
+        s['processors'] = [p.stats() for p in self.processors]
+        return s
+
+
+class GapDetector(object):
+    '''
+    Detects frames the camera delivered but capturing missed.
+
+    Uses the camera's frame counter when the backend has one. Otherwise the
+    frames seen are compared with the time elapsed since the last frame that
+    came on time: round(elapsed / period) - frames seen since then frames
+    are missing. Cameras buffer frames, so after a stall frames arrive late
+    and then in a quick burst. The deficit is counted only at the next frame
+    that comes on time, after the burst has made up for the delay.
+    '''
+
+    def __init__(self, frame_period=None, tolerance=1.5, smoothing=0.05):
+        '''
+        @param frame_period: Expected frame period in seconds. None estimates
+                             it from the frame intervals.
+        @param tolerance: Interval in frame periods up to which a frame is
+                          on time
+        @param smoothing: Weight of the newest interval in the estimate
+        '''
+        self.frame_period = frame_period
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.reset()
+
+    def reset(self):
+        self.missing = 0  # Total missing frames
+        self.indices = []  # Positions of missing frames in the sequence
+        if self.frame_period is None:
+            self.period = None
+        else:
+            self.period = self.frame_period * 1e9
+        self._last_timestamp = None
+        self._last_counter = None
+        self._anchor_timestamp = None  # Last frame that came on time
+        self._anchor_position = 0
+        self._seen = 0  # Frames checked
+
+    def check(self, timestamp, counter=None):
+        '''
+        Checks a delivered frame. Capture thread only.
+
+        @param timestamp: Frame time stamp in nanoseconds
+        @param counter: Camera's frame number or None if unknown
+        @return: Number of frames missing right before this one
+        '''
+        missing = 0
+        position = self._seen + self.missing  # Position of this frame
+        if counter is not None and self._last_counter is not None:
+            missing = max(counter - self._last_counter - 1, 0)
+        elif self._last_timestamp is None:
+            self._anchor_timestamp = timestamp
+            self._anchor_position = position
+        else:
+            interval = timestamp - self._last_timestamp
+            if not self.period:
+                self.period = float(interval)
+                on_time = True
+            else:
+                on_time = 0.5 * self.period <= interval <= \
+                    self.tolerance * self.period
+            if on_time:
+                # Frames late or in a burst since the anchor are settled now
+                expected = self._anchor_position + int(round(
+                    (timestamp - self._anchor_timestamp) / self.period))
+                missing = max(expected - position, 0)
+                if self.frame_period is None:
+                    self.period += self.smoothing * (interval - self.period)
+                self._anchor_timestamp = timestamp
+                self._anchor_position = position + missing
+        if missing:
+            self.indices.extend(range(position, position + missing))
+            self.missing += missing
+        self._last_timestamp = timestamp
+        self._last_counter = counter
+        self._seen += 1
+        return missing
+
+
+class StatsReporter(object):
+    '''
+    Reports CaptureStats snapshots on a fixed interval in its own thread.
+    '''
+
+    def __init__(self, stats, interval=1.0, callback=None):
+        '''
+        @param stats: CaptureStats
+        @param interval: Seconds between reports
+        @param callback: Function called with each snapshot dict. Default
+                         logs it on INFO level.
+        '''
+        self.stats = stats
+        self.interval = interval
+        self.callback = callback if callback is not None else self._log
+        self._stop = threading.Event()
+        self._thread = threading.Thread(name='stats reporter thread',
+                                        target=self._run,
+                                        daemon=True)
+
+    @staticmethod
+    def _log(s):
+        logger.info('%d frames, %.1f fps, %d errors, %s polls per frame',
+                    s['frames'], s['fps'], s['errors'],
+                    '%.1f' % s['polls_per_frame']
+                    if 'polls_per_frame' in s else '-')
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.callback(self.stats.snapshot())
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
@@ -4,17 +4,40 @@ Created on 23.11.2016
 @author: Samuli Rahkonen
 '''
 import io
+import collections
 import threading
+import numpy as np
+import xevacam.writers as writers
 
 
 class XevaStream(io.IOBase):
+    '''
+    FIFO of frames. The capture thread writes frames, a consumer reads them
+    as bytes, into its own buffer or as frame slots.
 
-    def __init__(self):
+    By default the queue is unlimited and no frame is lost. A bounded queue
+    is opt-in with maxsize; then the overflow policy decides what happens
+    to frames when the consumer falls behind, and dropped counts them.
+    '''
+
+    def __init__(self, maxsize=None, overflow=writers.DROP_OLDEST):
+        '''
+        @param maxsize: Maximum number of frames in the queue. None is
+                        unlimited.
+        @param overflow: What write does when the queue is full,
+                         xevacam.writers.DROP_OLDEST, DROP_NEWEST or BLOCK.
+        '''
         super().__init__()
-        self.queue_lock = threading.Lock()
-        self._queue = []
-        # self.remaining = bytearray()
-        # self.memview = memoryview(self.remaining)
+        if overflow not in writers.OVERFLOW_POLICIES:
+            raise Exception('Unknown overflow policy %s' % str(overflow))
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.queue_lock = threading.Condition()
+        self._queue = collections.deque()
+        self._offset = 0  # Bytes already read from the first frame
+        self._bytes = 0  # Unread bytes in the queue
+        self.high_water = 0  # Largest queue depth seen
+        self.dropped = 0  # Frames discarded by the overflow policy
 
     def readable(self):
         return True
@@ -22,39 +45,225 @@ class XevaStream(io.IOBase):
     def writable(self):
         return True
 
+    @property
+    def depth(self):
+        '''
+        Number of frames in the queue.
+        '''
+        return len(self._queue)
+
+    def stats(self):
+        return {'depth': self.depth,
+                'high_water': self.high_water,
+                'dropped': self.dropped,
+                'bytes': self._bytes}
+
+    @staticmethod
+    def _view(item):
+        if isinstance(item, bytes):
+            return memoryview(item)
+        return item.view
+
+    @staticmethod
+    def _discard(item):
+        if not isinstance(item, bytes):
+            item.release()
+
+    def _popleft(self):
+        item = self._queue.popleft()
+        self._bytes -= len(self._view(item)) - self._offset
+        self._offset = 0
+        return item
+
+    def _put(self, item):
+        with self.queue_lock:
+            if self.closed:
+                self._discard(item)  # Nobody will read it
+                return
+            if self.maxsize is not None and len(self._queue) >= self.maxsize:
+                if self.overflow == writers.DROP_NEWEST:
+                    self.dropped += 1
+                    self._discard(item)
+                    return
+                elif self.overflow == writers.DROP_OLDEST:
+                    self.dropped += 1
+                    self._discard(self._popleft())
+                else:
+                    self.queue_lock.wait_for(
+                        lambda: len(self._queue) < self.maxsize or
+                        self.closed)
+                    if self.closed:
+                        self._discard(item)
+                        return
+            self._queue.append(item)
+            self._bytes += len(self._view(item))
+            if len(self._queue) > self.high_water:
+                self.high_water = len(self._queue)
+            self.queue_lock.notify_all()
+
+    def _wait(self, predicate, timeout):
+        if timeout == 0:
+            return predicate()
+        return self.queue_lock.wait_for(predicate, timeout)
+
     def write(self, b):
-        self.queue_lock.acquire()
-        self._queue.append(b)
-        self.queue_lock.release()
+        b = bytes(b)  # Caller may reuse its buffer
+        self._put(b)
         return len(b)
 
-    def read(self, n=-1):
-        self.queue_lock.acquire()
-        if len(self._queue) > 0:
-            b = self._queue.pop(0)
+    def write_slot(self, slot):
+        '''
+        Queues a frame slot without copying it. Copies the frame instead when
+        the ring is about to run out of free slots, so that an unread stream
+        can't stall capturing.
+        '''
+        if slot.ring.free_slots() > 1:
+            self._put(slot.retain())
         else:
-            b = b''
-        self.queue_lock.release()
+            self._put(bytes(slot.view))
+        return len(slot)
+
+    def read_slot(self, timeout=0):
+        '''
+        Returns the oldest frame without copying it. If the item is a
+        FrameSlot, caller has to release() it when done.
+
+        @param timeout: Seconds to wait for a frame. 0 doesn't wait, None
+                        waits forever.
+        @return: FrameSlot, bytes or None if there was no frame
+        '''
+        with self.queue_lock:
+            if not self._wait(lambda: self._queue or self.closed, timeout) \
+                    or not self._queue:
+                return None
+            if self._offset:
+                # Partly read by read(n), return the rest
+                item = self._queue[0]
+                item = bytes(self._view(item)[self._offset:])
+                self._discard(self._popleft())
+            else:
+                item = self._popleft()
+            self.queue_lock.notify_all()
+            return item
+
+    def read(self, n=-1, timeout=0):
+        '''
+        Reads from the queue.
+
+        @param n: Number of bytes, which may span several frames. -1 returns
+                  the rest of the next frame.
+        @param timeout: Seconds to wait for data. 0 doesn't wait, None waits
+                        forever. Returns what there is after the timeout.
+        @return: bytes, b'' if there was nothing to read
+        '''
+        if n is None or n < 0:
+            item = self.read_slot(timeout)
+            if item is None:
+                return b''
+            if isinstance(item, bytes):
+                return item
+            b = bytes(item.view)
+            item.release()
+            return b
+        with self.queue_lock:
+            self._wait(lambda: self._bytes >= n or self.closed, timeout)
+            parts = []
+            done = []
+            remaining = n
+            offset = self._offset
+            for item in self._queue:
+                if remaining == 0:
+                    break
+                view = self._view(item)
+                chunk = min(remaining, len(view) - offset)
+                parts.append(view[offset:offset + chunk])
+                remaining -= chunk
+                offset = 0
+            b = b''.join(parts)  # The only copy
+            self._consume(len(b), done)
+            self.queue_lock.notify_all()
+        for item in done:
+            self._discard(item)
         return b
 
+    def readinto(self, b, timeout=0):
+        '''
+        Fills the given buffer from the queue.
+
+        @param b: Writable buffer
+        @param timeout: Seconds to wait for the buffer to fill. 0 doesn't
+                        wait, None waits forever.
+        @return: Number of bytes written to b
+        '''
+        out = memoryview(b).cast('B')
+        done = []
+        with self.queue_lock:
+            self._wait(lambda: self._bytes >= len(out) or self.closed,
+                       timeout)
+            filled = 0
+            offset = self._offset
+            for item in self._queue:
+                if filled == len(out):
+                    break
+                view = self._view(item)
+                chunk = min(len(out) - filled, len(view) - offset)
+                out[filled:filled + chunk] = view[offset:offset + chunk]
+                filled += chunk
+                offset = 0
+            self._consume(filled, done)
+            self.queue_lock.notify_all()
+        for item in done:
+            self._discard(item)
+        return filled
+
+    def _consume(self, nbytes, done):
+        '''
+        Drops nbytes from the front of the queue. Emptied items are appended
+        to done for releasing outside the lock.
+        '''
+        while nbytes > 0:
+            left = len(self._view(self._queue[0])) - self._offset
+            if nbytes >= left:
+                done.append(self._popleft())
+                nbytes -= left
+            else:
+                self._offset += nbytes
+                self._bytes -= nbytes
+                nbytes = 0
+
     def is_queue_empty(self):
-        self.queue_lock.acquire()
-        size = len(self._queue)
-        self.queue_lock.release()
-        return size == 0
+        with self.queue_lock:
+            return len(self._queue) == 0
 
     def clear_queue(self):
-        self.queue_lock.acquire()
-        self._queue = []
-        self.queue_lock.release()
+        with self.queue_lock:
+            items = list(self._queue)
+            self._queue.clear()
+            self._offset = 0
+            self._bytes = 0
+            self.queue_lock.notify_all()
+        for item in items:
+            self._discard(item)
+
+    def close(self):
+        '''
+        Closes the stream, wakes up blocked readers and writers.
+        '''
+        super().close()
+        self.clear_queue()
 
 
 class PreviewStream(io.IOBase):
+    '''
+    Keeps only the latest frame. Each frame gets a sequence number, so that
+    readers can wait for a newer frame with wait_newer() instead of polling.
+    '''
 
     def __init__(self):
         super().__init__()
-        self._lock = threading.Lock()
+        self._cond = threading.Condition()
         self._current_frame = bytes()
+        self.seq = 0  # Number of frames written, the latest frame's number
 
     def readable(self):
         return True
@@ -62,15 +271,252 @@ class PreviewStream(io.IOBase):
     def writable(self):
         return True
 
+    def _set_frame(self, frame):
+        with self._cond:
+            previous, self._current_frame = self._current_frame, frame
+            self.seq += 1
+            self._cond.notify_all()
+        if not isinstance(previous, bytes):
+            previous.release()
+
     def write(self, b):
-        with self._lock:
-            self._current_frame = b
+        b = bytes(b)  # Caller may reuse its buffer
+        self._set_frame(b)
         return len(b)
 
+    def write_slot(self, slot):
+        '''
+        Keeps the latest frame slot without copying it.
+        '''
+        self._set_frame(slot.retain())
+        return len(slot)
+
+    def wait_newer(self, seq, timeout=None):
+        '''
+        Waits until there is a frame newer than seq.
+
+        @param seq: Sequence number of the frame the caller has
+        @param timeout: Seconds to wait, None waits forever
+        @return: Sequence number of the latest frame, seq on timeout
+        '''
+        with self._cond:
+            self._cond.wait_for(lambda: self.seq > seq, timeout)
+            return self.seq
+
+    def read_frame(self):
+        '''
+        @return: tuple(sequence number, bytes) of the latest frame.
+                 Sequence number 0 and b'' if there is no frame yet.
+        '''
+        with self._cond:
+            frame = self._current_frame
+            if isinstance(frame, bytes):
+                return self.seq, frame
+            return self.seq, bytes(frame.view)
+
     def read(self, n=-1):
+        return self.read_frame()[1]
+
+
+class LineStream(object):
+    '''
+    Keeps the latest lines of one band (frame row) in a circular buffer for
+    line scan previews.
+
+    Every frame's line is stored at capture rate, nothing is copied per
+    frame besides the line itself. Readers copy the latest lines in time
+    order with read_lines(), which does the rolling once per redraw.
+    '''
+
+    def __init__(self, band, lines=500, dims=None, dtype=None, margin=64):
+        '''
+        @param band: Frame row to keep
+        @param lines: Number of lines readers want
+        @param dims: Frame dimensions tuple(height, width). Only needed if
+                     frames come through write() instead of write_slot().
+        @param dtype: Numpy pixel dtype, needed with dims.
+        @param margin: Extra lines in the buffer, so that the writer doesn't
+                       overwrite lines a reader is copying
+        '''
+        self.band = band
+        self.lines = lines
+        self.capacity = lines + margin
+        self.dims = dims
+        self.dtype = dtype
+        self._buffer = None
+        self.count = 0  # Lines written in total
+
+    def writable(self):
+        return True
+
+    def _append(self, line):
+        if self._buffer is None:
+            self._buffer = np.zeros((self.capacity, len(line)),
+                                    dtype=line.dtype)
+        self._buffer[self.count % self.capacity] = line
+        self.count += 1
+
+    def write_slot(self, slot):
+        if slot.frame is None:
+            return self.write(slot.view)
+        self._append(slot.frame[self.band])
+        return len(slot)
+
+    def write(self, b):
+        if self.dims is None:
+            raise Exception('%s needs dims and dtype for write()' %
+                            type(self).__name__)
+        frame = np.frombuffer(b, dtype=self.dtype).reshape(self.dims)
+        self._append(frame[self.band])
+        return len(b)
+
+    def read_lines(self, out, since=-1):
+        '''
+        Copies the latest len(out) lines to out, oldest first. Rows without
+        a line yet are zeros.
+
+        @param out: Array (lines, width)
+        @param since: count returned by the previous call. Nothing is copied
+                      if no lines have come since.
+        @return: Current count of lines, count - since lines are new
+        '''
+        count = self.count
+        buffer = self._buffer
+        if count == since or buffer is None:
+            return count
+        n = len(out)
+        if n > self.capacity - 1:
+            raise Exception('Can read at most %d lines' % (self.capacity - 1))
+        k = min(n, count)
+        out[:n - k] = 0
+        start = (count - k) % self.capacity
+        m = min(k, self.capacity - start)
+        out[n - k:n - k + m] = buffer[start:start + m]
+        out[n - k + m:] = buffer[:k - m]
+        return count
+
+
+class AsyncFrameQueue(object):
+    '''
+    Bounded frame queue from the capture thread to an asyncio event loop.
+
+    The capture thread queues frame slots and wakes a waiting consumer with
+    loop.call_soon_threadsafe(). When the queue is full, the overflow policy
+    drops a frame, so neither the capture thread nor the loop waits for the
+    other. Async iteration yields typed frame arrays, each valid until the
+    next one is asked for.
+    '''
+
+    def __init__(self, loop, maxsize=8, overflow=writers.DROP_OLDEST):
+        '''
+        @param loop: asyncio event loop of the consumer
+        @param maxsize: Maximum number of frames in the queue
+        @param overflow: xevacam.writers.DROP_OLDEST or DROP_NEWEST
+        '''
+        if overflow not in (writers.DROP_OLDEST, writers.DROP_NEWEST):
+            raise Exception('Overflow policy %s would block the capture '
+                            'thread' % str(overflow))
+        self.loop = loop
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self._lock = threading.Lock()
+        self._queue = collections.deque()
+        self._waiter = None  # Future the consumer awaits
+        self._current = None  # Item the consumer has
+        self._done = False
+        self.dropped = 0
+
+    def writable(self):
+        return True
+
+    def stats(self):
+        return {'depth': len(self._queue), 'dropped': self.dropped}
+
+    @staticmethod
+    def _discard(item):
+        if not isinstance(item, np.ndarray):
+            item.release()
+
+    @staticmethod
+    def _wake(waiter):
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _notify(self, waiter):
+        if waiter is not None:
+            try:
+                self.loop.call_soon_threadsafe(self._wake, waiter)
+            except RuntimeError:
+                pass  # Loop is closed
+
+    def _put(self, item):
         with self._lock:
-            b = self._current_frame
-        return b
+            if len(self._queue) >= self.maxsize:
+                self.dropped += 1
+                if self.overflow == writers.DROP_NEWEST:
+                    self._discard(item)
+                    return
+                self._discard(self._queue.popleft())
+            self._queue.append(item)
+            waiter, self._waiter = self._waiter, None
+        self._notify(waiter)
+
+    def write_slot(self, slot):
+        '''
+        Queues the frame slot. Copies the frame instead when the ring is
+        about to run out of free slots.
+        '''
+        if slot.ring.free_slots() > 1:
+            self._put(slot.retain())
+        else:
+            self._put(np.array(slot.frame))
+        return len(slot)
+
+    def write(self, b):
+        raise Exception('%s needs frame slots, control frames are not '
+                        'supported' % type(self).__name__)
+
+    def finish(self):
+        '''
+        Ends iteration after the queued frames. Called from any thread.
+        '''
+        with self._lock:
+            self._done = True
+            waiter, self._waiter = self._waiter, None
+        self._notify(waiter)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self._current is not None:
+            self._discard(self._current)
+            self._current = None
+        while True:
+            with self._lock:
+                if self._queue:
+                    item = self._current = self._queue.popleft()
+                    return item if isinstance(item, np.ndarray) \
+                        else item.frame
+                if self._done:
+                    raise StopAsyncIteration
+                self._waiter = waiter = self.loop.create_future()
+            await waiter
+
+    def close(self):
+        '''
+        Releases frames still in the queue.
+        '''
+        self.finish()
+        with self._lock:
+            items = list(self._queue)
+            self._queue.clear()
+            if self._current is not None:
+                items.append(self._current)
+                self._current = None
+        for item in items:
+            self._discard(item)
+
 
 # class XevaBufferedStream(io.BufferedRandom):
 #     def __init__(self, buffer_size=io.DEFAULT_BUFFER_SIZE):
@@ -0,0 +1,84 @@
+'''
+Created on 17.10.2026
+'''
+
+import os
+import numpy as np
+
+
+def sidecar_path(filepath):
+    '''
+    Returns time stamp sidecar path for a data or header file,
+    'myfile.bin' -> 'myfile.times'.
+    '''
+    return os.path.splitext(filepath)[0] + '.times'
+
+
+class TimestampLog(object):
+    '''
+    Frame time stamps in a growable uint64 array.
+
+    Time stamps are nanoseconds from origin, which is a time.perf_counter_ns()
+    value. The array grows chunk stamps at a time.
+    '''
+
+    def __init__(self, chunk=65536):
+        self.chunk = chunk
+        self._data = np.zeros(chunk, dtype=np.uint64)
+        self.count = 0
+        self.origin = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self, origin=0):
+        self.count = 0
+        self.origin = origin
+
+    def append(self, ns):
+        if self.count == len(self._data):
+            data = np.zeros(len(self._data) + self.chunk, dtype=np.uint64)
+            data[:self.count] = self._data
+            self._data = data
+        self._data[self.count] = ns
+        self.count += 1
+
+    @property
+    def values(self):
+        '''
+        View of the recorded time stamps.
+        @return: uint64 ndarray
+        '''
+        return self._data[:self.count]
+
+    def summary(self):
+        '''
+        Returns first and last time stamps and mean and standard deviation
+        of the frame period, all in nanoseconds.
+        @return: dict
+        '''
+        s = {'frames': self.count,
+             'first': 0, 'last': 0,
+             'mean period': 0.0, 'jitter': 0.0}
+        if self.count:
+            s['first'] = int(self._data[0])
+            s['last'] = int(self._data[self.count - 1])
+        if self.count > 1:
+            periods = np.diff(self.values.astype(np.int64))
+            s['mean period'] = float(periods.mean())
+            s['jitter'] = float(periods.std())
+        return s
+
+    def save(self, filepath):
+        '''
+        Writes the time stamps to a binary file of little-endian uint64s.
+        '''
+        self.values.astype('<u8').tofile(filepath)
+
+    @staticmethod
+    def load(filepath):
+        '''
+        Reads time stamps written by save().
+        @return: uint64 ndarray
+        '''
+        return np.fromfile(filepath, dtype='<u8')
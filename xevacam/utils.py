@@ -10,49 +10,75 @@ import matplotlib.animation as animation
 import pylab
 import numpy as np
 import xevacam.streams as streams
+from xevacam.contrast import AutoContrast
+from xevacam.timestamps import sidecar_path
 import threading
-import time
+
+ENVI_DATATYPES = {'u1': 1,
+                  'i2': 2,
+                  'i4': 3,
+                  'f4': 4,
+                  'f8': 5,
+                  'c4': 6,
+                  'c8': 9,
+                  'u2': 12,
+                  'u4': 13,
+                  'i8': 14,
+                  'u8': 15}
+
 
 def datatype2envitype(datatype):
-    DATATYPES = {'u1': 1,
-                 'i2': 2,
-                 'i4': 3,
-                 'f4': 4,
-                 'f8': 5,
-                 'c4': 6,
-                 'c8': 9,
-                 'u2': 12,
-                 'u4': 13,
-                 'i8': 14,
-                 'u8': 15}
-    t = DATATYPES.get(datatype, None)
+    t = ENVI_DATATYPES.get(datatype, None)
     if t is None:
         raise Exception(
             'Given datatype string %s is not valid type.' % str(datatype))
     return t
 
 
+def envitype2datatype(envitype):
+    for datatype, t in ENVI_DATATYPES.items():
+        if t == int(envitype):
+            return datatype
+    raise Exception(
+        'Given ENVI data type %s is not valid type.' % str(envitype))
+
+
 class PreviewWindow(object):
 
-    def __init__(self, camera, title='XenICs'):
+    def __init__(self, camera, title='XenICs', stream=None, contrast=None):
+        '''
+        @param camera: XevaCam, opened
+        @param title: Window title
+        @param stream: Handler the window reads frames from. Default is a
+                       PreviewStream.
+        @param contrast: AutoContrast for display limits. Default is
+                         AutoContrast().
+        '''
         self.camera = camera
-        self.stream = streams.PreviewStream()
+        self.stream = streams.PreviewStream() if stream is None else stream
         camera.set_handler(self.stream)
-        self.size = camera.get_frame_size()
-        self.dims = camera.get_frame_dims()
-        self.pixel_size = camera.get_pixel_size()
-        self.pixel_dtype = camera.get_pixel_dtype()
+        fmt = camera.output_format  # After processing stages
+        self.size = fmt.size
+        self.dims = fmt.dims
+        self.pixel_size = fmt.pixel_size
+        self.pixel_dtype = fmt.dtype
         self.title = title
+        self._seq = 0  # Sequence number of the frame shown
+        self.contrast = AutoContrast() if contrast is None else contrast
         # self._window_thread = threading.Thread(name='window thread',
         #                                        target=self.show_thread,
         #                                        args=(30, 500, 60))
 
-    def _image(self, stream, size, dims, pixel_size_bytes):
-        while True:
-            img = stream.read(size)
-            if img == b'':
-                continue
-            break
+    def _image(self, stream, size, dims, pixel_size_bytes, timeout=None):
+        '''
+        Waits for a frame newer than the one shown.
+
+        @param timeout: Seconds to wait, None waits forever
+        @return: Frame array or None if no new frame came in time
+        '''
+        if stream.wait_newer(self._seq, timeout) == self._seq:
+            return None
+        self._seq, img = stream.read_frame()
         frame_buffer = np.frombuffer(img,
                                      dtype=self.pixel_dtype,
                                      count=int(size/pixel_size_bytes))
@@ -79,14 +105,14 @@ class PreviewWindow(object):
 class RawPreviewWindow(PreviewWindow):
 
     def __init__(self, camera, interval=60,
-                 title='Line scan'):
-        super().__init__(camera, title)
+                 title='Line scan', contrast=None):
+        super().__init__(camera, title, contrast=contrast)
         self.interval = interval
 
     def show(self):
         self._window_thread = threading.Thread(name='raw window thread',
                                                target=self.show_thread,
-                                               args=(self.interval))
+                                               args=(self.interval,))
         self._window_thread.start()
 
     def show_thread(self, interval=60):
@@ -102,23 +128,34 @@ class RawPreviewWindow(PreviewWindow):
             img = self._image(self.stream,
                               self.size,
                               self.dims,
-                              self.pixel_size)
+                              self.pixel_size,
+                              timeout=0)
+            if img is None:
+                return im,  # Same frame as before
             im.set_data(img)
-            im.set_clim(vmin=0, vmax=10000)
+            im.set_clim(*self.contrast(img))
             return im,
 
         _ = animation.FuncAnimation(self.fig,
                                     updatefig,
-                                    interval=60,
+                                    interval=interval,
                                     blit=True)
         pylab.show()
 
 
 class LineScanWindow(PreviewWindow):
+    '''
+    Waterfall view of one band. Every captured line goes to a LineStream
+    at capture rate. Each redraw shows all lines since the previous one.
+    '''
 
     def __init__(self, camera, layer_num, num_of_lines=500, interval=60,
-                 title='Line scan'):
-        super().__init__(camera, title)
+                 title='Line scan', contrast=None):
+        super().__init__(camera, title,
+                         streams.LineStream(layer_num, num_of_lines,
+                                            camera.output_format.dims,
+                                            camera.output_format.dtype),
+                         contrast)
         self.layer_num = layer_num
         self.num_of_lines = num_of_lines
         self.interval = interval
@@ -137,32 +174,44 @@ class LineScanWindow(PreviewWindow):
         canvas = np.zeros(
             (num_of_lines, self.dims[1]), dtype=self.pixel_dtype)
         im = plt.imshow(canvas)
-        # im.set_data(image(stream))
+        count = -1  # Lines drawn so far
 
         def updatefig(*args):
-            # plt.pause(0.001)
-            img = self._image(self.stream,
-                              self.size,
-                              self.dims,
-                              self.pixel_size)
-            canvas[:num_of_lines-1, :] = canvas[1:, :]
-            canvas[num_of_lines-1, :] = img[layer_num, :]
-
+            nonlocal count
+            # Rolls the latest lines to the canvas, oldest at the top
+            new_count = self.stream.read_lines(canvas, count)
+            if new_count == count:
+                return im,  # No new lines
+            # Histogram of the new lines only
+            new_lines = min(new_count - max(count, 0), num_of_lines)
+            self.contrast.update(canvas[num_of_lines - new_lines:])
+            count = new_count
             im.set_data(canvas)
-            im.set_clim(vmin=0, vmax=10000)
-            # self.fig.draw()
+            limits = self.contrast.limits()
+            if limits is not None:
+                im.set_clim(*limits)
             return im,
 
         _ = animation.FuncAnimation(self.fig,
                                     updatefig,
-                                    interval=60,
+                                    interval=interval,
                                     blit=True)
         pylab.show()
         print('Window thread closed')
         plt
 
 
-def create_envi_hdr(meta, filepath, extra=None):
+def create_envi_hdr(meta, filepath, extra=None, timestamps=None):
+    '''
+    Writes ENVI header file.
+
+    @param meta: Metadata tuple array, e.g. from XevaCam.stop_recording()
+    @param filepath: Header file path
+    @param extra: Optional dict of additional header fields
+    @param timestamps: Optional TimestampLog (XevaCam.timestamps). Time stamps
+                       are written to a binary sidecar file next to the
+                       header, which the header refers to.
+    '''
     print('Writing to file \'%s\' metadata: %s, extra: %s' % (str(filepath),
                                                               str(meta),
                                                               str(extra)))
@@ -176,12 +225,16 @@ def create_envi_hdr(meta, filepath, extra=None):
     if tail == '':
         raise Exception(
             'No file name given. Metadata: %s' % str(meta))
-    m = meta
+    m = list(meta)
     if isinstance(extra, dict):
-        m.update(extra)
+        m.extend(extra.items())
+    if timestamps is not None:
+        times_path = sidecar_path(filepath)
+        timestamps.save(times_path)
+        m.append(('timestamps file', os.path.basename(times_path)))
     with open(filepath, 'w') as f:
         f.write('ENVI\n')
-        for name, value in meta:
+        for name, value in m:
             line = str(name) + ' = ' + str(value) + '\n'
             print(line)
             f.write(line)
@@ -202,6 +255,3 @@ def kbinterrupt_decorate(func):
             raise
     return func_wrapper
 
-def get_time():
-    return int(round(time.time()*1000))
-
@@ -0,0 +1,353 @@
+'''
+Created on 17.10.2026
+'''
+
+import collections
+import io
+import os
+import sys
+import threading
+import time
+
+# Overflow policies for a full handler queue
+BLOCK = 'block'  # Capture thread waits for room
+DROP_OLDEST = 'drop_oldest'  # Oldest queued frame is discarded
+DROP_NEWEST = 'drop_newest'  # New frame is discarded
+
+OVERFLOW_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
+
+class ThreadedHandler(object):
+    '''
+    Runs a handler's writes in its own thread, fed by a bounded queue.
+
+    The capture thread only retains the frame slot and queues it. The worker
+    thread writes it to the wrapped handler and releases it.
+    '''
+
+    def __init__(self, handler, incl_ctrl_frames=False, maxsize=64,
+                 overflow=BLOCK, exc_queue=None):
+        '''
+        @param handler: Object with write() method, optionally write_slot()
+        @param incl_ctrl_frames: Write a 4 byte control frame before each
+                                 frame.
+        @param maxsize: Maximum number of frames waiting in the queue
+        @param overflow: BLOCK, DROP_OLDEST or DROP_NEWEST
+        @param exc_queue: Queue to which worker exceptions are put
+                          (sys.exc_info() tuples).
+        '''
+        if overflow not in OVERFLOW_POLICIES:
+            raise Exception('Unknown overflow policy %s' % str(overflow))
+        if maxsize < 1:
+            raise Exception('Queue size must be at least 1, got %d' % maxsize)
+        self.handler = handler
+        self.incl_ctrl_frames = incl_ctrl_frames
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.exc_queue = exc_queue
+        self._write_slot = getattr(handler, 'write_slot', None)
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._running = True
+        # Lag counters
+        self.published = 0  # Frames given to the handler
+        self.written = 0  # Frames the worker has written
+        self.dropped = 0  # Frames discarded by the overflow policy
+        self.high_water = 0  # Largest queue depth seen
+        self.blocked_time = 0.0  # Seconds the capture thread waited
+        self.max_delay = 0.0  # Longest queue to write delay in seconds
+        self.errors = 0
+        self._thread = threading.Thread(
+            name='writer thread (%s)' % type(handler).__name__,
+            target=self._run,
+            daemon=True)
+        self._thread.start()
+
+    @property
+    def depth(self):
+        '''
+        Number of frames waiting in the queue.
+        '''
+        return len(self._queue)
+
+    @property
+    def lag(self):
+        '''
+        Number of published frames not yet written or dropped.
+        '''
+        return self.published - self.written - self.dropped
+
+    def stats(self):
+        return {'handler': type(self.handler).__name__,
+                'published': self.published,
+                'written': self.written,
+                'dropped': self.dropped,
+                'depth': self.depth,
+                'lag': self.lag,
+                'high_water': self.high_water,
+                'blocked_time': self.blocked_time,
+                'max_delay': self.max_delay,
+                'errors': self.errors}
+
+    def _put(self, item):
+        with self._cond:
+            if len(self._queue) >= self.maxsize:
+                if self.overflow == DROP_NEWEST:
+                    self.dropped += 1
+                    self._discard(item)
+                    return
+                elif self.overflow == DROP_OLDEST:
+                    self.dropped += 1
+                    self._discard(self._queue.popleft()[0])
+                else:
+                    start = time.perf_counter()
+                    while len(self._queue) >= self.maxsize and \
+                            self._thread.is_alive():
+                        self._cond.wait(0.1)
+                    self.blocked_time += time.perf_counter() - start
+                    if not self._thread.is_alive():
+                        self.dropped += 1
+                        self._discard(item)
+                        return
+            self._queue.append((item, time.perf_counter()))
+            if len(self._queue) > self.high_water:
+                self.high_water = len(self._queue)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _discard(item):
+        if not isinstance(item, bytes):
+            item.release()
+
+    def write_slot(self, slot):
+        self.published += 1
+        self._put(slot.retain())
+        return len(slot)
+
+    def write(self, b):
+        self.published += 1
+        self._put(bytes(b))  # Caller may reuse its buffer
+        return len(b)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+                while self._running and not self._queue:
+                    self._cond.wait()
+                if not self._queue:
+                    return  # Closed and drained
+                item, queued = self._queue.popleft()
+                self._busy = True
+                self._cond.notify_all()
+            try:
+                self._write(item)
+            except Exception:
+                self.errors += 1
+                if self.exc_queue is not None:
+                    self.exc_queue.put(sys.exc_info())
+                with self._cond:
+                    self._running = False
+                    self._busy = False
+                    for item, _ in self._queue:
+                        self._discard(item)
+                        self.dropped += 1
+                    self._queue.clear()
+                    self._cond.notify_all()
+                return
+            delay = time.perf_counter() - queued
+            if delay > self.max_delay:
+                self.max_delay = delay
+            self.written += 1
+
+    def _write(self, item):
+        if isinstance(item, bytes):
+            self.handler.write(item)
+            return
+        try:
+            if self.incl_ctrl_frames:
+                self.handler.write(item.ctrl_frame)
+            if self._write_slot is not None:
+                self._write_slot(item)
+            else:
+                self.handler.write(item.view)
+        finally:
+            item.release()
+
+    def flush(self):
+        '''
+        Blocks until the queue is written, then flushes the handler.
+        '''
+        with self._cond:
+            while (self._queue or self._busy) and self._thread.is_alive():
+                self._cond.wait(0.1)
+        flush = getattr(self.handler, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def finalize(self, meta, timestamps=None):
+        '''
+        Passes recording metadata to the handler after the queue is written.
+        '''
+        self.flush()
+        finalize = getattr(self.handler, 'finalize', None)
+        if finalize is not None:
+            finalize(meta, timestamps)
+
+    def close(self):
+        '''
+        Writes out the queue and stops the worker thread.
+        '''
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class BatchingHandler(object):
+    '''
+    Gathers frames and writes them to a handler in batches.
+
+    Frame slots (and control frames) are held until batch_frames frames have
+    been gathered or the oldest is max_latency seconds old, then written with
+    one os.writev() call when the handler has a file descriptor, otherwise
+    with one write() of a contiguous buffer. The latency bound is checked
+    when frames arrive. A batch is also written early when the frame ring is
+    about to run out of free slots.
+
+    A batch is written as one block of bytes, so only byte streams can be
+    batched: files, sockets and other io streams without write_slot().
+    Handlers which take frame by frame, like ENVIWriter or XevaStream, are
+    refused.
+    '''
+
+    def __init__(self, handler, incl_ctrl_frames=False, batch_frames=8,
+                 max_latency=0.05):
+        '''
+        @param handler: Object with write() method
+        @param incl_ctrl_frames: Write a 4 byte control frame before each
+                                 frame.
+        @param batch_frames: Number of frames per write
+        @param max_latency: Seconds a frame may wait for its batch
+        '''
+        if batch_frames < 1:
+            raise Exception('batch_frames must be at least 1')
+        self._fd = self._get_fd(handler)
+        if hasattr(handler, 'write_slot') or \
+                (self._fd is None and not isinstance(handler, io.IOBase)):
+            raise Exception('%s takes frames one at a time and can\'t be '
+                            'batched' % type(handler).__name__)
+        self.handler = handler
+        self.incl_ctrl_frames = incl_ctrl_frames
+        self.batch_frames = batch_frames
+        self.max_latency = max_latency
+        self._slots = []  # Retained slots or bytes in the batch
+        self._frames = 0
+        self._first = 0.0  # When the oldest frame of the batch arrived
+        self._buffer = None  # Used when writev is not available
+        self._iov_max = 1024
+        if self._fd is not None and hasattr(os, 'sysconf'):
+            try:
+                self._iov_max = os.sysconf('SC_IOV_MAX')
+            except (ValueError, OSError):
+                pass
+        self.batches = 0  # Write calls made
+        self.frames = 0  # Frames written
+
+    @staticmethod
+    def _get_fd(handler):
+        if not hasattr(os, 'writev'):
+            return None
+        try:
+            return handler.fileno()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            return None
+
+    def stats(self):
+        return {'batches': self.batches,
+                'frames': self.frames,
+                'frames_per_batch': self.frames / self.batches
+                if self.batches else 0.0,
+                'depth': self._frames}
+
+    def _add(self, item):
+        if not self._slots:
+            self._first = time.perf_counter()
+        self._slots.append(item)
+        self._frames += 1
+        return self._frames >= self.batch_frames or \
+            time.perf_counter() - self._first >= self.max_latency
+
+    def write_slot(self, slot):
+        if self._add(slot.retain()) or slot.ring.free_slots() <= 1:
+            self._write_batch()
+        return len(slot)
+
+    def write(self, b):
+        if self._add(bytes(b)):  # Caller may reuse its buffer
+            self._write_batch()
+        return len(b)
+
+    def _vector(self):
+        buffers = []
+        for item in self._slots:
+            if isinstance(item, bytes):
+                buffers.append(item)
+            else:
+                if self.incl_ctrl_frames:
+                    buffers.append(item.ctrl_frame)
+                buffers.append(item.view)
+        return buffers
+
+    def _write_batch(self):
+        if not self._slots:
+            return
+        buffers = self._vector()
+        try:
+            if self._fd is not None:
+                self.handler.flush()  # Keeps order with earlier writes
+                self._writev(buffers)
+            else:
+                size = sum(len(b) for b in buffers)
+                if self._buffer is None or len(self._buffer) < size:
+                    self._buffer = bytearray(size)
+                out = memoryview(self._buffer)
+                pos = 0
+                for b in buffers:
+                    out[pos:pos + len(b)] = b
+                    pos += len(b)
+                self.handler.write(out[:size])
+        finally:
+            for item in self._slots:
+                if not isinstance(item, bytes):
+                    item.release()
+            self.batches += 1
+            self.frames += self._frames
+            self._slots = []
+            self._frames = 0
+
+    def _writev(self, buffers):
+        while buffers:
+            chunk = buffers[:self._iov_max]
+            written = os.writev(self._fd, chunk)
+            # Drop what was written, the rest goes to the next round
+            while chunk and written >= len(chunk[0]):
+                written -= len(chunk[0])
+                chunk.pop(0)
+                buffers.pop(0)
+            if chunk and written:
+                buffers[0] = memoryview(buffers[0])[written:]
+
+    def flush(self):
+        self._write_batch()
+        flush = getattr(self.handler, 'flush', None)
+        if flush is not None:
+            flush()
+
+    def finalize(self, meta, timestamps=None):
+        self.flush()
+        finalize = getattr(self.handler, 'finalize', None)
+        if finalize is not None:
+            finalize(meta, timestamps)
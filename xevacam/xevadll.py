@@ -10,6 +10,7 @@ import ctypes
 from ctypes import windll, cdll, CDLL, WINFUNCTYPE, CFUNCTYPE, \
                    c_void_p, c_int32, c_char_p, c_bool, c_ulong, \
                    create_string_buffer, c_uint
+from xevacam.constants import XConstants
 
 
 # Callback Function Type
@@ -81,7 +82,7 @@ LOAD_LIBRARY_SEARCH_SYSTEM32 = 0x00000800
 LOAD_LIBRARY_SEARCH_DEFAULT_DIRS = 0x00001000
 
 
-class XDLL(object):
+class XDLL(XConstants):
     ''' Talks to xeneth64.dll '''
 
     # ctypes.WinDLL('kernel32')
@@ -94,102 +95,6 @@ class XDLL(object):
     _xenethDLL = WinDLLEx(os.path.join(directory, 'xeneth64.dll'),
                           LOAD_WITH_ALTERED_SEARCH_PATH)
 
-    # C Enumerations
-
-    # Error codes
-    I_OK = 0
-    I_DIRTY = 1
-    E_BUG = 10000
-    E_NOINIT = 10001
-    E_LOGICLOADFAILED = 10002
-    E_INTERFACE_ERROR = 10003
-    E_OUT_OF_RANGE = 10004
-    E_NOT_SUPPORTED = 10005
-    E_NOT_FOUND = 10006
-    E_FILTER_DONE = 10007
-    E_NO_FRAME = 10008
-    E_SAVE_ERROR = 10009
-    E_MISMATCHED = 10010
-    E_BUSY = 10011
-    E_INVALID_HANDLE = 10012
-    E_TIMEOUT = 10013
-    E_FRAMEGRABBER = 10014
-    E_NO_CONVERSION = 10015
-    E_FILTER_SKIP_FRAME = 10016
-    E_WRONG_VERSION = 10017
-    E_PACKET_ERROR = 10018
-    E_WRONG_FORMAT = 10019
-    E_WRONG_SIZE = 10020
-    E_CAPSTOP = 10021
-    E_OUT_OF_MEMORY = 10022
-    E_RFU = 10023
-
-    # Used for conversion to string
-    errcodes = {I_OK: 'I_OK',
-                I_DIRTY: 'I_DIRTY',
-                E_BUG: 'E_BUG',
-                E_NOINIT: 'E_NOINIT',
-                E_LOGICLOADFAILED: 'E_LOGICLOADFAILED',
-                E_INTERFACE_ERROR: 'E_INTERFACE_ERROR',
-                E_OUT_OF_RANGE: 'E_OUT_OF_RANGE',
-                E_NOT_SUPPORTED: 'E_NOT_SUPPORTED',
-                E_NOT_FOUND: 'E_NOT_FOUND',
-                E_FILTER_DONE: 'E_FILTER_DONE',
-                E_NO_FRAME: 'E_NO_FRAME',
-                E_SAVE_ERROR: 'E_SAVE_ERROR',
-                E_MISMATCHED: 'E_MISMATCHED',
-                E_BUSY: 'E_BUSY',
-                E_INVALID_HANDLE: 'E_INVALID_HANDLE',
-                E_TIMEOUT: 'E_TIMEOUT',
-                E_FRAMEGRABBER: 'E_FRAMEGRABBER',
-                E_NO_CONVERSION: 'E_NO_CONVERSION',
-                E_FILTER_SKIP_FRAME: 'E_FILTER_SKIP_FRAME',
-                E_WRONG_VERSION: 'E_WRONG_VERSION',
-                E_PACKET_ERROR: 'E_PACKET_ERROR',
-                E_WRONG_FORMAT: 'E_WRONG_FORMAT',
-                E_WRONG_SIZE: 'E_WRONG_SIZE',
-                E_CAPSTOP: 'E_CAPSTOP',
-                E_OUT_OF_MEMORY: 'E_OUT_OF_MEMORY',
-                E_RFU: 'E_RFU'}  # The last one is uncertain
-
-    # Frame types, ulong
-    FT_UNKNOWN = -1
-    FT_NATIVE = 0
-    FT_8_BPP_GRAY = 1
-    FT_16_BPP_GRAY = 2
-    FT_32_BPP_GRAY = 3
-    FT_32_BPP_RGBA = 4
-    FT_32_BPP_RGB = 5
-    FT_32_BPP_BGRA = 6
-    FT_32_BPP_BGR = 7
-
-    # Pixel size in bytes, used for conversion
-    pixel_sizes = {FT_UNKNOWN: 0,  # Unknown
-                   FT_NATIVE: 0,  # Unknown, ask with get_frame_type
-                   FT_8_BPP_GRAY: 1,
-                   FT_16_BPP_GRAY: 2,
-                   FT_32_BPP_GRAY: 4,
-                   FT_32_BPP_RGBA: 4,
-                   FT_32_BPP_RGB: 4,
-                   FT_32_BPP_BGRA: 4,
-                   FT_32_BPP_BGR: 4}
-
-    # GetFrameFlags, ulong
-    XGF_Blocking = 1
-    XGF_NoConversion = 2
-    XGF_FetchPFF = 4
-    XGF_RFU_1 = 8
-    XGF_RFU_2 = 16
-    XGF_RFU_3 = 32
-
-    # LoadCalibration flags
-    # Starts the software correction filter after unpacking the
-    # calibration data
-    XLC_StartSoftwareCorrection = 1
-    XLC_RFU_1 = 2
-    XLC_RFU_2 = 4
-    XLC_RFU_3 = 8
-
     # C functions
 
     # XCHANDLE XC_OpenCamera (const char * pCameraName = "cam://default",
@@ -256,7 +161,7 @@ class XDLL(object):
     # Settings
     load_settings = _xenethDLL.XC_LoadSettings
     load_settings.restype = c_ulong
-    load_settings.argtypes = (c_char_p, c_ulong)
+    load_settings.argtypes = (c_int32, c_char_p, c_ulong)
 
     # FileAccessCorrectionFile
     set_property_value = _xenethDLL.XC_SetPropertyValue